@@ -1,21 +1,49 @@
-from typing import TypedDict, List, Dict # Added List, Dict
+from typing import TypedDict, List, Dict, Optional, Callable # Added List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+import threading
 from langgraph.graph import StateGraph, END
-from openai import OpenAI
 import os
+import time
 import json # Added json
 from dotenv import load_dotenv
+from llm_cache import CategoryCache, IntentCache, NON_CACHEABLE_CATEGORIES
+from local_classifier import LocalClassifier
+from feedback_store import FeedbackStore
+from similarity_index import SimilarityIndex
+from categories import VERTICAL_CATEGORIES, COMMON_CATEGORY_HINTS, VERTICAL_CATEGORY_HINTS
+from llm_usage import usage_tracker
+from llm_client import get_llm_client, LLM_MODEL
+from metrics import stage, rows_answered
 
 load_dotenv()  # Load environment variables from .env file if it exists
 
-# Define your query
-# Option 1: Setting parameters directly in code (less recommended for secrets)
-# Replace with your actual Azure OpenAI resource details
-base_url = (
-    "https://litellm.int.thomsonreuters.com"  # e.g., "https://your-resource-name.openai.azure.com/"
-)
 api_key = os.getenv("OPENAI_AGENT_API_KEY")  # Ensure you have set this environment variable
 
-client = OpenAI(base_url=base_url, api_key=api_key)
+# Shared resilient client (pooled connections, timeouts, retries, circuit breaker); gateway URL is LLM_BASE_URL
+client = get_llm_client(api_key)
+
+# Large uploads are split into chunks that are sent to the LLM concurrently.
+# Both values can be overridden per call through get_batch_categories.
+CATEGORIZATION_CHUNK_SIZE = int(os.getenv("CATEGORIZATION_CHUNK_SIZE", "50")) # Descriptions per LLM request
+MAX_CONCURRENT_LLM_REQUESTS = int(os.getenv("MAX_CONCURRENT_LLM_REQUESTS", "8")) # Max in-flight LLM requests per batch
+# Chunks are also packed against token budgets so long descriptions never overflow a request or its reply.
+AGENT_MAX_INPUT_TOKENS = int(os.getenv("AGENT_MAX_INPUT_TOKENS", "8000")) # Estimated user-message tokens per request
+AGENT_MAX_OUTPUT_TOKENS = int(os.getenv("AGENT_MAX_OUTPUT_TOKENS", "2048")) # Reply token limit per request
+AGENT_MAX_RETRIES = int(os.getenv("AGENT_MAX_RETRIES", "2")) # Re-request rounds for missing, invalid or failed rows
+OUTPUT_TOKENS_PER_DESCRIPTION = 3 # A category number plus separator in the {"categories": [...]} reply
+
+# Persistent description -> category cache consulted before the graph run
+category_cache = CategoryCache()
+# Persistent business description -> intent cache, so repeat clients skip the intent LLM call
+intent_cache = IntentCache()
+# Bookkeepers' corrections from the category editor; they pre-answer exact and normalized matches
+feedback_store = FeedbackStore()
+# First-tier rules + TF-IDF model per vertical, trained on previously categorized descriptions and
+# corrections (corrections win); only rows it is unsure about reach the LLM
+local_classifier = LocalClassifier(training_sources=[category_cache, feedback_store])
+# Nearest-neighbour index over categorized descriptions; close rewordings of a known description inherit its category
+similarity_index = SimilarityIndex()
 
 intent_agent_instructions = """Persona: You are a text categorization assistant with expertise in identifying business types from written information. Your goal is to classify business-related text into one of four categories: Salon, Tutor, Architectural, or Uncategorized.
 
@@ -44,227 +72,33 @@ Only return a single word: "Salon", "Tutor", "Architectural", or "Uncategorized"
 
 Input : """
 
-architectural_agent_instruction = """Persona:
-
-You are a highly intelligent and efficient machine learning model specialized in categorizing financial transactions based on textual descriptions. Your task is to accurately assign categories to transaction_descriptions related to architectural consultation services. You have been trained on a comprehensive dataset that includes various types of expenses, revenues, and other financial activities.
-
-Task:
-
-- Your task is to predict the appropriate category for each transaction_description provided. The categories you will use are:
-
-- General Administration Expenses: These are costs related to the day-to-day running of the business that are not directly tied to specific projects. This includes office supplies, software subscriptions, phone services, and general office equipment. These expenses are essential for maintaining business operations and infrastructure.
-
-- Turnover: This category encompasses all income generated from providing architectural services. It includes receipts for completed projects, consultations, design work, and any other services offered to clients. Turnover reflects the business's revenue from its core activities.
-
-- Premises Costs: Expenses associated with maintaining the physical location of the business, such as rent payments and utilities (electricity, gas, and office contents insurance). These costs ensure that the business has a functional and safe working environment.
-
-- Legal and Professional Costs: Costs related to professional services and compliance with legal requirements. This includes insurance policies, membership fees in professional associations, accounting services, and legal consultations. These expenses support the business's professional standing and legal obligations.
-
-- Advertising and Promotion Costs: Expenses incurred to market and promote the business. This includes website hosting and maintenance, promotional materials, branding expenses, and advertising campaigns. These costs are aimed at increasing visibility and attracting new clients.
-
-- Other Business Expenses: Miscellaneous expenses that do not fit into other predefined categories. These may include cleaning services, subscription renewals, and other non-project-specific costs. This category captures the varied operational costs necessary for running the business.
-
-- Travel and Subsistence: Costs related to business travel, including transportation, accommodation, and meals during trips for client meetings, site evaluations, or other business-related travel. These expenses are crucial for maintaining client relationships and project oversight.
-
-- Subcontractor Expense: Payments made to third-party contractors for specialized services that support architectural projects. This includes site evaluations, specialist consultations, and any outsourced work that complements the firm's offerings.
-
-- Other Direct Costs: Costs directly associated with specific projects, such as materials for design mockups, site visit materials, and other project-specific expenses. These costs are integral to the completion of individual projects.
-
-- Motor Expenses: Costs related to the use and maintenance of business vehicles, including fuel, insurance, and repair costs. These expenses facilitate transportation needs for business purposes.
-
-- Business Entertainment Costs: Expenses incurred while entertaining clients or business partners, such as dinners and meetings. These costs help foster business relationships and client engagement.
-
-- Employee Costs: Salaries and wages paid to employees, reflecting the cost of labor involved in running the business. This includes regular salary payments and any other employee-related financial obligations.
-
-- Depreciation: The gradual reduction in value of business assets, such as office equipment, over time due to wear and tear. This accounting entry reflects the diminishing utility of physical assets.
-
-- Bad Debts: Losses incurred from unpaid invoices that cannot be collected. This category accounts for the financial impact of clients failing to fulfill their payment obligations.
-
-- Interest: Costs related to borrowing money, such as interest payments on business loans. This category captures the cost of financing business operations through debt.
-
-- Other Income: Income that is not directly related to the core business activities, such as interest received from business account balances. This category reflects supplementary income sources.
-
-Task Instruction:
-
-- Analyze the transaction_description provided and determine the most relevant category from the list above. Consider the context and keywords within the description to make your prediction. Each transaction should be assigned to exactly one category.
-
-- Strictly follows constraint and output format
-
-Other Instruction:
-
-- Ensure high accuracy by considering both explicit and implicit indicators within the transaction_descriptions.
-- Use natural language processing techniques to enhance understanding and prediction accuracy.
-Provide feedback on predictions to improve model performance over time.
-
-Output:
-
-- For each transaction_description, provide the predicted category in a clear and concise format. 
--  Directly Return Category in string.
-
-Example:
-
-Input:
-["Payment to Ryman UK for printer paper", "Invoice for CAD software subscription"]
-
-Output:
-{
-  "Payment to Ryman UK for printer paper": "General Administration Expenses",
-  "Invoice for CAD software subscription": "General Administration Expenses"
-}
-
-Task Instruction:
-- Analyze the list of transaction_descriptions provided and determine the most relevant category for each from the list above.
-- Return a single JSON object where each key is one of the transaction descriptions from the input list, and its value is the predicted category string.
-- Ensure the output is a valid JSON object. Do not add any explanatory text before or after the JSON object.
-
-Input: (This will be a JSON string list of transaction descriptions)
+# Compact categorization prompts. Every agent prompt starts with the same CATEGORIZATION_PROMPT_PREFIX,
+# followed by the vertical's category schema; the per-call descriptions only ever appear in the user message.
+# The whole system prompt is ~400 tokens, below the 1024-token minimum for provider-side prompt caching,
+# so cached_tokens stays 0: the saving comes from the short prompt itself, not from caching.
+CATEGORIZATION_PROMPT_PREFIX = """You categorize bookkeeping transactions for a small UK business.
+Rules:
+- Assign each transaction description exactly one category from the numbered list below.
+- Judge only from the description's wording; prefer specific categories, "Other ..." categories last.
+- Input: numbered lines "<line number>. <transaction description>".
+- Output: {"categories": [...]} with the category number for every input line, in input order. No other text.
 """
 
-salon_agent_instruction = """Persona:
-
-You are a highly intelligent and efficient machine learning model specialized in categorizing financial transactions based on textual descriptions. Your task is to accurately assign categories to transaction_descriptions related to salon services. You have been trained on a comprehensive dataset that includes various types of expenses, revenues, and other financial activities.
-
-Task:
-
-Your task is to predict the appropriate category for each transaction_description provided. The categories you will use are:
-
-- Turnover: Income generated from providing salon services, such as haircuts, styling, treatments, and consultations. This reflects the business's revenue from its core activities.
-
-- Cost of Goods: Expenses related to purchasing products necessary for salon operations, such as hair dye, shampoo, conditioner, and other salon-specific items.
-
-- Premises Costs: Expenses associated with maintaining the physical salon space, such as rent payments and utilities (electricity, water, gas).
-
-- Employee Costs: Salaries and wages paid to salon assistants or employees, reflecting the cost of labor involved in running the salon.
-
-- Other Direct Costs: Expenses for purchasing tools and supplies necessary for salon operations, such as styling tools, salon towels, brushes, scissors, and accessories.
-
-- General Administration Expenses: Costs related to the administration and management of the salon, such as internet and phone bills, office supplies, and waste disposal.
-
-- Other Business Expenses: Miscellaneous operational costs not directly tied to the salon's core services, such as parking fees for supply pickup, cleaning services, and business insurance premiums.
-
-- Advertising and Promotion Costs: Expenses for marketing and promoting the salon, such as online ads (Facebook, Instagram, Google), local newspaper and radio ads, and promotional brochures.
-
-- Interest: Costs related to borrowing money, such as interest payments on business loans.
-
-- Repairs: Expenses for repairing and maintaining salon equipment, tools, and premises.
-
-- Legal and Professional Costs: Fees paid for professional services like accounting, legal consultations, and membership fees for trade associations.
-
-- Personal: Expenses related to personal financial obligations like income tax payments and National Insurance Contributions.
-
-- Depreciation: The gradual reduction in value of salon assets, such as equipment and furniture, over time due to wear and tear.
-
-- Subcontractor Expense: Subcontractor expenses refer to costs incurred by a business for hiring external contractors or consultants to perform specific tasks or services that are outside the company's core activities or expertise. These expenses typically arise when a company engages third-party professionals to complete specialized projects, provide additional support, or manage specific aspects of a larger project. Subcontractor expenses can include fees for services such as site evaluations, design work, client consultations, or any other work that is contracted out to external parties.
-
-- Travel and subsistence : Payment to TravelCo for transportation and meals during business trip to supplier meeting
-
-- Other Income: Income from sources other than core salon services, such as sales of branded merchandise or gift vouchers, and commissions from product suppliers.
-
-Task Instruction:
-
-- Analyze the transaction_description provided and determine the most relevant category from the list above. Consider the context and keywords within the description to make your prediction. Each transaction should be assigned to exactly one category.
-
-- Try to categorize the description according to the given categories, ensuring that the 'Other' category is always assigned the lowest priority.
-
-- Strictly follows constraint and output format.
-
-Other Instruction:
-
-- Ensure high accuracy by considering both explicit and implicit indicators within the transaction_descriptions.
-- Use natural language processing techniques to enhance understanding and prediction accuracy. Provide feedback on predictions to improve model performance over time.
-
-Output:
-
-For each transaction_description, provide the predicted category in a clear and concise format. Directly Return Category in string.
-Example:
-
-Input:
-["Client payment for haircut and styling", "Purchase of L'Oreal hair dye"]
-
-Output:
-{
-  "Client payment for haircut and styling": "Turnover",
-  "Purchase of L'Oreal hair dye": "Cost of Goods"
-}
-
-Task Instruction:
-- Analyze the list of transaction_descriptions provided and determine the most relevant category for each from the list above.
-- Return a single JSON object where each key is one of the transaction descriptions from the input list, and its value is the predicted category string.
-- Ensure the output is a valid JSON object. Do not add any explanatory text before or after the JSON object.
-
-Input: (This will be a JSON string list of transaction descriptions)
-"""
-
-tutor_agent_instruction = """Persona:
-
-You are a highly intelligent and efficient machine learning model specialized in categorizing financial transactions based on textual descriptions. Your task is to accurately assign categories to transaction_descriptions related to tutoring services. You have been trained on a comprehensive dataset that includes various types of expenses, revenues, and other financial activities.
-
-Task:
-
-Your task is to predict the appropriate category for each transaction_description provided. The categories you will use are:
-
-Turnover: Income generated from providing tutoring services, such as payments from students or educational institutions for teaching, classes, and consultations.
-
-Cost of Goods: Expenses related to purchasing educational materials and resources necessary for tutoring operations, such as textbooks, teaching supplies, and digital resources.
-
-Premises Costs: Expenses associated with maintaining the physical or virtual tutoring space, such as rent payments for office space and utilities (electricity, water, internet).
-
-Employee Costs: Salaries and wages paid to assistants or staff involved in supporting tutoring operations.
-
-Other Direct Costs: Expenses for purchasing tools and supplies necessary for tutoring operations, such as software licenses and subscriptions for educational platforms.
-
-General Administration Expenses: Costs related to the administration and management of the tutoring business, such as stationery supplies, office furniture, and virtual assistant fees.
-
-Other Business Expenses: Miscellaneous operational costs not directly tied to the core tutoring services, such as business insurance premiums and cleaning services.
-
-Advertising and Promotion Costs: Expenses for marketing and promoting the tutoring business, such as online ads, promotional brochures, and website hosting.
-
-Interest: Costs related to borrowing money, such as interest payments on business loans.
-
-Repairs: Expenses for repairing and maintaining office equipment and furniture.
-
-Legal and Professional Costs: Fees paid for professional services like accounting, legal consultations, and membership fees for educational associations.
-
-Personal: Expenses related to personal financial obligations like income tax payments and National Insurance Contributions.
 
-Depreciation: The gradual reduction in value of tutoring assets, such as office equipment and furniture, over time due to wear and tear.
-
-Travel and Subsistence: Expenses incurred for transportation and meals during business-related travel.
-
-Other Income: Income from sources other than core tutoring services, such as sales of educational materials or commissions from referrals.
-
-Task Instruction:
-
-Analyze the transaction_descriptions provided and determine the most relevant categories from the list above. Consider the context and keywords within the description to make your prediction. Each transaction should be assigned to exactly one category.
-
-Try to categorize the descriptions according to the given categories, ensuring that the 'Other' category is always assigned the lowest priority.
-
-Other Instruction:
-
-Ensure high accuracy by considering both explicit and implicit indicators within the transaction_descriptions.
-Use natural language processing techniques to enhance understanding and prediction accuracy. Provide feedback on predictions to improve model performance over time.
-Output:
-
-For each transaction_description, provide the predicted category in a clear and concise format. Directly Return json reply with key as description and value as category.
-
-Example:
-
-Input:
-["Payment from Jane Smith for online class", "Subscription to Zoom for teaching"]
-
-Output:
-{
-  "Payment from Jane Smith for online class": "Turnover",
-  "Subscription to Zoom for teaching": "Other Direct Costs"
-}
+def build_agent_instruction(intent: str) -> str:
+    """
+    Builds the system prompt for a vertical agent: the shared prefix plus a numbered one-line-per-category
+    schema. Category numbers are 1-based positions in VERTICAL_CATEGORIES[intent].
+    """
+    hints = {**COMMON_CATEGORY_HINTS, **VERTICAL_CATEGORY_HINTS.get(intent, {})}
+    schema = "\n".join(f"{number}. {category}: {hints.get(category, '')}"
+                       for number, category in enumerate(VERTICAL_CATEGORIES[intent], start=1))
+    return f"{CATEGORIZATION_PROMPT_PREFIX}\nBusiness type: {intent}\nCategories:\n{schema}\n"
 
-Task Instruction:
-- Analyze the list of transaction_descriptions provided and determine the most relevant category for each from the list above.
-- Return a single JSON object where each key is one of ઉthe transaction descriptions from the input list, and its value is the predicted category string.
-- Ensure the output is a valid JSON object. Do not add any explanatory text before or after the JSON object.
 
-Input: (This will be a JSON string list of transaction descriptions)
-"""
+architectural_agent_instruction = build_agent_instruction("architectural")
+salon_agent_instruction = build_agent_instruction("salon")
+tutor_agent_instruction = build_agent_instruction("tutor")
 
 
 # Define the state schema for your graph
@@ -273,106 +107,228 @@ class GraphState(TypedDict):
     intent: str          # Identified business intent
     transaction_descriptions: List[str]  # List of transaction descriptions to categorize
     categorization_results: Dict[str, str] # Map of {description: category}
+    chunk_size: int      # Descriptions per LLM request in the vertical agents
+    max_concurrency: int # Max concurrent LLM requests in the vertical agents
+    on_chunk_complete: Callable[[Dict[str, str], int, int], None] # Optional (chunk results, chunks done, total chunks) callback
+    llm_slots: threading.Semaphore # Optional limit on agent LLM calls shared with other concurrent batches
 
 
 def intent_identification_agent_node(state: GraphState) -> dict:
     print("---NODE: Intent Identification Agent---")
     query = state.get("original_query", "")
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": intent_agent_instructions},
-            {"role": "user", "content": query},
-        ],
-    )
+    started = time.perf_counter()
+    with stage("intent_node"):
+        response = client.create_chat_completion(
+            model=LLM_MODEL,
+            messages=[
+                {"role": "system", "content": intent_agent_instructions},
+                {"role": "user", "content": query},
+            ],
+        )
+    usage_tracker.record("Intent Identification Agent", response, time.perf_counter() - started)
     intent = response.choices[0].message.content.strip().lower()
     print(f"Intent Identification Response: {intent}")
     return {"intent": intent}
 
 
-def architectural_agent_node(state: GraphState) -> dict:
-    print("---NODE: Architectural Agent---")
-    descriptions = state.get("transaction_descriptions", [])
-    if not descriptions:
-        print("Architectural Agent: No descriptions to categorize.")
-        return {"categorization_results": {}}
-    
-    user_content = json.dumps(descriptions)
-    print(f"Architectural Agent sending to LLM: {user_content}")
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate (about four characters per token for English text), without a tokenizer dependency.
+    """
+    return len(text) // 4 + 1
+
+
+def pack_descriptions(descriptions: List[str], chunk_size: int,
+                      max_input_tokens: int = AGENT_MAX_INPUT_TOKENS,
+                      max_output_tokens: int = AGENT_MAX_OUTPUT_TOKENS) -> List[List[str]]:
+    """
+    Splits a list of descriptions into consecutive chunks of at most chunk_size items whose estimated
+    numbered-line input stays within max_input_tokens and whose expected reply fits max_output_tokens.
+    A single description larger than the input budget still gets a chunk of its own.
+    """
+    # Leave headroom for the JSON wrapper around the reply
+    max_items = max(1, min(chunk_size, (max_output_tokens - 16) // OUTPUT_TOKENS_PER_DESCRIPTION))
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for desc in descriptions:
+        desc_tokens = estimate_tokens(desc) + 2 # Line number and newline
+        if current and (len(current) >= max_items or current_tokens + desc_tokens > max_input_tokens):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(desc)
+        current_tokens += desc_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def category_ids_response_format(categories: List[str]) -> dict:
+    """
+    Structured-output schema constraining the agent reply to {"categories": [category number, ...]},
+    each number one of the vertical's 1-based category numbers.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "category_ids",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "categories": {"type": "array", "items": {"type": "integer", "enum": list(range(1, len(categories) + 1))}},
+                },
+                "required": ["categories"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def parse_category_ids(response_content: str, categories: List[str], descriptions: List[str]) -> Dict[str, str]:
+    """
+    Maps the agent's {"categories": [category number, ...]} reply back onto the chunk's descriptions by position.
+    Rows with an out-of-range number are left out of the returned {description: category} map. A reply with
+    more or fewer numbers than descriptions cannot be lined up with the rows, so none of it is used (the rows
+    are re-requested by the retry rounds instead of taking a neighbour's category).
+    """
+    category_ids = json.loads(response_content).get("categories", [])
+    if len(category_ids) != len(descriptions):
+        print(f"Agent reply discarded: {len(category_ids)} category numbers for {len(descriptions)} descriptions.")
+        return {}
+    results: Dict[str, str] = {}
+    for desc, category_id in zip(descriptions, category_ids):
+        if isinstance(category_id, int) and 1 <= category_id <= len(categories):
+            results[desc] = categories[category_id - 1]
+    if len(results) < len(descriptions):
+        print(f"Agent reply covered {len(results)} of {len(descriptions)} descriptions.")
+    return results
+
+
+def categorize_chunk(agent_name: str, instruction: str, categories: List[str], descriptions: List[str],
+                     llm_slots: Optional[threading.Semaphore] = None) -> Dict[str, str]:
+    """
+    Sends a single chunk of descriptions to the LLM with the given agent instruction, as numbered lines.
+    The model answers with one category number per line, validated against the vertical's categories.
+    If llm_slots is given, the call waits for a free slot first.
+    Returns a {description: category} map for the rows answered validly, or None if the call failed.
+    """
+    # Newlines inside a description would break the line numbering
+    user_content = "\n".join(f"{number}. {' '.join(desc.split())}" for number, desc in enumerate(descriptions, start=1))
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": architectural_agent_instruction},
-                {"role": "user", "content": user_content},
-            ],
-            response_format={"type": "json_object"}
-        )
-        response_content = response.choices[0].message.content.strip()
-        print(f"Architectural Agent LLM raw response: {response_content}")
-        categorization_results = json.loads(response_content)
-        print(f"Architectural Agent Parsed Response: {categorization_results}")
-        return {"categorization_results": categorization_results}
+        with llm_slots or nullcontext():
+            started = time.perf_counter()
+            with stage("agent_llm"):
+                response = client.create_chat_completion(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": instruction},
+                        {"role": "user", "content": user_content},
+                    ],
+                    response_format=category_ids_response_format(categories),
+                    max_tokens=AGENT_MAX_OUTPUT_TOKENS
+                )
+                usage_tracker.record(agent_name, response, time.perf_counter() - started, items=len(descriptions))
+                # An unparseable reply counts as an agent_llm error as well
+                return parse_category_ids(response.choices[0].message.content.strip(), categories, descriptions)
     except Exception as e:
-        print(f"Error in Architectural Agent: {e}")
-        # Fallback: mark all as "Error in Categorization" for this agent
-        return {"categorization_results": {desc: "Error in Categorization" for desc in descriptions}}
+        print(f"Error in {agent_name}: {e}")
+        return None
 
 
-def salon_agent_node(state: GraphState) -> dict:
-    print("---NODE: Salon Agent---")
+@stage("agent_node")
+def run_vertical_agent(agent_name: str, instruction: str, categories: List[str], state: GraphState) -> dict:
+    """
+    Packs the state's descriptions into token-budgeted chunks, categorizes the chunks concurrently
+    (bounded by max_concurrency) and merges the per-chunk maps into one result.
+    Rows left unanswered (omitted, invalid, or in a failed call) are re-requested on their own, in smaller
+    chunks, for up to AGENT_MAX_RETRIES more rounds. Rows whose last call failed end up as
+    "Error in Categorization"; rows the model never answered validly are left out (and become "Uncategorized").
+    """
     descriptions = state.get("transaction_descriptions", [])
     if not descriptions:
-        print("Salon Agent: No descriptions to categorize.")
+        print(f"{agent_name}: No descriptions to categorize.")
         return {"categorization_results": {}}
 
-    user_content = json.dumps(descriptions)
-    print(f"Salon Agent sending to LLM: {user_content}")
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": salon_agent_instruction},
-                {"role": "user", "content": user_content},
-            ],
-            response_format={"type": "json_object"}
-        )
-        response_content = response.choices[0].message.content.strip()
-        print(f"Salon Agent LLM raw response: {response_content}")
-        categorization_results = json.loads(response_content)
-        print(f"Salon Agent Parsed Response: {categorization_results}")
-        return {"categorization_results": categorization_results}
-    except Exception as e:
-        print(f"Error in Salon Agent: {e}")
-        return {"categorization_results": {desc: "Error in Categorization" for desc in descriptions}}
+    chunk_size = state.get("chunk_size") or CATEGORIZATION_CHUNK_SIZE
+    max_concurrency = state.get("max_concurrency") or MAX_CONCURRENT_LLM_REQUESTS
+    on_chunk_complete = state.get("on_chunk_complete")
+    llm_slots = state.get("llm_slots")
+    categorization_results: Dict[str, str] = {}
+    failed: set = set() # Descriptions whose most recent request raised
+    pending = list(descriptions)
+    completed_chunks = total_chunks = 0
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for attempt in range(AGENT_MAX_RETRIES + 1):
+            # Retries halve the chunk size, since long replies are the usual reason rows go missing
+            chunks = pack_descriptions(pending, max(1, chunk_size >> attempt))
+            total_chunks += len(chunks)
+            if attempt == 0:
+                print(f"{agent_name}: {len(pending)} descriptions in {len(chunks)} chunk(s), up to {max_concurrency} in flight.")
+            else:
+                print(f"{agent_name}: retry {attempt}/{AGENT_MAX_RETRIES} for {len(pending)} unanswered descriptions in {len(chunks)} chunk(s).")
+            futures = {executor.submit(categorize_chunk, agent_name, instruction, categories, chunk, llm_slots): chunk for chunk in chunks}
+            # Results are merged as chunks finish so progress can be reported before the whole batch is done
+            for future in as_completed(futures):
+                completed_chunks += 1
+                chunk_results = future.result()
+                if chunk_results is None:
+                    failed.update(futures[future])
+                    continue
+                failed.difference_update(futures[future])
+                categorization_results.update(chunk_results)
+                if on_chunk_complete and chunk_results:
+                    on_chunk_complete(chunk_results, completed_chunks, total_chunks)
+            pending = [desc for desc in pending if desc not in categorization_results]
+            if not pending:
+                break
+
+    error_results = {desc: "Error in Categorization" for desc in pending if desc in failed}
+    if error_results:
+        categorization_results.update(error_results)
+        if on_chunk_complete:
+            on_chunk_complete(error_results, completed_chunks, total_chunks)
+    if pending:
+        print(f"{agent_name}: {len(pending)} descriptions unanswered after {AGENT_MAX_RETRIES} retries ({len(error_results)} failed calls).")
+    print(f"{agent_name}: categorized {len(categorization_results)} of {len(descriptions)} descriptions.")
+    return {"categorization_results": categorization_results}
+
+
+def architectural_agent_node(state: GraphState) -> dict:
+    print("---NODE: Architectural Agent---")
+    return run_vertical_agent("Architectural Agent", architectural_agent_instruction, VERTICAL_CATEGORIES["architectural"], state)
+
+
+def salon_agent_node(state: GraphState) -> dict:
+    print("---NODE: Salon Agent---")
+    return run_vertical_agent("Salon Agent", salon_agent_instruction, VERTICAL_CATEGORIES["salon"], state)
 
 
 def tutor_agent_node(state: GraphState) -> dict:
     print("---NODE: Tutor Agent---")
-    descriptions = state.get("transaction_descriptions", [])
-    if not descriptions:
-        print("Tutor Agent: No descriptions to categorize.")
-        return {"categorization_results": {}}
+    return run_vertical_agent("Tutor Agent", tutor_agent_instruction, VERTICAL_CATEGORIES["tutor"], state)
 
-    user_content = json.dumps(descriptions)
-    print(f"Tutor Agent sending to LLM: {user_content}")
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": tutor_agent_instruction},
-                {"role": "user", "content": user_content},
-            ],
-            response_format={"type": "json_object"}
-        )
-        response_content = response.choices[0].message.content.strip()
-        print(f"Tutor Agent LLM raw response: {response_content}")
-        categorization_results = json.loads(response_content)
-        print(f"Tutor Agent Parsed Response: {categorization_results}")
-        return {"categorization_results": categorization_results}
-    except Exception as e:
-        print(f"Error in Tutor Agent: {e}")
-        return {"categorization_results": {desc: "Error in Categorization" for desc in descriptions}}
+
+# Maps an identified intent to the vertical agent node that handles it
+INTENT_TO_AGENT = {
+    "salon": "Salon Agent",
+    "tutor": "Tutor Agent",
+    "architectural": "Architectural Agent",
+    "uncategorized": END # If intent is uncategorized, end the flow.
+}
+
+
+def route_by_intent(state: GraphState) -> str:
+    # Ensure intent is lowercased and handle if None; unknown intents end the flow like "uncategorized"
+    return INTENT_TO_AGENT.get((state.get("intent") or "").lower(), END)
+
+
+def route_entry(state: GraphState) -> str:
+    # Skip the intent LLM call when the caller already knows the intent
+    if state.get("intent"):
+        return route_by_intent(state)
+    return "Intent Identification Agent"
 
 
 # Compile the workflow globally so it's done once when the module is imported
@@ -381,26 +337,51 @@ graph_builder.add_node("Intent Identification Agent", intent_identification_agen
 graph_builder.add_node("Architectural Agent", architectural_agent_node)
 graph_builder.add_node("Salon Agent", salon_agent_node)
 graph_builder.add_node("Tutor Agent", tutor_agent_node)
-graph_builder.add_conditional_edges(
-    "Intent Identification Agent",
-    lambda state: state.get("intent", "").lower(), # Ensure intent is lowercased and handle if None
-    {
-        "salon": "Salon Agent",
-        "tutor": "Tutor Agent",
-        "architectural": "Architectural Agent",
-        "uncategorized": END # If intent is uncategorized, end the flow.
-    },
-)
-graph_builder.set_entry_point("Intent Identification Agent")
+graph_builder.add_conditional_edges("Intent Identification Agent", route_by_intent)
+graph_builder.set_conditional_entry_point(route_entry)
 graph_builder.add_edge("Architectural Agent", END)
 graph_builder.add_edge("Salon Agent", END)
 graph_builder.add_edge("Tutor Agent", END)
 
 compiled_app = graph_builder.compile()
 
-def get_batch_categories(business_query: str, descriptions_list: List[str]) -> Dict[str, str]:
+
+def resolve_intent(business_query: str, known_intent: Optional[str] = None) -> str:
+    """
+    Identifies the lowercased business intent (salon, tutor, architectural or uncategorized) for a query.
+    A known_intent supplied by the caller is used as is; otherwise the intent cache is consulted
+    before falling back to the Intent Identification Agent.
+    """
+    if known_intent:
+        return known_intent.lower()
+
+    cached_intent = intent_cache.get(business_query)
+    if cached_intent:
+        print(f"Intent cache hit: {cached_intent}")
+        return cached_intent
+
+    intent = intent_identification_agent_node({"original_query": business_query}).get("intent", "").lower()
+    if intent in INTENT_TO_AGENT: # Only cache answers the graph can route
+        intent_cache.set(business_query, intent)
+    return intent
+
+
+def get_batch_categories(business_query: str, descriptions_list: List[str],
+                         chunk_size: int = CATEGORIZATION_CHUNK_SIZE,
+                         max_concurrency: int = MAX_CONCURRENT_LLM_REQUESTS,
+                         intent: Optional[str] = None,
+                         on_partial_results: Optional[Callable[[Dict[str, str]], None]] = None,
+                         llm_slots: Optional[threading.Semaphore] = None) -> Dict[str, str]:
     """
     Runs the agentic workflow to categorize a batch of transaction descriptions based on a business query.
+    Descriptions with a stored user correction, already in the category cache for the identified intent,
+    closely matching a previously categorized description, or classified with high confidence by the
+    local classifier are answered without an LLM call.
+    The vertical agents send the descriptions in chunks of chunk_size, with at most max_concurrency
+    requests in flight at once. Passing a known intent skips intent identification entirely.
+    on_partial_results, if given, is called with a {description: category} map for the cache hits and then
+    for each agent chunk as it finishes, before the complete map is returned.
+    llm_slots, if given, is a semaphore shared with other concurrent batches that caps their agent LLM calls in total.
     Returns a dictionary mapping each description to its category.
     """
     print(f"\n---RUNNING AGENTIC GRAPH FOR BATCH CATEGORIZATION---")
@@ -408,45 +389,67 @@ def get_batch_categories(business_query: str, descriptions_list: List[str]) -> D
         print("No descriptions provided for batch categorization.")
         return {}
 
-    inputs = {
-        "original_query": business_query,
-        "transaction_descriptions": descriptions_list,
-        "categorization_results": {} # Initialize
-    }
-    
+    # Resolve the intent before the graph run so the category cache can be consulted per vertical
+    intent = resolve_intent(business_query, known_intent=intent)
+    if INTENT_TO_AGENT.get(intent, END) == END:
+        print("Intent is uncategorized. All descriptions in batch marked as Uncategorized.")
+        return {desc: "Uncategorized" for desc in descriptions_list}
+
+    # User corrections take precedence over everything else
+    with stage("feedback_lookup"):
+        feedback_map = feedback_store.lookup_many(intent, descriptions_list)
+    remaining_descriptions = [desc for desc in descriptions_list if desc not in feedback_map]
+    with stage("cache_lookup"):
+        cached_map = category_cache.get_many(intent, remaining_descriptions)
+    uncached_descriptions = list(dict.fromkeys(desc for desc in remaining_descriptions if desc not in cached_map))
+    # One batched cosine query for the whole upload against the vertical's known descriptions
+    with stage("similarity_lookup"):
+        similar_map = similarity_index.match(intent, uncached_descriptions)
+    uncached_descriptions = [desc for desc in uncached_descriptions if desc not in similar_map]
+    # Confident local answers are used as is (and not cached, so the model never trains on its own output)
+    with stage("local_classifier"):
+        local_map, uncached_descriptions = local_classifier.split_confident(intent, uncached_descriptions)
+    for source, answered in (("feedback", feedback_map), ("cache", cached_map), ("similarity", similar_map), ("local", local_map)):
+        rows_answered.inc(len(answered), source=source)
+    print(f"Feedback: {len(feedback_map)} answered, category cache: {len(cached_map)} hits, similarity index: {len(similar_map)} matched, local classifier: {len(local_map)} answered, {len(uncached_descriptions)} descriptions to send to agents.")
+    # Everything answered without the LLM
+    answered_map = {**cached_map, **similar_map, **local_map, **feedback_map}
+    # Only the remaining misses reach the agent nodes, each unique description once
+    if on_partial_results and answered_map:
+        on_partial_results(answered_map)
+
+    agent_map: Dict[str, str] = {}
+    if uncached_descriptions:
+        inputs = {
+            "original_query": business_query,
+            "intent": intent, # Known intent: the graph enters the vertical agent directly
+            "transaction_descriptions": uncached_descriptions,
+            "categorization_results": {}, # Initialize
+            "chunk_size": chunk_size,
+            "max_concurrency": max_concurrency,
+            "llm_slots": llm_slots,
+            "on_chunk_complete": (lambda chunk_results, _done, _total: on_partial_results(chunk_results))
+                                 if on_partial_results else None
+        }
+        for event in compiled_app.stream(inputs):
+            for node_name, output_value in event.items():
+                print(f"Output from node '{node_name}': {sorted((output_value or {}).keys())}")
+                if node_name in ["Architectural Agent", "Salon Agent", "Tutor Agent"]:
+                    if output_value and "categorization_results" in output_value:
+                        agent_map = output_value["categorization_results"]
+        agent_answers = {desc: agent_map[desc] for desc in uncached_descriptions if desc in agent_map}
+        rows_answered.inc(len(agent_answers), source="llm")
+        category_cache.set_many(intent, agent_answers)
+        similarity_index.add(intent, {desc: category for desc, category in agent_answers.items()
+                                      if category not in NON_CACHEABLE_CATEGORIES})
+
+    # Answers found without the LLM first, then the agent's output; anything the agent did not return is "Uncategorized"
     final_category_map: Dict[str, str] = {}
+    with stage("merge"):
+        for desc in descriptions_list:
+            final_category_map[desc] = answered_map.get(desc) or agent_map.get(desc, "Uncategorized")
 
-    for event in compiled_app.stream(inputs):
-        for node_name, output_value in event.items():
-            print(f"Output from node '{node_name}': {output_value}")
-            if node_name == "Intent Identification Agent":
-                current_intent = output_value.get("intent", "").lower()
-                if current_intent == "uncategorized":
-                    print("Intent is uncategorized. All descriptions in batch marked as Uncategorized.")
-                    final_category_map = {desc: "Uncategorized" for desc in descriptions_list}
-                    # The graph will end due to the conditional edge.
-            elif node_name in ["Architectural Agent", "Salon Agent", "Tutor Agent"]:
-                if output_value and "categorization_results" in output_value:
-                    # Merge results, prioritizing agent's output
-                    # This handles cases where some descriptions might not be in the agent's map
-                    # or if the agent returns an incomplete map.
-                    agent_map = output_value["categorization_results"]
-                    current_batch_map = {desc: "Uncategorized" for desc in descriptions_list} # Default all
-                    current_batch_map.update(agent_map) # Update with agent's results
-                    final_category_map = current_batch_map
-            
-    # If the graph ended due to 'uncategorized' intent, final_category_map is already set.
-    # If it went through an agent, final_category_map is set by the agent's output.
-    # If for some reason final_category_map is still empty (e.g., unexpected graph flow or error before agent node),
-    # ensure all descriptions get a default category.
-    if not final_category_map and descriptions_list:
-         final_category_map = {desc: "Uncategorized" for desc in descriptions_list}
-    elif descriptions_list: # Ensure all descriptions from input list are covered
-        for desc_key in descriptions_list:
-            if desc_key not in final_category_map:
-                final_category_map[desc_key] = "Uncategorized" # Default for any missing keys
-
-    print(f"---AGENTIC GRAPH EXECUTION COMPLETE. CATEGORY MAP: {final_category_map}---")
+    print(f"---AGENTIC GRAPH EXECUTION COMPLETE. {len(final_category_map)} DESCRIPTIONS CATEGORIZED---")
     return final_category_map
 
 if __name__ == "__main__":
@@ -1,19 +1,47 @@
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
-import openpyxl
+from typing import List, Dict, Any, Literal, Optional, Callable, Tuple
 import json
-from openai import OpenAI
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import os # For API Key
 from dotenv import load_dotenv
 from datetime import datetime # Added for datetime conversion
+from normalization import group_by_canonical_key
+from ingestion import parse_rows, parse_workbook_sheets, infer_column_types, SHEET_COLUMN
+from jobs import JobStore
+from llm_usage import usage_tracker
+from llm_client import get_llm_client, LLM_MODEL
+from metrics import stage, stage_errors, header_mapping_lookups, render_metrics
+import time
+import shutil
+import tempfile
+from llm_cache import HeaderMappingCache, header_fingerprint
+from categories import VERTICAL_CATEGORIES
 
 # Attempt to import the categorization function
 try:
-    from agentic import get_batch_categories # UPDATED to get_batch_categories
+    from agentic import (get_batch_categories, resolve_intent, category_cache, intent_cache, # UPDATED to get_batch_categories
+                         local_classifier, feedback_store, similarity_index)
 except ImportError:
     print("WARN: agentic.py or get_batch_categories not found. Categorization endpoint will not work.")
     get_batch_categories = None # UPDATED to get_batch_categories
+    category_cache = None
+    intent_cache = None
+    local_classifier = None
+    feedback_store = None
+    similarity_index = None
+
+# Server-side datasets with paginated row access (needs pyarrow)
+try:
+    from dataset_store import DatasetStore
+    dataset_store = DatasetStore()
+except ImportError:
+    print("WARN: pyarrow not installed. Dataset store and paginated row endpoints will not work.")
+    dataset_store = None
 
 app = FastAPI()
 
@@ -23,18 +51,23 @@ header_mapping = {} # Initialize header mapping variable
 actual_headers = [] # Initialize actual headers variable
 
 # Initialize OpenAI client - Assumes OPENAI_API_KEY environment variable is set
-# You might want to add more robust error handling for API key loading in a production app
-try:
-    load_dotenv()  # Load environment variables from .env file if it exists
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"),
-                    base_url="https://litellm.int.thomsonreuters.com")
-except TypeError:
-    print("ERROR: OPENAI_API_KEY environment variable not set.")
-    client = None # Or handle this more gracefully
+load_dotenv()  # Load environment variables from .env file if it exists
+# Shared resilient client (pooled connections, timeouts, retries, circuit breaker); gateway URL is LLM_BASE_URL
+client = get_llm_client(os.getenv("OPENAI_API_KEY"))
 
 PREDEFINED_COLUMNS = {"amount": "datatype is number", "transactionDate": "datatype is date", "transactionDescription": "datatype is string", "disallowableExpenses": "datatype is number"}
 MAX_SAMPLE_ROWS = 5 # Number of sample data rows to send to LLM for each column
 
+# Known export layouts (by header fingerprint) skip the header-mapping LLM call
+header_mapping_cache = HeaderMappingCache()
+# Background upload -> map -> categorize pipelines, addressed by job ID
+job_store = JobStore()
+
+# Bulk categorization: client groups processed at once, and agent LLM calls in flight across all of them
+BULK_MAX_CONCURRENT_GROUPS = int(os.getenv("BULK_MAX_CONCURRENT_GROUPS", "8"))
+BULK_MAX_CONCURRENT_LLM_REQUESTS = int(os.getenv("BULK_MAX_CONCURRENT_LLM_REQUESTS", "32"))
+MAX_BULK_GROUPS = int(os.getenv("MAX_BULK_GROUPS", "500")) # Groups accepted per bulk request
+
 def convert_datetimes_to_string(obj):
     """
     Recursively convert datetime objects in nested lists/dictionaries to ISO format strings.
@@ -47,80 +80,79 @@ def convert_datetimes_to_string(obj):
         return obj.isoformat()
     return obj
 
-@app.post("/uploadfile/")
-async def create_upload_file(
-    file: UploadFile = File(...),
-    business_description: str = Form("") 
-):
-    try:
-        print(f"Received file: {file.filename}")
-        print(f"Received Business Description: {business_description}")
-        workbook = openpyxl.load_workbook(file.file)
-        
-        sheet = workbook.active
-        
-        non_empty_columns_indexes = [
-            i for i, col in enumerate(sheet.iter_cols(values_only=True))
-            if any(cell is not None for cell in col)
-        ]
+def parse_sheet_selection(sheets: str) -> Optional[List[str]]:
+    """
+    Parses the "sheets" form field: "" selects the active sheet only (None), "*" every sheet, and
+    a comma-separated list the named sheets.
+    """
+    names = [name.strip() for name in (sheets or "").split(",") if name.strip()]
+    return names or None
 
-        actual_headers = []
-        processed_data_rows = []
-        header_row_found_excel_idx = -1 # 1-based index of the header row in Excel
+def parse_workbook(source: Any, sheet_names: Optional[List[str]] = None) -> Tuple[List[str], List[str], List[List[Any]]]:
+    """
+    Parses the active sheet of source (an .xlsx/.xls workbook or CSV file, as a file object or path), or, when
+    sheet_names is given, the selected sheets of the workbook at path source in parallel, combined and tagged by sheet.
+    Returns (sheet titles, headers, data rows). This is blocking.
+    """
+    if sheet_names:
+        return parse_workbook_sheets(source, sheet_names)
+    sheet_title, actual_headers, processed_data_rows = parse_rows(source)
+    return [sheet_title], actual_headers, processed_data_rows
 
-        if not non_empty_columns_indexes:
-            print("Warning: No non-empty columns found. Headers and data rows will be empty.")
-        else:
-            for current_excel_row_idx, row_tuple in enumerate(sheet.iter_rows(values_only=True), start=1):
-                # Extract values from the current row based on non_empty_columns_indexes
-                current_row_selected_cols = []
-                for col_idx in non_empty_columns_indexes:
-                    if col_idx < len(row_tuple):
-                        current_row_selected_cols.append(row_tuple[col_idx])
-                    else:
-                        current_row_selected_cols.append(None) 
-                
-                # Check if this row (after selecting relevant columns) has any content
-                if any(cell_value is not None for cell_value in current_row_selected_cols):
-                    if header_row_found_excel_idx == -1: # Header not yet found
-                        actual_headers = [str(h) if h is not None else f"Unknown_Header_{i}" 
-                                          for i, h in enumerate(current_row_selected_cols)]
-                        header_row_found_excel_idx = current_excel_row_idx
-                        print(f"Header row found at Excel row index: {header_row_found_excel_idx}")
-                    else: # Header already found, this is a data row
-                        processed_data_rows.append(current_row_selected_cols)
-            
-            if header_row_found_excel_idx == -1:
-                print("Warning: No non-empty row found to be used as header. Headers and data will be empty.")
-
-        print(f"Sheet Name: {sheet.title}")
-        print(f"Actual Headers: {actual_headers}")
-        # print(f"Processed Data Rows (first few): {processed_data_rows[:5]}") # Print first 5 for brevity
-        if header_row_found_excel_idx != -1 and not processed_data_rows:
-            print("Info: Header row found, but no subsequent data rows.")
+def layout_fingerprint(actual_headers: List[str], processed_data_rows: List[List[Any]]) -> str:
+    """
+    Identifies the export layout by its headers and their inferred column types. This is blocking: inference
+    scans rows until every column has its sample, which is the whole sheet if one column is sparse.
+    """
+    column_types = infer_column_types(processed_data_rows, len(actual_headers))
+    return header_fingerprint(actual_headers, column_types)
+
+def store_upload(file: UploadFile) -> str:
+    """
+    Copies an upload to a named temp file (kept after closing) and returns its path. This is blocking.
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename or "")[1]) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+        return tmp.name
 
-        header_mapping = {}
-        # Use actual_headers for the condition and further processing
-        if client and actual_headers: 
-            # Prepare sample data for LLM using actual_headers and processed_data_rows
+def map_headers(actual_headers: List[str], processed_data_rows: List[List[Any]],
+                fingerprint: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Asks the LLM to map the sheet's headers to PREDEFINED_COLUMNS using sample values from each column.
+    When a fingerprint is given, a cached mapping for that layout is returned without calling the LLM,
+    and a successful LLM mapping is stored under it.
+    Returns {predefined column: matched header or None}. This is blocking; async endpoints run it in a worker thread.
+    """
+    if fingerprint and actual_headers:
+        cached_mapping = header_mapping_cache.get(fingerprint)
+        if cached_mapping is not None:
+            header_mapping_lookups.inc(result="hit")
+            print(f"Header mapping cache hit for fingerprint {fingerprint[:12]}.")
+            return cached_mapping
+        header_mapping_lookups.inc(result="miss")
+
+    header_mapping = {}
+    # Use actual_headers for the condition and further processing
+    if client and actual_headers: 
+        # Prepare sample data for LLM using actual_headers and processed_data_rows
+        with stage("sampling"):
             raw_sample_data_for_llm = {}
             for i, header_name in enumerate(actual_headers):
                 column_data = [row[i] for row in processed_data_rows if i < len(row) and row[i] is not None]
                 raw_sample_data_for_llm[header_name] = column_data[:MAX_SAMPLE_ROWS]
-            
+
             # Convert datetimes in sample data before sending to LLM
             sample_data_for_llm = convert_datetimes_to_string(raw_sample_data_for_llm)
-            print(f"Sample data for LLM (datetimes converted): {sample_data_for_llm}")
-
-            # Construct prompt for OpenAI
-            prompt_messages = [
-                {
-                    "role": "system",
-                    "content": "You are an expert data mapping assistant. Your task is to map user-provided Excel column headers to a predefined list of standard column names. You will be given the user's headers, sample data from each of their columns, and the list of predefined standard columns. Remember amount will be greater than disallowableExpenses. Return your mapping as a JSON object where keys are the predefined standard columns and values are the matched user headers. If no good match is found for a user header, use null as its value."
-                },
-                {
-                    "role": "user",
-                    "content": f"""
+
+        # Construct prompt for OpenAI
+        prompt_messages = [
+            {
+                "role": "system",
+                "content": "You are an expert data mapping assistant. Your task is to map user-provided Excel column headers to a predefined list of standard column names. You will be given the user's headers, sample data from each of their columns, and the list of predefined standard columns. Remember amount will be greater than disallowableExpenses. Return your mapping as a JSON object where keys are the predefined standard columns and values are the matched user headers. If no good match is found for a user header, use null as its value."
+            },
+            {
+                "role": "user",
+                "content": f"""
 User Headers:
 {actual_headers}
 
@@ -132,48 +164,136 @@ Predefined Standard Columns:
 
 Please provide the mapping as a JSON object.
 """
-                }
-            ]
+            }
+        ]
 
-            try:
-                print("Sending request to OpenAI...")
-                chat_completion = client.chat.completions.create(
+        try:
+            print("Sending request to OpenAI...")
+            started = time.perf_counter()
+            with stage("header_mapping_llm"):
+                chat_completion = client.create_chat_completion(
                     messages=prompt_messages,
-                    model="openai/gpt-4o", # Or "gpt-4" or other preferred model
+                    model=LLM_MODEL, # The backend's model name, or LLM_MODEL
                     response_format={ "type": "json_object" } # Request JSON output
                 )
-                llm_response_content = chat_completion.choices[0].message.content
-                print(f"LLM raw response: {llm_response_content}")
-                if llm_response_content:
-                    header_mapping = json.loads(llm_response_content)
-                else:
-                    # Consistent fallback: {predefined_column: None}
-                    header_mapping = {predefined_col: None for predefined_col in PREDEFINED_COLUMNS}
-                    print("LLM returned empty content. Using fallback mapping.")
-
-            except Exception as llm_e:
-                print(f"Error calling OpenAI or parsing response: {llm_e}")
+            usage_tracker.record("Header Mapping", chat_completion, time.perf_counter() - started)
+            llm_response_content = chat_completion.choices[0].message.content
+            if llm_response_content:
+                header_mapping = json.loads(llm_response_content)
+                if fingerprint:
+                    header_mapping_cache.set(fingerprint, header_mapping)
+            else:
                 # Consistent fallback: {predefined_column: None}
                 header_mapping = {predefined_col: None for predefined_col in PREDEFINED_COLUMNS}
-        
-        elif not client or not actual_headers: # Modified condition to also check actual_headers
-            if not client:
-                print("OpenAI client not initialized. Skipping LLM mapping.")
-            if not actual_headers:
-                print("No actual headers found. Skipping LLM mapping.")
-            # Consistent fallback: {predefined_column: "Client/Headers Issue"}
-            # Or simply None, but a string message might be more informative for this specific case
-            header_mapping = {predefined_col: "OpenAI client not initialized or no headers" for predefined_col in PREDEFINED_COLUMNS}
+                print("LLM returned empty content. Using fallback mapping.")
+
+        except Exception as llm_e:
+            stage_errors.inc(stage="header_mapping")
+            print(f"Error calling OpenAI or parsing response: {llm_e}")
+            # Consistent fallback: {predefined_column: None}
+            header_mapping = {predefined_col: None for predefined_col in PREDEFINED_COLUMNS}
+    
+    elif not client or not actual_headers: # Modified condition to also check actual_headers
+        if not client:
+            print("OpenAI client not initialized. Skipping LLM mapping.")
+        if not actual_headers:
+            print("No actual headers found. Skipping LLM mapping.")
+        # Consistent fallback: {predefined_column: "Client/Headers Issue"}
+        # Or simply None, but a string message might be more informative for this specific case
+        header_mapping = {predefined_col: "OpenAI client not initialized or no headers" for predefined_col in PREDEFINED_COLUMNS}
+    return header_mapping
+
+@stage("apply_mapping")
+def apply_header_mapping(actual_headers: List[str], processed_data_rows: List[List[Any]],
+                         header_mapping: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """
+    Applies the header mapping to the data rows and returns the mapped dataset in columnar form:
+    {predefined column: [value per row]}, with datetimes as ISO strings and None for unmapped columns.
+    A combined multi-sheet upload also keeps its SHEET_COLUMN, so every row still says which sheet it came from.
+    """
+    header_to_index = {header: i for i, header in enumerate(actual_headers)}
+    mapped_columns = {}
+    for predefined_col_name, mapped_header in header_mapping.items():
+        idx = header_to_index.get(mapped_header) if isinstance(mapped_header, str) else None
+        if idx is None:
+            mapped_columns[predefined_col_name] = [None] * len(processed_data_rows)
+        else:
+            mapped_columns[predefined_col_name] = [
+                convert_datetimes_to_string(row[idx]) if idx < len(row) else None for row in processed_data_rows
+            ]
+    sheet_idx = header_to_index.get(SHEET_COLUMN)
+    if sheet_idx is not None:
+        mapped_columns[SHEET_COLUMN] = [row[sheet_idx] if sheet_idx < len(row) else None for row in processed_data_rows]
+    return mapped_columns
+
+@app.post("/uploadfile/")
+async def create_upload_file(
+    file: UploadFile = File(...),
+    business_description: str = Form(""),
+    # "columnar" returns the mapped dataset as column arrays, "dataset" stores it server-side and returns its dataset_id
+    response_format: Literal["rows", "columnar", "dataset"] = Form("rows"),
+    sheets: str = Form("") # "" = active sheet, "*" = all sheets, or comma-separated sheet names
+):
+    if response_format == "dataset" and not dataset_store:
+        raise HTTPException(status_code=501, detail="Dataset store is not available due to import error.")
+    try:
+        print(f"Received file: {file.filename}")
+        print(f"Received Business Description: {business_description}")
+        sheet_names = parse_sheet_selection(sheets)
+        if sheet_names:
+            # Worker processes open the workbook by path, so the upload is copied to a temp file first
+            file_path = await run_in_threadpool(store_upload, file)
+            try:
+                sheet_titles, actual_headers, processed_data_rows = await run_in_threadpool(parse_workbook, file_path, sheet_names)
+            finally:
+                os.remove(file_path)
+        else:
+            # Single streaming pass over the read-only workbook; UploadFile already spools large uploads to disk
+            # openpyxl parsing is blocking, so it runs in a worker thread as well
+            sheet_titles, actual_headers, processed_data_rows = await run_in_threadpool(parse_workbook, file.file)
+
+        print(f"Sheet Names: {sheet_titles}")
+        print(f"Actual Headers: {actual_headers}")
+        # print(f"Processed Data Rows (first few): {processed_data_rows[:5]}") # Print first 5 for brevity
+        if actual_headers and not processed_data_rows:
+            print("Info: Header row found, but no subsequent data rows.")
+
+        # Type inference can scan the whole sheet (a sparse column), so it runs in a worker thread too
+        fingerprint = await run_in_threadpool(layout_fingerprint, actual_headers, processed_data_rows)
 
+        # Blocking LLM call runs in a worker thread so the event loop keeps serving other requests
+        header_mapping = await run_in_threadpool(map_headers, actual_headers, processed_data_rows, fingerprint)
+
+        if response_format in ("columnar", "dataset"):
+            # Mapping is applied here so the client receives {predefined column: [values]} and no raw rows
+            mapped_columns = await run_in_threadpool(
+                apply_header_mapping, actual_headers, processed_data_rows, header_mapping
+            )
+            result = {
+                "filename": file.filename,
+                "sheets": sheet_titles,
+                "headers": actual_headers,
+                "header_mapping": header_mapping,
+                "header_fingerprint": fingerprint,
+                "row_count": len(processed_data_rows)
+            }
+            if response_format == "dataset":
+                # The rows stay on the server; the client pages through them with /datasets/{dataset_id}/rows
+                result["dataset_id"] = await run_in_threadpool(dataset_store.create, mapped_columns, dict(result))
+            else:
+                result["mapped_columns"] = mapped_columns
+            return result
 
         # Convert datetimes in processed_data_rows before returning
-        final_processed_data_rows = convert_datetimes_to_string(processed_data_rows)
+        final_processed_data_rows = await run_in_threadpool(convert_datetimes_to_string, processed_data_rows)
 
         return {
             "filename": file.filename,
+            "sheets": sheet_titles,
             "headers": actual_headers, # Use actual_headers
             "non_empty_rows": final_processed_data_rows, # Use the correctly processed data rows
-            "header_mapping": header_mapping
+            "header_mapping": header_mapping,
+            "header_fingerprint": fingerprint # Send back with a confirmed mapping to /header-mappings/confirm
         }
     except Exception as e:
         print(f"Error in file processing: {e}")
@@ -193,54 +313,523 @@ class TransactionData(BaseModel):
 
 class CategorizationRequest(BaseModel):
     business_description: str
-    mapped_transactions: List[Dict[str, Any]] # Using Dict for flexibility from frontend
+    mapped_transactions: List[Dict[str, Any]] = [] # Using Dict for flexibility from frontend
+    # Columnar alternative to mapped_transactions, e.g. {"transactionDescription": [...]};
+    # when set, the response is {"category": [...]} in the same row order
+    mapped_columns: Dict[str, List[Any]] | None = None
+    # Optional known intent for this client; when set, intent identification is skipped
+    intent: Literal["salon", "tutor", "architectural", "uncategorized"] | None = None
 
-@app.post("/categorize-transactions/")
-async def categorize_transactions_endpoint(request: CategorizationRequest):
-    if not get_batch_categories: # UPDATED check
-        raise HTTPException(status_code=501, detail="Categorization service is not available due to import error.")
+def categorize_descriptions(business_description: str, transaction_descriptions: List[Any],
+                            intent: Optional[str] = None,
+                            on_rows_categorized: Optional[Callable[[List[Tuple[int, str]]], None]] = None,
+                            llm_slots: Optional[threading.Semaphore] = None) -> List[str]:
+    """
+    Categorizes one transaction description per row and returns the categories in row order.
+    Rows without a usable description get "Missing or Invalid Description". This is blocking.
+    on_rows_categorized, if given, receives [(row index, category), ...] batches as partial results arrive;
+    every row is reported exactly once before this function returns.
+    llm_slots is passed through to get_batch_categories to share an LLM call limit with concurrent batches.
+    """
+    # Collect all valid transaction descriptions for batch processing.
+    # Near-identical descriptions (differing only by dates, references, amounts, case or spacing) share a
+    # canonical key; each key is sent once, using the first original description as its representative.
+    valid_descriptions = [desc for desc in transaction_descriptions if isinstance(desc, str) and desc.strip()]
+    representative_by_key, canonical_key_by_description = group_by_canonical_key(valid_descriptions)
+    descriptions_to_categorize = list(representative_by_key.values())
 
-    # Collect all valid transaction descriptions for batch processing
-    descriptions_to_categorize = []
-    original_indices_map = {} # To map description back to its original transaction object if needed, or just iterate later
+    reported_rows = set()
+    on_partial_results = None
+    if on_rows_categorized:
+        # Fan each partial {representative: category} result out to the row indices it stands for
+        rows_by_representative: Dict[str, List[int]] = {}
+        for i, desc in enumerate(transaction_descriptions):
+            if isinstance(desc, str) and desc.strip():
+                representative = representative_by_key[canonical_key_by_description[desc]]
+                rows_by_representative.setdefault(representative, []).append(i)
 
-    for i, transaction_data_dict in enumerate(request.mapped_transactions):
-        desc = transaction_data_dict.get("transactionDescription")
-        if isinstance(desc, str) and desc.strip():
-            descriptions_to_categorize.append(desc)
-            # If descriptions are not unique, this map might lose some original contexts.
-            # Assuming for now that we will iterate through original transactions and use the map.
-            # original_indices_map[desc] = i # Example if needed for direct update
+        def on_partial_results(partial_map: Dict[str, str]) -> None:
+            rows = [(i, category) for representative, category in partial_map.items()
+                    for i in rows_by_representative.get(representative, []) if i not in reported_rows]
+            reported_rows.update(i for i, _ in rows)
+            if rows:
+                on_rows_categorized(rows)
 
     category_map = {}
     if descriptions_to_categorize:
-        print(f"Sending batch of {len(descriptions_to_categorize)} descriptions for categorization with business: '{request.business_description}'")
+        print(f"Sending batch of {len(descriptions_to_categorize)} unique descriptions (from {len(valid_descriptions)} rows) for categorization with business: '{business_description}'")
         try:
-            # Assuming get_batch_categories is a synchronous function as defined.
-            # If it were async, this would need 'await'.
             category_map = get_batch_categories(
-                business_query=request.business_description,
-                descriptions_list=descriptions_to_categorize
+                business_query=business_description,
+                descriptions_list=descriptions_to_categorize,
+                intent=intent,
+                on_partial_results=on_partial_results,
+                llm_slots=llm_slots
             )
-            print(f"Received category map: {category_map}")
+            print(f"Received categories for {len(category_map)} unique descriptions.")
         except Exception as e:
+            stage_errors.inc(stage="categorization")
             print(f"Error calling get_batch_categories: {e}")
             # Fallback: mark all descriptions in this batch with an error
             category_map = {desc: f"Error during batch categorization: {str(e)}" for desc in descriptions_to_categorize}
-    
-    # Update each transaction in the original list using the category_map
-    final_categorized_transactions = []
-    for transaction_data_dict in request.mapped_transactions:
-        desc = transaction_data_dict.get("transactionDescription")
-        category_to_assign = "Missing or Invalid Description" # Default for invalid/missing descriptions
 
+    categories = []
+    for desc in transaction_descriptions:
+        category_to_assign = "Missing or Invalid Description" # Default for invalid/missing descriptions
         if isinstance(desc, str) and desc.strip():
-            # If description was valid, get its category from the map.
+            # If description was valid, get the category of its canonical representative from the map.
             # Default to "Uncategorized" if not found in map (e.g., LLM didn't return it or error).
-            category_to_assign = category_map.get(desc, "Uncategorized")
-        
+            representative = representative_by_key.get(canonical_key_by_description.get(desc), desc)
+            category_to_assign = category_map.get(representative, "Uncategorized")
+        categories.append(category_to_assign)
+
+    if on_rows_categorized:
+        # Rows not covered by a partial result: invalid descriptions, omitted keys and errors
+        remaining_rows = [(i, category) for i, category in enumerate(categories) if i not in reported_rows]
+        if remaining_rows:
+            on_rows_categorized(remaining_rows)
+    return categories
+
+@app.post("/categorize-transactions/")
+async def categorize_transactions_endpoint(request: CategorizationRequest):
+    if not get_batch_categories: # UPDATED check
+        raise HTTPException(status_code=501, detail="Categorization service is not available due to import error.")
+
+    if request.mapped_columns is not None:
+        # Columnar request: only the description column is needed, and only the category column is returned
+        transaction_descriptions = request.mapped_columns.get("transactionDescription", [])
+    else:
+        transaction_descriptions = [t.get("transactionDescription") for t in request.mapped_transactions]
+
+    # get_batch_categories is synchronous (blocking LLM calls), so it runs in a worker thread
+    categories = await run_in_threadpool(
+        categorize_descriptions, request.business_description, transaction_descriptions, request.intent
+    )
+
+    if request.mapped_columns is not None:
+        return {"category": categories}
+
+    # Update each transaction in the original list with its category
+    final_categorized_transactions = []
+    for transaction_data_dict, category_to_assign in zip(request.mapped_transactions, categories):
         updated_transaction = transaction_data_dict.copy()
         updated_transaction["category"] = category_to_assign
         final_categorized_transactions.append(updated_transaction)
 
     return final_categorized_transactions
+
+class BulkCategorizationGroup(CategorizationRequest):
+    client_id: str | None = None # Echoed back so callers can match results to their clients
+
+class BulkCategorizationRequest(BaseModel):
+    groups: List[BulkCategorizationGroup]
+
+def categorize_groups(groups: List[BulkCategorizationGroup]) -> List[Dict[str, Any]]:
+    """
+    Categorizes many client groups at once. Intents are resolved first, each distinct business description
+    once and concurrently; then the groups run concurrently (at most BULK_MAX_CONCURRENT_GROUPS) with their
+    agent LLM calls sharing one BULK_MAX_CONCURRENT_LLM_REQUESTS limit. A failing group reports its error
+    without affecting the others. Returns one result per group, in request order. This is blocking.
+    """
+    llm_slots = threading.BoundedSemaphore(BULK_MAX_CONCURRENT_LLM_REQUESTS)
+
+    def resolve(business_description: str) -> Optional[str]:
+        try:
+            with llm_slots:
+                return resolve_intent(business_description)
+        except Exception as e:
+            print(f"Error resolving intent for bulk group: {e}")
+            return None
+
+    unresolved = list(dict.fromkeys(g.business_description for g in groups if not g.intent))
+    with ThreadPoolExecutor(max_workers=BULK_MAX_CONCURRENT_GROUPS) as executor:
+        resolved_intents = dict(zip(unresolved, executor.map(resolve, unresolved)))
+    print(f"Bulk categorization: {len(groups)} groups, {len(unresolved)} distinct business descriptions resolved.")
+
+    def run_group(group: BulkCategorizationGroup) -> Dict[str, Any]:
+        intent = group.intent or resolved_intents.get(group.business_description)
+        result: Dict[str, Any] = {"client_id": group.client_id, "intent": intent}
+        if group.mapped_columns is not None:
+            transaction_descriptions = group.mapped_columns.get("transactionDescription", [])
+        else:
+            transaction_descriptions = [t.get("transactionDescription") for t in group.mapped_transactions]
+        try:
+            categories = categorize_descriptions(group.business_description, transaction_descriptions,
+                                                 intent=intent, llm_slots=llm_slots)
+        except Exception as e:
+            print(f"Error in bulk group {group.client_id}: {e}")
+            result["error"] = str(e)
+            return result
+        if group.mapped_columns is not None:
+            result["category"] = categories
+        else:
+            result["transactions"] = [{**t, "category": c} for t, c in zip(group.mapped_transactions, categories)]
+        return result
+
+    with ThreadPoolExecutor(max_workers=BULK_MAX_CONCURRENT_GROUPS) as executor:
+        return list(executor.map(run_group, groups))
+
+@app.post("/categorize-transactions/bulk")
+async def categorize_transactions_bulk_endpoint(request: BulkCategorizationRequest):
+    """
+    Bulk variant of /categorize-transactions/ for many client businesses in one request. Each group is a
+    categorization request plus an optional client_id; the response is {"results": [...]} in group order,
+    each with client_id, intent and either "category" (columnar groups), "transactions" or "error".
+    """
+    if not get_batch_categories:
+        raise HTTPException(status_code=501, detail="Categorization service is not available due to import error.")
+    if len(request.groups) > MAX_BULK_GROUPS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_GROUPS} groups per bulk request.")
+
+    results = await run_in_threadpool(categorize_groups, request.groups)
+    return {"results": results}
+
+def stream_categorization(business_description: str, transaction_descriptions: List[Any], intent: Optional[str] = None,
+                          include_rows: bool = True,
+                          on_completed: Optional[Callable[[List[str]], None]] = None,
+                          row_window: Optional[range] = None) -> StreamingResponse:
+    """
+    Runs categorize_descriptions in a worker thread and streams its progress as NDJSON: one line per partial
+    result ({"rows": [{"index": i, "category": c}, ...], "completed": n, "total": N}, without "rows" unless
+    include_rows, and with only the rows whose index is in row_window if that is given), then a final
+    {"done": true, "completed": N, "total": N} line. on_completed, if given,
+    receives the categories in row order (in a worker thread) before the final line is sent.
+    Must be called from a running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+
+    def on_rows_categorized(rows):
+        # Called from the worker thread; hand the rows to the event loop
+        loop.call_soon_threadsafe(updates.put_nowait, rows)
+
+    async def run_categorization():
+        try:
+            return await run_in_threadpool(
+                categorize_descriptions, business_description, transaction_descriptions, intent, on_rows_categorized
+            )
+        finally:
+            loop.call_soon_threadsafe(updates.put_nowait, None) # End of stream marker
+
+    async def generate_ndjson():
+        task = asyncio.create_task(run_categorization())
+        completed = 0
+        total = len(transaction_descriptions)
+        try:
+            while True:
+                rows = await updates.get()
+                if rows is None:
+                    break
+                completed += len(rows)
+                update = {"completed": completed, "total": total}
+                if include_rows:
+                    update["rows"] = [{"index": i, "category": category} for i, category in rows
+                                      if row_window is None or i in row_window]
+                yield json.dumps(update) + "\n"
+            categories = await task # Surface any exception from the categorization thread
+            if on_completed:
+                await run_in_threadpool(on_completed, categories)
+            yield json.dumps({"done": True, "completed": completed, "total": total}) + "\n"
+        except Exception as e:
+            print(f"Error while streaming categorization: {e}")
+            yield json.dumps({"done": True, "error": str(e), "completed": completed, "total": total}) + "\n"
+
+    return StreamingResponse(generate_ndjson(), media_type="application/x-ndjson")
+
+@app.post("/categorize-transactions/stream")
+async def categorize_transactions_stream_endpoint(request: CategorizationRequest):
+    """
+    Streaming variant of /categorize-transactions/: responds with NDJSON, one line per partial result
+    ({"rows": [{"index": i, "category": c}, ...], "completed": n, "total": N}) as cache hits and agent
+    chunks complete, then a final {"done": true, "completed": N, "total": N} line.
+    """
+    if not get_batch_categories:
+        raise HTTPException(status_code=501, detail="Categorization service is not available due to import error.")
+
+    if request.mapped_columns is not None:
+        transaction_descriptions = request.mapped_columns.get("transactionDescription", [])
+    else:
+        transaction_descriptions = [t.get("transactionDescription") for t in request.mapped_transactions]
+
+    return stream_categorization(request.business_description, transaction_descriptions, request.intent)
+
+class CategoryCorrection(BaseModel):
+    transactionDescription: str
+    category: str
+
+class FeedbackRequest(BaseModel):
+    business_description: str = ""
+    # Known intent; when omitted it is resolved from business_description (normally an intent cache hit)
+    intent: Literal["salon", "tutor", "architectural", "uncategorized"] | None = None
+    corrections: List[CategoryCorrection]
+
+@app.post("/feedback/")
+async def record_category_feedback(request: FeedbackRequest):
+    if not feedback_store:
+        raise HTTPException(status_code=501, detail="Feedback store is not available due to import error.")
+    if not request.intent and not request.business_description.strip():
+        raise HTTPException(status_code=422, detail="Either intent or business_description is required.")
+
+    intent = request.intent or await run_in_threadpool(resolve_intent, request.business_description)
+    allowed_categories = set(VERTICAL_CATEGORIES.get(intent, []))
+    # Only real categories of the vertical are learned; placeholders like "Uncategorized" are skipped
+    accepted = [(c.transactionDescription, c.category) for c in request.corrections if c.category in allowed_categories]
+    skipped = [c.transactionDescription for c in request.corrections if c.category not in allowed_categories]
+
+    stored = await run_in_threadpool(feedback_store.record_many, intent, accepted)
+    # Keep the category cache and the similarity index consistent with the correction as well
+    await run_in_threadpool(category_cache.set_many, intent, dict(accepted))
+    await run_in_threadpool(similarity_index.add, intent, dict(accepted))
+    print(f"Stored {stored} category corrections for intent '{intent}', skipped {len(skipped)}.")
+    return {"intent": intent, "stored": stored, "skipped": skipped}
+
+@app.get("/feedback/stats")
+async def category_feedback_stats():
+    if not feedback_store:
+        raise HTTPException(status_code=501, detail="Feedback store is not available due to import error.")
+    return feedback_store.stats()
+
+@app.get("/category-cache/stats")
+async def category_cache_stats():
+    if not category_cache:
+        raise HTTPException(status_code=501, detail="Category cache is not available due to import error.")
+    return category_cache.stats()
+
+@app.get("/local-classifier/stats")
+async def local_classifier_stats():
+    if not local_classifier:
+        raise HTTPException(status_code=501, detail="Local classifier is not available due to import error.")
+    return local_classifier.stats()
+
+@app.get("/similarity-index/stats")
+async def similarity_index_stats():
+    if not similarity_index:
+        raise HTTPException(status_code=501, detail="Similarity index is not available due to import error.")
+    return similarity_index.stats()
+
+@app.get("/llm-usage/stats")
+async def llm_usage_stats():
+    return usage_tracker.stats()
+
+@app.get("/llm-client/stats")
+async def llm_client_stats():
+    if not client:
+        raise HTTPException(status_code=501, detail="LLM client is not available.")
+    return client.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # Prometheus text exposition format: stage timings, LLM calls/tokens, rows per answering tier, error counts
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/intent-cache/stats")
+async def intent_cache_stats():
+    if not intent_cache:
+        raise HTTPException(status_code=501, detail="Intent cache is not available due to import error.")
+    return intent_cache.stats()
+
+class HeaderMappingConfirmation(BaseModel):
+    header_fingerprint: str
+    header_mapping: Dict[str, Optional[str]] # {predefined column: user header or None}
+
+@app.post("/header-mappings/confirm")
+async def confirm_header_mapping(request: HeaderMappingConfirmation):
+    unknown_columns = [col for col in request.header_mapping if col not in PREDEFINED_COLUMNS]
+    if unknown_columns:
+        raise HTTPException(status_code=422, detail=f"Unknown predefined columns: {unknown_columns}")
+    # Store a full mapping so cached answers have the same shape as LLM answers
+    header_mapping = {col: request.header_mapping.get(col) for col in PREDEFINED_COLUMNS}
+    await run_in_threadpool(header_mapping_cache.set, request.header_fingerprint, header_mapping, True)
+    return {"status": "confirmed", "header_fingerprint": request.header_fingerprint}
+
+@app.get("/header-mappings/stats")
+async def header_mapping_cache_stats():
+    return header_mapping_cache.stats()
+
+def run_upload_pipeline(job_id: str, file_path: str, filename: str, business_description: str,
+                        intent: Optional[str] = None, sheet_names: Optional[List[str]] = None,
+                        store_dataset: bool = False) -> Dict[str, Any]:
+    """
+    Background job body: parses the stored upload, maps its headers and categorizes every row,
+    reporting stage and progress to job_store. Returns the mapped dataset in columnar form plus a category column,
+    or, with store_dataset, stores it in dataset_store and returns its dataset_id instead.
+    """
+    try:
+        job_store.update(job_id, stage="parsing", progress=0.0)
+        sheet_titles, actual_headers, processed_data_rows = parse_workbook(file_path, sheet_names)
+    finally:
+        os.remove(file_path) # The spooled copy is only needed for parsing
+
+    job_store.update(job_id, stage="mapping", progress=0.1)
+    fingerprint = layout_fingerprint(actual_headers, processed_data_rows)
+    header_mapping = map_headers(actual_headers, processed_data_rows, fingerprint)
+    mapped_columns = apply_header_mapping(actual_headers, processed_data_rows, header_mapping)
+    row_count = len(processed_data_rows)
+    del processed_data_rows # Only the mapped columns are needed from here on
+
+    job_store.update(job_id, stage="categorizing", progress=0.2)
+    transaction_descriptions = mapped_columns.get("transactionDescription", [])
+    if get_batch_categories and transaction_descriptions:
+        categorized_row_count = 0
+
+        def report_progress(rows):
+            nonlocal categorized_row_count
+            categorized_row_count += len(rows)
+            job_store.update(job_id, progress=0.2 + 0.8 * categorized_row_count / len(transaction_descriptions))
+
+        mapped_columns["category"] = categorize_descriptions(
+            business_description, transaction_descriptions, intent, on_rows_categorized=report_progress
+        )
+
+    result = {
+        "filename": filename,
+        "sheet_name": ", ".join(sheet_titles),
+        "sheets": sheet_titles,
+        "headers": actual_headers,
+        "header_mapping": header_mapping,
+        "header_fingerprint": fingerprint,
+        "row_count": row_count
+    }
+    if store_dataset:
+        categories = mapped_columns.pop("category", None)
+        result["dataset_id"] = dataset_store.create(mapped_columns, dict(result))
+        if categories is not None:
+            dataset_store.set_categories(result["dataset_id"], categories)
+    else:
+        result["mapped_columns"] = mapped_columns
+    return result
+
+@app.post("/jobs/")
+async def create_pipeline_job(
+    file: UploadFile = File(...),
+    business_description: str = Form(""),
+    intent: Literal["salon", "tutor", "architectural", "uncategorized"] | None = Form(None),
+    sheets: str = Form(""), # "" = active sheet, "*" = all sheets, or comma-separated sheet names
+    response_format: Literal["columnar", "dataset"] = Form("columnar") # "dataset" keeps the result rows server-side
+):
+    if response_format == "dataset" and not dataset_store:
+        raise HTTPException(status_code=501, detail="Dataset store is not available due to import error.")
+    # The upload is copied to a temp file because UploadFile is closed once this request returns
+    file_path = await run_in_threadpool(store_upload, file)
+    job_id = job_store.submit(run_upload_pipeline, file_path, file.filename, business_description, intent,
+                              parse_sheet_selection(sheets), response_format == "dataset")
+    print(f"Created pipeline job {job_id} for file: {file.filename}")
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def get_pipeline_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_pipeline_job_result(job_id: str):
+    job = job_store.get(job_id, include_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {job['error']}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is not finished yet (stage: {job['stage']}).")
+    return job["result"]
+
+def require_dataset(dataset_id: str) -> Dict[str, Any]:
+    """
+    Returns the dataset's info, raising 501 if the dataset store is unavailable and 404 if the dataset is unknown.
+    """
+    if not dataset_store:
+        raise HTTPException(status_code=501, detail="Dataset store is not available due to import error.")
+    info = dataset_store.info(dataset_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Dataset not found or expired.")
+    return info
+
+@app.get("/datasets/{dataset_id}")
+async def get_dataset(dataset_id: str):
+    return require_dataset(dataset_id)
+
+@app.get("/datasets/{dataset_id}/rows")
+async def get_dataset_rows(dataset_id: str, offset: int = 0, limit: int = 100,
+                           category: Optional[str] = None, search: Optional[str] = None):
+    """
+    One page of a stored dataset in columnar form, optionally filtered by category and/or a case-insensitive
+    description substring: {"total", "offset", "limit", "row_index": [...], "columns": {column: [values]}}.
+    """
+    require_dataset(dataset_id)
+    return await run_in_threadpool(dataset_store.page, dataset_id, offset, limit, category, search)
+
+class DatasetCategorizationRequest(BaseModel):
+    business_description: str
+    intent: Literal["salon", "tutor", "architectural", "uncategorized"] | None = None
+
+@app.post("/datasets/{dataset_id}/categorize")
+async def categorize_dataset(dataset_id: str, request: DatasetCategorizationRequest):
+    """
+    Categorizes every row of a stored dataset and stores the categories with it; rows are then read back by page.
+    """
+    if not get_batch_categories:
+        raise HTTPException(status_code=501, detail="Categorization service is not available due to import error.")
+    require_dataset(dataset_id)
+    transaction_descriptions = await run_in_threadpool(dataset_store.column, dataset_id, "transactionDescription")
+    categories = await run_in_threadpool(
+        categorize_descriptions, request.business_description, transaction_descriptions, request.intent
+    )
+    await run_in_threadpool(dataset_store.set_categories, dataset_id, categories)
+    return {"dataset_id": dataset_id, "row_count": len(categories), "categorized": True}
+
+@app.post("/datasets/{dataset_id}/categorize/stream")
+async def categorize_dataset_stream(dataset_id: str, request: DatasetCategorizationRequest,
+                                    offset: int = 0, limit: int = 0):
+    """
+    Streaming variant of /datasets/{dataset_id}/categorize: NDJSON progress lines ({"completed": n, "total": N}),
+    then a final {"done": true, ...} line once the categories are stored. Progress lines carry the categories
+    of only the rows offset..offset+limit (the page a client is showing, as with /rows) under "rows", so the
+    stream stays small however large the dataset is; with the default limit of 0 they carry none.
+    """
+    if not get_batch_categories:
+        raise HTTPException(status_code=501, detail="Categorization service is not available due to import error.")
+    require_dataset(dataset_id)
+    transaction_descriptions = await run_in_threadpool(dataset_store.column, dataset_id, "transactionDescription")
+    return stream_categorization(request.business_description, transaction_descriptions, request.intent,
+                                 include_rows=limit > 0,
+                                 on_completed=lambda categories: dataset_store.set_categories(dataset_id, categories),
+                                 row_window=range(max(offset, 0), max(offset, 0) + limit))
+
+class CategoryEdit(BaseModel):
+    row_index: int
+    category: str
+
+class CategoryEditsRequest(BaseModel):
+    edits: List[CategoryEdit]
+
+@app.patch("/datasets/{dataset_id}/categories")
+async def edit_dataset_categories(dataset_id: str, request: CategoryEditsRequest):
+    """
+    Changes the category of individual rows (by row_index from /rows). Returns the number of rows changed and
+    the updated /summary entries of only the categories they left or joined (count 0 when a category emptied),
+    so clients patch their summary instead of reloading it.
+    """
+    info = require_dataset(dataset_id)
+    if not info["categorized"]:
+        raise HTTPException(status_code=409, detail="Dataset is not categorized yet.")
+    edits = {edit.row_index: edit.category for edit in request.edits}
+    applied = await run_in_threadpool(dataset_store.update_categories, dataset_id, edits)
+    touched_categories = set(applied.values()) | {edits[row_index] for row_index in applied}
+    summary = await run_in_threadpool(dataset_store.category_summary, dataset_id, touched_categories)
+    return {"dataset_id": dataset_id, "updated": len(applied), "summary": summary}
+
+@app.get("/datasets/{dataset_id}/summary")
+async def get_dataset_category_summary(dataset_id: str):
+    """
+    Totals of amount and disallowableExpenses, and row counts, per category over the dataset's current categories,
+    each with a per-month breakdown. Built once per dataset, then kept up to date by category edits.
+    """
+    require_dataset(dataset_id)
+    return {"dataset_id": dataset_id, "summary": await run_in_threadpool(dataset_store.category_summary, dataset_id)}
+
+@app.delete("/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: str):
+    require_dataset(dataset_id)
+    await run_in_threadpool(dataset_store.delete, dataset_id)
+    return {"dataset_id": dataset_id, "deleted": True}
@@ -0,0 +1,96 @@
+"""
+Memory/time benchmark of the streaming Excel ingestion (ingestion.parse_excel_rows) against the previous
+implementation (normal-mode load_workbook, iter_cols to find non-empty columns, then iter_rows).
+
+Run from the repository root:
+    python benchmarks/bench_excel_ingestion.py --rows 10000 50000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingestion import parse_excel_rows  # noqa: E402
+
+
+def generate_workbook(path: str, rows: int) -> None:
+    """
+    Writes a ledger-like workbook: two blank leading rows, a blank column and four data columns.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Ledger")
+    sheet.append([])
+    sheet.append([])
+    sheet.append(["Date", None, "Details", "Value", "Non deductible"])
+    start = datetime(2024, 1, 1)
+    descriptions = ["Rent for salon premises", "Card payment TESCO", "Client payment for haircut", "Electricity bill"]
+    for i in range(rows):
+        amount = round(random.uniform(5, 500), 2)
+        sheet.append([start + timedelta(days=i % 365), None, f"{random.choice(descriptions)} REF {i}",
+                      amount, round(amount * 0.1, 2)])
+    workbook.save(path)
+
+
+def legacy_parse_excel_rows(file_obj):
+    """
+    The ingestion code previously inlined in create_upload_file.
+    """
+    workbook = openpyxl.load_workbook(file_obj)
+    sheet = workbook.active
+    non_empty_columns_indexes = [
+        i for i, col in enumerate(sheet.iter_cols(values_only=True))
+        if any(cell is not None for cell in col)
+    ]
+    actual_headers = []
+    processed_data_rows = []
+    header_found = False
+    for row_tuple in sheet.iter_rows(values_only=True):
+        selected = [row_tuple[i] if i < len(row_tuple) else None for i in non_empty_columns_indexes]
+        if any(v is not None for v in selected):
+            if not header_found:
+                actual_headers = [str(h) if h is not None else f"Unknown_Header_{i}" for i, h in enumerate(selected)]
+                header_found = True
+            else:
+                processed_data_rows.append(selected)
+    return sheet.title, actual_headers, processed_data_rows
+
+
+def measure(parse_function, path: str):
+    # Time and peak memory are measured in separate runs; tracemalloc itself slows parsing down
+    with open(path, "rb") as f:
+        start = time.perf_counter()
+        result = parse_function(f)
+        elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    with open(path, "rb") as f:
+        result = parse_function(f)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), len(result[2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} | {'implementation':<10} | {'time (s)':>9} | {'peak MB':>9} | {'data rows':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.rows:
+            path = os.path.join(tmp_dir, f"ledger_{rows}.xlsx")
+            generate_workbook(path, rows)
+            for name, parse_function in [("legacy", legacy_parse_excel_rows), ("streaming", parse_excel_rows)]:
+                elapsed, peak_mb, data_rows = measure(parse_function, path)
+                print(f"{rows:>8} | {name:<10} | {elapsed:>9.2f} | {peak_mb:>9.1f} | {data_rows:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+End-to-end scaling benchmark of /uploadfile/ and /categorize-transactions/ against the offline mock LLM.
+
+For each row count a synthetic ledger is generated, then a fresh Python process (so peak RSS is per size)
+loads the app in-process with empty caches, and measures:
+  parse       ingestion.parse_excel_rows on its own
+  mapping     map_headers (one mock LLM call) on its own
+  upload      POST /uploadfile/ (columnar response), end to end
+  categorize  POST /categorize-transactions/ with the uploaded descriptions, and its rows/s
+  tiers       unique descriptions answered per tier during categorize (categorization_rows_total by source)
+plus peak RSS and the upload file / request / response payload sizes.
+
+The default vocabulary mostly hits the local classifier's keyword rules, so rows/s then measures that tier;
+--vocabulary opaque sends every unique description to the (mock) LLM instead.
+
+The mock LLM server is started automatically. Run from the repository root:
+    python benchmarks/bench_pipeline.py --rows 1000 10000 100000 500000 --json results.json
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ledger_generator import VERTICAL_VOCABULARIES, VOCABULARIES, generate_ledger  # noqa: E402
+
+TIERS = ["feedback", "cache", "similarity", "local", "llm"] # Sources of categorization_rows_total
+
+BUSINESS_DESCRIPTIONS = {
+    "salon": "This is a hair salon.",
+    "tutor": "I am a private maths tutor.",
+    "architectural": "We are an architectural design practice.",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 20.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Mock LLM server did not start on port {port}.")
+
+
+def run_single(path: str, vertical: str) -> dict:
+    """
+    Measures one workbook in this process. Expects LLM_BACKEND=mock and isolated cache paths in the environment.
+    """
+    import app  # Imported here so the environment prepared by the parent process applies
+    from fastapi.testclient import TestClient
+    from ingestion import parse_excel_rows
+    from metrics import rows_answered
+
+    client = TestClient(app.app)
+    result = {"file_bytes": os.path.getsize(path)}
+
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        _, headers, rows = parse_excel_rows(f)
+    result["parse_seconds"] = time.perf_counter() - start
+    result["parsed_rows"] = len(rows)
+
+    start = time.perf_counter()
+    app.map_headers(headers, rows) # No fingerprint: always a (mock) LLM call
+    result["mapping_seconds"] = time.perf_counter() - start
+    del rows
+
+    with open(path, "rb") as f:
+        start = time.perf_counter()
+        response = client.post("/uploadfile/", files={"file": ("ledger.xlsx", f)},
+                               data={"business_description": BUSINESS_DESCRIPTIONS[vertical], "response_format": "columnar"})
+    result["upload_seconds"] = time.perf_counter() - start
+    result["upload_response_bytes"] = len(response.content)
+    descriptions = response.json()["mapped_columns"]["transactionDescription"]
+    del response
+
+    request_body = json.dumps({"business_description": BUSINESS_DESCRIPTIONS[vertical],
+                               "mapped_columns": {"transactionDescription": descriptions}})
+    result["categorize_request_bytes"] = len(request_body)
+    answered_before = {source: rows_answered._values.get((source,), 0.0) for source in TIERS}
+    start = time.perf_counter()
+    response = client.post("/categorize-transactions/", content=request_body, headers={"content-type": "application/json"})
+    result["categorize_seconds"] = time.perf_counter() - start
+    result["rows_by_tier"] = {source: int(rows_answered._values.get((source,), 0.0) - answered_before[source])
+                              for source in TIERS}
+    result["categorize_response_bytes"] = len(response.content)
+    result["categorized_rows"] = len(response.json()["category"])
+    result["rows_per_second"] = result["categorized_rows"] / result["categorize_seconds"]
+    result["llm_usage"] = app.usage_tracker.stats()["nodes"]
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+    return result
+
+
+def run_size(rows: int, args, mock_url: str, tmp_dir: str) -> dict:
+    path = os.path.join(tmp_dir, f"ledger_{rows}.xlsx")
+    start = time.perf_counter()
+    summary = generate_ledger(path, rows, vertical=args.vertical, duplication_rate=args.duplication_rate,
+                              header_offset=args.header_offset, extra_columns=args.extra_columns,
+                              blank_columns=args.blank_columns, sparse_columns=args.sparse_columns, seed=args.seed,
+                              vocabulary=args.vocabulary)
+    print(f"Generated {rows} rows ({summary['unique_descriptions']} unique descriptions) in {time.perf_counter() - start:.1f}s")
+
+    state_dir = os.path.join(tmp_dir, f"state_{rows}") # Empty caches per size: every run starts cold
+    os.makedirs(state_dir)
+    env = dict(os.environ, LLM_BACKEND="mock", MOCK_LLM_BASE_URL=mock_url,
+               OPENAI_API_KEY="bench", OPENAI_AGENT_API_KEY="bench",
+               LLM_CACHE_DB_PATH=os.path.join(state_dir, "llm_cache.db"),
+               SIMILARITY_INDEX_DIR=os.path.join(state_dir, "similarity_index"))
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--single", path, "--vertical", args.vertical],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        print(completed.stderr[-4000:])
+        raise RuntimeError(f"Benchmark run for {rows} rows failed.")
+    # The app logs to stdout; the result is the last line
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result.update(rows=rows, unique_descriptions=summary["unique_descriptions"])
+    os.remove(path)
+    return result
+
+
+def print_report(results) -> None:
+    # The tier columns count unique descriptions, which is what each tier answers
+    print(f"\n{'rows':>8} {'parse s':>8} {'map s':>7} {'upload s':>9} {'categ. s':>9} {'rows/s':>9} "
+          + "".join(f"{tier:>11}" for tier in TIERS) + " "
+          f"{'peak MB':>8} {'file MB':>8} {'up resp MB':>11} {'cat req MB':>11} {'cat resp MB':>12}")
+    mb = 1024 * 1024
+    for r in results:
+        print(f"{r['rows']:>8} {r['parse_seconds']:>8.2f} {r['mapping_seconds']:>7.2f} {r['upload_seconds']:>9.2f} "
+              f"{r['categorize_seconds']:>9.2f} {r['rows_per_second']:>9.0f} "
+              + "".join(f"{r['rows_by_tier'][tier]:>11}" for tier in TIERS) + " "
+              f"{r['peak_rss_mb']:>8.0f} "
+              f"{r['file_bytes'] / mb:>8.2f} {r['upload_response_bytes'] / mb:>11.2f} "
+              f"{r['categorize_request_bytes'] / mb:>11.2f} {r['categorize_response_bytes'] / mb:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000, 500000])
+    parser.add_argument("--vertical", choices=sorted(VERTICAL_VOCABULARIES), default="salon")
+    parser.add_argument("--duplication-rate", type=float, default=0.3)
+    parser.add_argument("--header-offset", type=int, default=2)
+    parser.add_argument("--extra-columns", type=int, default=2)
+    parser.add_argument("--blank-columns", type=int, default=1)
+    parser.add_argument("--sparse-columns", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vocabulary", choices=VOCABULARIES, default="vertical",
+                        help="Description templates; \"opaque\" matches no local classifier rule, so the LLM tier is measured")
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="Mock LLM base latency per call")
+    parser.add_argument("--llm-latency-per-item-ms", type=float, default=2, help="Mock LLM latency per categorized row")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of mock LLM calls failing with 429/503")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--single", help=argparse.SUPPRESS) # Internal: measure one workbook in this process
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_single(args.single, args.vertical)
+        print(json.dumps(result))
+        return
+
+    port = free_port()
+    mock_env = dict(os.environ, MOCK_LLM_LATENCY_MS=str(args.llm_latency_ms),
+                    MOCK_LLM_LATENCY_PER_ITEM_MS=str(args.llm_latency_per_item_ms),
+                    MOCK_LLM_ERROR_RATE=str(args.llm_error_rate), MOCK_LLM_SEED=str(args.seed), MOCK_LLM_PORT=str(port))
+    mock = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, "mock_llm_server.py")], cwd=REPO_ROOT,
+                            env=mock_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        results = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for rows in args.rows:
+                results.append(run_size(rows, args, f"http://127.0.0.1:{port}/v1", tmp_dir))
+                print_report(results[-1:])
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Synthetic ledger workbook generator for the benchmarks.
+
+Run from the repository root, e.g.:
+    python benchmarks/ledger_generator.py ledger.xlsx --rows 100000 --vertical tutor --duplication-rate 0.5
+
+--vocabulary opaque writes bank-statement style descriptions that match none of the local classifier's keyword
+rules, so every unique description reaches the LLM tier instead of being answered by the rules.
+"""
+import argparse
+import random
+import string
+from datetime import datetime, timedelta
+
+import openpyxl
+
+# Description templates per vertical; "{merchant}" is filled with a generated trading name
+VERTICAL_VOCABULARIES = {
+    "salon": [
+        "Client payment for haircut {merchant}", "Purchase of hair dye from {merchant}", "Shampoo and conditioner order {merchant}",
+        "Rent for salon premises {merchant}", "Salary payment to assistant {merchant}", "Instagram ads {merchant}",
+        "Replacement scissors and brushes {merchant}", "Electricity bill {merchant}", "Card payment {merchant}",
+        "Gift voucher sale {merchant}", "Accountant fees {merchant}", "Train to trade show {merchant}",
+    ],
+    "tutor": [
+        "Payment from student {merchant}", "Tuition fees received {merchant}", "Textbooks from {merchant}",
+        "Zoom subscription {merchant}", "Office rent {merchant}", "Stationery from {merchant}",
+        "Facebook ads {merchant}", "Printer repair {merchant}", "Bus fare to lesson {merchant}",
+        "Referral commission {merchant}", "Loan interest {merchant}", "Card payment {merchant}",
+    ],
+    "architectural": [
+        "Design fee received from {merchant}", "Structural engineer {merchant}", "AutoCAD licence {merchant}",
+        "Office rent {merchant}", "Client dinner at {merchant}", "Fuel {merchant}", "Surveyor invoice {merchant}",
+        "Website hosting {merchant}", "Professional indemnity insurance {merchant}", "Printer paper from {merchant}",
+        "Bad debt written off {merchant}", "Card payment {merchant}",
+    ],
+}
+
+# Bank-statement style templates with no vertical keywords: no local classifier rule matches them
+OPAQUE_VOCABULARY = [
+    "Card payment {merchant}", "Faster payment to {merchant}", "Direct debit {merchant}", "Standing order {merchant}",
+    "Transfer from {merchant}", "Purchase at {merchant}", "Online order {merchant}", "BACS credit {merchant}",
+    "Contactless {merchant}", "Refund from {merchant}", "Monthly plan {merchant}", "Payment received {merchant}",
+]
+VOCABULARIES = ["vertical", "opaque"]
+
+
+def trading_name(rng: random.Random) -> str:
+    """
+    A pronounceable, digit-free name, so that canonical-key normalization does not collapse distinct rows.
+    """
+    syllables = [rng.choice("bcdfghjklmnprstvw") + rng.choice("aeiou") for _ in range(rng.randint(2, 4))]
+    return "".join(syllables).capitalize() + rng.choice(["", " Ltd", " & Co", " UK"])
+
+
+def generate_ledger(path: str, rows: int, vertical: str = "salon", duplication_rate: float = 0.3,
+                    header_offset: int = 2, extra_columns: int = 0, blank_columns: int = 1,
+                    sparse_columns: int = 1, seed: int = 0, vocabulary: str = "vertical") -> dict:
+    """
+    Writes a ledger-like workbook to path and returns a summary of what was written.
+    - header_offset blank rows precede the header row.
+    - blank_columns fully empty columns are interleaved with the data columns (ingestion must drop them).
+    - sparse_columns columns are filled in about 5% of rows; extra_columns are fully populated free-text columns.
+    - duplication_rate of the rows repeat an earlier description exactly (recurring transactions);
+      the rest get a fresh trading name, so they are distinct even after canonical-key normalization.
+    - vocabulary "vertical" uses the vertical's templates, "opaque" the keyword-free OPAQUE_VOCABULARY.
+    """
+    rng = random.Random(seed)
+    templates = OPAQUE_VOCABULARY if vocabulary == "opaque" else VERTICAL_VOCABULARIES[vertical]
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Ledger")
+    for _ in range(header_offset):
+        sheet.append([])
+
+    headers = ["Date", "Details", "Value", "Non deductible"]
+    headers += [f"Notes {i + 1}" for i in range(extra_columns)]
+    headers += [f"Memo {i + 1}" for i in range(sparse_columns)]
+    # Blank columns go right after the date column, like exports with a hidden spacer column
+    layout = headers[:1] + [None] * blank_columns + headers[1:]
+    sheet.append(layout)
+
+    start = datetime(2024, 1, 1)
+    seen_descriptions = []
+    unique_descriptions = 0
+    for i in range(rows):
+        if seen_descriptions and rng.random() < duplication_rate:
+            description = rng.choice(seen_descriptions)
+        else:
+            description = rng.choice(templates).format(merchant=trading_name(rng))
+            seen_descriptions.append(description)
+            unique_descriptions += 1
+        amount = round(rng.uniform(5, 2000), 2)
+        row = [start + timedelta(days=i % 365)] + [None] * blank_columns
+        row += [description, amount, round(amount * rng.choice([0, 0, 0.1, 0.5]), 2)]
+        row += ["".join(rng.choices(string.ascii_lowercase + " ", k=24)) for _ in range(extra_columns)]
+        row += [(f"memo {i}" if rng.random() < 0.05 else None) for _ in range(sparse_columns)]
+        sheet.append(row)
+    workbook.save(path)
+    return {"rows": rows, "unique_descriptions": unique_descriptions, "columns": len(layout)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--vertical", choices=sorted(VERTICAL_VOCABULARIES), default="salon")
+    parser.add_argument("--duplication-rate", type=float, default=0.3)
+    parser.add_argument("--header-offset", type=int, default=2)
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--blank-columns", type=int, default=1)
+    parser.add_argument("--sparse-columns", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vocabulary", choices=VOCABULARIES, default="vertical")
+    args = parser.parse_args()
+    summary = generate_ledger(args.path, args.rows, args.vertical, args.duplication_rate, args.header_offset,
+                              args.extra_columns, args.blank_columns, args.sparse_columns, args.seed, args.vocabulary)
+    print(f"Wrote {args.path}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Concurrency load test for a running API server: fires N simultaneous /uploadfile/ requests (optionally
+followed by /categorize-transactions/ with the returned rows) and reports p50/p99 latency and throughput.
+
+Start the server first, e.g. `uvicorn app:app --workers 1`, then run from the repository root:
+    python benchmarks/load_test.py --concurrency 20 --requests 100 --rows 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_excel_ingestion import generate_workbook  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_once(base_url: str, workbook_bytes: bytes, business_description: str, categorize: bool):
+    start = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/uploadfile/",
+        files={"file": ("ledger.xlsx", workbook_bytes,
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+        data={"business_description": business_description},
+        timeout=600,
+    )
+    upload_latency = time.perf_counter() - start
+    ok = response.status_code == 200 and "error" not in response.json()
+    categorize_latency = None
+    if ok and categorize:
+        body = response.json()
+        headers = body["headers"]
+        mapping = body["header_mapping"]
+        transactions = [
+            {column: (row[headers.index(header)] if header in headers else None) for column, header in mapping.items()}
+            for row in body["non_empty_rows"]
+        ]
+        start = time.perf_counter()
+        response = requests.post(
+            f"{base_url}/categorize-transactions/",
+            json={"business_description": business_description, "mapped_transactions": transactions},
+            timeout=600,
+        )
+        categorize_latency = time.perf_counter() - start
+        ok = response.status_code == 200
+    return ok, upload_latency, categorize_latency
+
+
+def report(name, latencies):
+    if not latencies:
+        return
+    print(f"{name:<26} p50 {percentile(latencies, 50):7.2f}s | p99 {percentile(latencies, 99):7.2f}s | "
+          f"mean {statistics.mean(latencies):7.2f}s | max {max(latencies):7.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=20, help="Simultaneous clients")
+    parser.add_argument("--requests", type=int, default=100, help="Total upload requests")
+    parser.add_argument("--rows", type=int, default=2000, help="Data rows in the generated workbook")
+    parser.add_argument("--business-description", default="This is a hair salon.")
+    parser.add_argument("--categorize", action="store_true", help="Also categorize the rows returned by each upload")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "ledger.xlsx")
+        generate_workbook(path, args.rows)
+        with open(path, "rb") as f:
+            workbook_bytes = f.read()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(
+            lambda _: run_once(args.base_url, workbook_bytes, args.business_description, args.categorize),
+            range(args.requests),
+        ))
+    wall_clock = time.perf_counter() - start
+
+    failures = sum(1 for ok, _, _ in results if not ok)
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.rows} rows each: "
+          f"{wall_clock:.2f}s wall clock, {args.requests / wall_clock:.2f} req/s, {failures} failed")
+    report("/uploadfile/", [upload for _, upload, _ in results])
+    report("/categorize-transactions/", [cat for _, _, cat in results if cat is not None])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Allowed transaction categories per business vertical (intent), as described in the agent prompts.
+VERTICAL_CATEGORIES = {
+    "salon": [
+        "Turnover", "Cost of Goods", "Premises Costs", "Employee Costs", "Other Direct Costs",
+        "General Administration Expenses", "Other Business Expenses", "Advertising and Promotion Costs",
+        "Interest", "Repairs", "Legal and Professional Costs", "Personal", "Depreciation",
+        "Subcontractor Expense", "Travel and Subsistence", "Other Income",
+    ],
+    "tutor": [
+        "Turnover", "Cost of Goods", "Premises Costs", "Employee Costs", "Other Direct Costs",
+        "General Administration Expenses", "Other Business Expenses", "Advertising and Promotion Costs",
+        "Interest", "Repairs", "Legal and Professional Costs", "Personal", "Depreciation",
+        "Travel and Subsistence", "Other Income",
+    ],
+    "architectural": [
+        "General Administration Expenses", "Turnover", "Premises Costs", "Legal and Professional Costs",
+        "Advertising and Promotion Costs", "Other Business Expenses", "Travel and Subsistence",
+        "Subcontractor Expense", "Other Direct Costs", "Motor Expenses", "Business Entertainment Costs",
+        "Employee Costs", "Depreciation", "Bad Debts", "Interest", "Other Income",
+    ],
+}
+
+# Short disambiguation hints per category, used to build the compact agent prompts. Hints shared by every
+# vertical live in COMMON_CATEGORY_HINTS; VERTICAL_CATEGORY_HINTS overrides or adds vertical-specific ones.
+COMMON_CATEGORY_HINTS = {
+    "Turnover": "income from the core services",
+    "Cost of Goods": "products consumed or resold in delivering the services",
+    "Premises Costs": "rent, utilities, premises insurance",
+    "Employee Costs": "salaries and wages of staff",
+    "Other Direct Costs": "tools, supplies and platforms used directly in delivering the services",
+    "General Administration Expenses": "office supplies, phone, internet, software, admin",
+    "Other Business Expenses": "miscellaneous operating costs such as cleaning and business insurance; lowest priority",
+    "Advertising and Promotion Costs": "ads, marketing, brochures, website hosting",
+    "Interest": "interest paid on loans",
+    "Repairs": "repair and maintenance of equipment and premises",
+    "Legal and Professional Costs": "accountancy, legal, professional memberships",
+    "Personal": "owner's income tax and National Insurance",
+    "Depreciation": "wear-and-tear write-down of assets",
+    "Subcontractor Expense": "payments to external contractors or consultants",
+    "Travel and Subsistence": "business travel, accommodation and meals",
+    "Motor Expenses": "fuel, vehicle insurance and repairs",
+    "Business Entertainment Costs": "entertaining clients or business partners",
+    "Bad Debts": "unpaid invoices written off",
+    "Other Income": "income outside the core services, e.g. interest received, commissions; lowest priority",
+}
+
+VERTICAL_CATEGORY_HINTS = {
+    "salon": {
+        "Turnover": "haircuts, styling, treatments, consultations",
+        "Cost of Goods": "hair dye, shampoo, conditioner, salon products",
+        "Other Direct Costs": "styling tools, towels, brushes, scissors",
+        "Other Income": "merchandise or gift voucher sales, supplier commissions; lowest priority",
+    },
+    "tutor": {
+        "Turnover": "payments from students or institutions for teaching",
+        "Cost of Goods": "textbooks, teaching supplies, digital resources",
+        "Other Direct Costs": "education software licences and platform subscriptions",
+        "Other Income": "sales of materials, referral commissions; lowest priority",
+    },
+    "architectural": {
+        "Turnover": "fees for projects, designs and consultations",
+        "Legal and Professional Costs": "insurance policies, professional memberships, accountancy, legal",
+        "Subcontractor Expense": "site evaluations, specialist consultants, outsourced work",
+        "Other Direct Costs": "project materials, design mockups, site visit materials",
+    },
+}
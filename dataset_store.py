@@ -0,0 +1,363 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from dotenv import load_dotenv
+from normalization import parse_number_text
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+DATASET_STORE_DIR = os.getenv("DATASET_STORE_DIR", "datasets")
+DATASET_TTL_SECONDS = int(os.getenv("DATASET_TTL_SECONDS", str(24 * 3600))) # Untouched datasets are removed after this
+MAX_PAGE_SIZE = int(os.getenv("DATASET_MAX_PAGE_SIZE", "1000")) # Rows per page request
+CATEGORY_COLUMN = "category"
+UNKNOWN_MONTH = "unknown" # Month bucket of rows without a parseable transaction date
+
+
+def to_arrow_array(values: List[Any]) -> "pa.Array":
+    """
+    Converts one column of Python values to an Arrow array; columns with mixed value types (e.g. amounts that
+    are partly text) are stored as strings, so the stored copy is lossless. Readers that need numbers
+    coerce at read time (numeric_column).
+    """
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def numeric_column(table: "pa.Table", name: str) -> np.ndarray:
+    """
+    Returns a column as float64 with non-numeric and missing values as 0 (all zeros if the column is absent).
+    Text columns (mixed columns are stored as text) are parsed with parse_number_text, so "1,234.50" counts.
+    """
+    if name not in table.column_names:
+        return np.zeros(table.num_rows)
+    column = table.column(name)
+    values = column.to_pandas()
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        return parse_number_text(values.astype(object)).fillna(0.0).to_numpy(dtype=float)
+    return pd.to_numeric(values, errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+
+def transaction_months(table: "pa.Table") -> np.ndarray:
+    """
+    Returns each row's transaction month as "YYYY-MM", or UNKNOWN_MONTH where the date is missing or unparseable.
+    """
+    if "transactionDate" not in table.column_names:
+        return np.full(table.num_rows, UNKNOWN_MONTH, dtype=object)
+    dates = pd.to_datetime(table.column("transactionDate").to_pandas(), errors="coerce")
+    # Formatting every date is the slow part; only the distinct year-month codes are formatted
+    codes = dates.dt.year * 100 + dates.dt.month
+    labels = {code: f"{int(code) // 100:04d}-{int(code) % 100:02d}" for code in codes.dropna().unique()}
+    return codes.map(labels).fillna(UNKNOWN_MONTH).to_numpy(dtype=object)
+
+
+class CategoryAggregates:
+    """
+    Totals of amount, disallowableExpenses and row count per category, overall and per transaction month.
+    Built once with a vectorized group-by; the per-row values are kept alongside, so a category edit moves a
+    row between buckets in O(1) instead of regrouping the dataset.
+    """
+
+    def __init__(self, categories: np.ndarray, amounts: np.ndarray, disallowable: np.ndarray, months: np.ndarray):
+        self.amounts = amounts
+        self.disallowable = disallowable
+        self.months = months
+        self.totals: Dict[str, Dict[str, Any]] = {} # category -> {"amount", "disallowableExpenses", "count", "months"}
+        grouped = pd.DataFrame({"category": categories, "month": months, "amount": amounts,
+                                "disallowableExpenses": disallowable}).groupby(["category", "month"], sort=False)
+        sums = grouped[["amount", "disallowableExpenses"]].sum()
+        counts = grouped.size()
+        for (category, month), amount, disallowable_amount, count in zip(
+                sums.index, sums["amount"], sums["disallowableExpenses"], counts):
+            self._add(category, month, float(amount), float(disallowable_amount), int(count))
+
+    def _add(self, category: str, month: str, amount: float, disallowable: float, count: int) -> None:
+        entry = self.totals.setdefault(category, {"amount": 0.0, "disallowableExpenses": 0.0, "count": 0, "months": {}})
+        month_entry = entry["months"].setdefault(month, {"amount": 0.0, "disallowableExpenses": 0.0, "count": 0})
+        for bucket in (entry, month_entry):
+            bucket["amount"] += amount
+            bucket["disallowableExpenses"] += disallowable
+            bucket["count"] += count
+        # Emptied buckets are dropped rather than left with floating-point residue
+        if month_entry["count"] <= 0:
+            del entry["months"][month]
+        if entry["count"] <= 0:
+            del self.totals[category]
+
+    def move(self, row_index: int, from_category: str, to_category: str) -> None:
+        """
+        Moves one row's values from one category to another.
+        """
+        month = self.months[row_index]
+        amount = float(self.amounts[row_index])
+        disallowable = float(self.disallowable[row_index])
+        self._add(from_category, month, -amount, -disallowable, -1)
+        self._add(to_category, month, amount, disallowable, 1)
+
+    def summary(self, categories: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns [{"category", "amount", "disallowableExpenses", "count", "months": {month: totals}}, ...] sorted by
+        category, for every category or only the given ones (categories without rows are reported with zero totals).
+        """
+        names = sorted(self.totals) if categories is None else sorted(set(categories))
+        summary = []
+        for name in names:
+            entry = self.totals.get(name, {"amount": 0.0, "disallowableExpenses": 0.0, "count": 0, "months": {}})
+            summary.append({"category": name, "amount": entry["amount"],
+                            "disallowableExpenses": entry["disallowableExpenses"], "count": entry["count"],
+                            "months": {month: dict(totals) for month, totals in sorted(entry["months"].items())}})
+        return summary
+
+
+class DatasetStore:
+    """
+    Server-side store of mapped datasets addressed by dataset ID, so clients fetch pages of rows instead of
+    holding the whole ledger. Each dataset is a directory with:
+    - data.arrow: the mapped columns as an uncompressed Arrow IPC file, memory-mapped on every read
+    - categories.arrow: the category column, written once categorization finishes
+    - edits.jsonl: append-only log of category edits, replayed into an in-memory overlay
+    - meta.json: upload metadata (filename, headers, header mapping, ...)
+    Category totals are kept in memory per dataset once requested and updated by every edit.
+    """
+
+    def __init__(self, store_dir: str = DATASET_STORE_DIR, ttl_seconds: int = DATASET_TTL_SECONDS):
+        self.store_dir = store_dir
+        self.ttl_seconds = ttl_seconds
+        self._edits: Dict[str, Dict[int, str]] = {} # dataset ID -> {row index: edited category}
+        self._aggregates: Dict[str, CategoryAggregates] = {} # dataset ID -> category totals, built on first use
+        self._lock = threading.RLock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, dataset_id: str, name: str = "") -> str:
+        if not dataset_id.isalnum(): # IDs are uuid4 hex; anything else must not reach the filesystem
+            raise KeyError(dataset_id)
+        return os.path.join(self.store_dir, dataset_id, name)
+
+    def _write_table(self, path: str, table: "pa.Table") -> None:
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path) # Readers never see a partially written file
+
+    def _read_table(self, dataset_id: str, name: str) -> Optional["pa.Table"]:
+        path = self._path(dataset_id, name)
+        if not os.path.exists(path):
+            return None
+        # Zero-copy: pages and filters only touch the parts of the file they read
+        return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+    def create(self, columns: Dict[str, List[Any]], metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Stores a columnar dataset ({column: [value per row]}) with its metadata and returns the new dataset ID.
+        """
+        self._purge_expired()
+        dataset_id = uuid.uuid4().hex
+        os.makedirs(self._path(dataset_id))
+        table = pa.table({name: to_arrow_array(values) for name, values in columns.items()})
+        self._write_table(self._path(dataset_id, "data.arrow"), table)
+        with open(self._path(dataset_id, "meta.json"), "w") as f:
+            # Without mapped columns the table has no rows; the caller's row_count is kept then
+            json.dump({"row_count": table.num_rows, **(metadata or {}), "columns": table.column_names,
+                       "created_at": time.time()}, f)
+        print(f"Stored dataset {dataset_id}: {table.num_rows} rows, {table.nbytes / 1024 / 1024:.1f} MB.")
+        return dataset_id
+
+    def info(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the dataset's metadata plus whether it is categorized and its number of edits, or None if unknown.
+        """
+        try:
+            with open(self._path(dataset_id, "meta.json")) as f:
+                info = json.load(f)
+        except (KeyError, FileNotFoundError):
+            return None
+        info["dataset_id"] = dataset_id
+        info["categorized"] = os.path.exists(self._path(dataset_id, "categories.arrow"))
+        info["edits"] = len(self._load_edits(dataset_id))
+        return info
+
+    def column(self, dataset_id: str, name: str) -> List[Any]:
+        """
+        Returns one stored column as a Python list (all None if the dataset has no such column).
+        """
+        table = self._read_table(dataset_id, "data.arrow")
+        if table is None:
+            raise KeyError(dataset_id)
+        if name not in table.column_names:
+            return [None] * table.num_rows
+        return table.column(name).to_pylist()
+
+    def set_categories(self, dataset_id: str, categories: List[str]) -> None:
+        """
+        Stores the category of every row, replacing earlier categories and discarding their edits.
+        """
+        if self.info(dataset_id) is None:
+            raise KeyError(dataset_id)
+        self._write_table(self._path(dataset_id, "categories.arrow"),
+                          pa.table({CATEGORY_COLUMN: pa.array(categories, type=pa.string())}))
+        with self._lock:
+            self._edits[dataset_id] = {}
+            self._aggregates.pop(dataset_id, None)
+            if os.path.exists(self._path(dataset_id, "edits.jsonl")):
+                os.remove(self._path(dataset_id, "edits.jsonl"))
+
+    def _load_edits(self, dataset_id: str) -> Dict[int, str]:
+        with self._lock:
+            edits = self._edits.get(dataset_id)
+            if edits is None:
+                edits = {}
+                path = self._path(dataset_id, "edits.jsonl")
+                if os.path.exists(path):
+                    with open(path) as f:
+                        for line in f:
+                            entry = json.loads(line)
+                            edits[entry["row_index"]] = entry["category"]
+                self._edits[dataset_id] = edits
+            return edits
+
+    def update_categories(self, dataset_id: str, edits: Dict[int, str]) -> Dict[int, str]:
+        """
+        Applies {row index: category} edits on top of the stored categories, and moves the edited rows between
+        category totals if those are built. Edits that do not change a row's current category, or point outside
+        the dataset, are ignored. Returns {row index: previous category} for the edits that were applied.
+        """
+        categories = self._read_table(dataset_id, "categories.arrow")
+        if categories is None:
+            raise KeyError(dataset_id)
+        base = categories.column(CATEGORY_COLUMN)
+        current = self._load_edits(dataset_id)
+        applied: Dict[int, str] = {}
+        with self._lock:
+            for row_index, category in edits.items():
+                if not 0 <= row_index < len(base):
+                    continue
+                previous = current.get(row_index, base[row_index].as_py())
+                if previous != category:
+                    applied[row_index] = previous
+                    current[row_index] = category
+            aggregates = self._aggregates.get(dataset_id)
+            if aggregates is not None:
+                for row_index, previous in applied.items():
+                    aggregates.move(row_index, previous, current[row_index])
+            if applied:
+                with open(self._path(dataset_id, "edits.jsonl"), "a") as f:
+                    for row_index in applied:
+                        f.write(json.dumps({"row_index": row_index, "category": current[row_index]}) + "\n")
+        self._touch(dataset_id)
+        return applied
+
+    def categories(self, dataset_id: str) -> Optional[np.ndarray]:
+        """
+        Returns the current category of every row (stored categories with edits applied), or None if the
+        dataset is not categorized.
+        """
+        table = self._read_table(dataset_id, "categories.arrow")
+        if table is None:
+            return None
+        categories = table.column(CATEGORY_COLUMN).to_numpy(zero_copy_only=False)
+        for row_index, category in self._load_edits(dataset_id).items():
+            categories[row_index] = category
+        return categories
+
+    def page(self, dataset_id: str, offset: int = 0, limit: int = 100, category: Optional[str] = None,
+             search: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns one page of rows in columnar form, optionally filtered to a category and/or to descriptions
+        containing search (case-insensitive). "row_index" holds each row's position in the full dataset, which
+        is what category edits refer to; "total" is the number of rows matching the filters.
+        """
+        table = self._read_table(dataset_id, "data.arrow")
+        if table is None:
+            raise KeyError(dataset_id)
+        self._touch(dataset_id)
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        categories = self._read_table(dataset_id, "categories.arrow")
+        edits = self._load_edits(dataset_id) if categories is not None else {}
+
+        if category is None and not search:
+            total = table.num_rows
+            row_indices = np.arange(offset, min(offset + limit, total))
+        else:
+            mask = np.ones(table.num_rows, dtype=bool)
+            if category is not None:
+                if categories is None:
+                    mask[:] = False
+                else:
+                    matches = pc.equal(categories.column(CATEGORY_COLUMN), category)
+                    mask &= pc.fill_null(matches, False).to_numpy(zero_copy_only=False)
+                    for row_index, edited_category in edits.items():
+                        mask[row_index] = edited_category == category
+            if search:
+                descriptions = table.column("transactionDescription") if "transactionDescription" in table.column_names else None
+                if descriptions is None or not pa.types.is_string(descriptions.type):
+                    mask[:] = False
+                else:
+                    matches = pc.match_substring(descriptions, search, ignore_case=True)
+                    mask &= pc.fill_null(matches, False).to_numpy(zero_copy_only=False)
+            matching = np.flatnonzero(mask)
+            total = len(matching)
+            row_indices = matching[offset:offset + limit]
+
+        page_table = table.take(pa.array(row_indices, type=pa.int64()))
+        columns = {name: page_table.column(name).to_pylist() for name in page_table.column_names}
+        if categories is not None:
+            page_categories = categories.column(CATEGORY_COLUMN).take(pa.array(row_indices, type=pa.int64())).to_pylist()
+            columns[CATEGORY_COLUMN] = [edits.get(int(i), c) for i, c in zip(row_indices, page_categories)]
+        return {"dataset_id": dataset_id, "total": total, "offset": offset, "limit": limit,
+                "row_index": row_indices.tolist(), "columns": columns}
+
+    def category_summary(self, dataset_id: str, categories: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns CategoryAggregates.summary over the current categories (all of them, or only the given ones);
+        empty if the dataset is not categorized. Non-numeric amounts count as zero.
+        The totals are built on the first call and maintained by update_categories afterwards.
+        """
+        # Built under the lock so no edit lands between reading the categories and registering the totals
+        with self._lock:
+            aggregates = self._aggregates.get(dataset_id)
+            if aggregates is None:
+                categories_now = self.categories(dataset_id)
+                if categories_now is None:
+                    return []
+                table = self._read_table(dataset_id, "data.arrow")
+                aggregates = CategoryAggregates(categories_now, numeric_column(table, "amount"),
+                                                numeric_column(table, "disallowableExpenses"), transaction_months(table))
+                self._aggregates[dataset_id] = aggregates
+            return aggregates.summary(categories)
+
+    def delete(self, dataset_id: str) -> bool:
+        """
+        Removes a dataset. Returns False if it did not exist.
+        """
+        try:
+            path = self._path(dataset_id)
+        except KeyError:
+            return False
+        with self._lock:
+            self._edits.pop(dataset_id, None)
+            self._aggregates.pop(dataset_id, None)
+        if not os.path.isdir(path):
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+
+    def _touch(self, dataset_id: str) -> None:
+        os.utime(self._path(dataset_id)) # Datasets in use are not purged
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for dataset_id in os.listdir(self.store_dir):
+            path = os.path.join(self.store_dir, dataset_id)
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                self.delete(dataset_id)
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+from llm_cache import CACHE_DB_PATH, normalize_description
+from normalization import canonical_description_key
+
+
+class FeedbackStore:
+    """
+    Persistent store of (intent, description, corrected category) triples from the category editor.
+    Corrections are matched exactly (case/whitespace-normalized) first, then by canonical description key,
+    and never expire.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH):
+        self.db_path = db_path
+        self.exact_hits = 0
+        self.canonical_hits = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS category_feedback (
+                   intent TEXT NOT NULL,
+                   description_key TEXT NOT NULL,
+                   canonical_key TEXT NOT NULL,
+                   description TEXT NOT NULL,
+                   category TEXT NOT NULL,
+                   updated_at REAL NOT NULL,
+                   PRIMARY KEY (intent, description_key)
+               )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_category_feedback_canonical ON category_feedback (intent, canonical_key)"
+        )
+        self._conn.commit()
+
+    def record_many(self, intent: str, corrections: List[Tuple[str, str]]) -> int:
+        """
+        Stores (description, corrected category) pairs for the intent; a newer correction replaces an older one.
+        Returns the number of corrections stored.
+        """
+        now = time.time()
+        rows = [(intent, normalize_description(desc), canonical_description_key(desc), desc, category, now)
+                for desc, category in corrections if desc and desc.strip() and category]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO category_feedback "
+                "(intent, description_key, canonical_key, description, category, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def lookup_many(self, intent: str, descriptions: List[str]) -> Dict[str, str]:
+        """
+        Returns {description: corrected category} for every description with an exact or canonical match.
+        """
+        if not descriptions:
+            return {}
+        exact_keys = {desc: normalize_description(desc) for desc in descriptions}
+        canonical_keys = {desc: canonical_description_key(desc) for desc in descriptions}
+        by_exact: Dict[str, str] = {}
+        by_canonical: Dict[str, str] = {}
+        with self._lock:
+            for column, keys, found in (("description_key", exact_keys, by_exact),
+                                        ("canonical_key", canonical_keys, by_canonical)):
+                unique_keys = list(set(keys.values()))
+                # Query in slices to stay below SQLite's bound-parameter limit; newest correction wins
+                for i in range(0, len(unique_keys), 500):
+                    key_slice = unique_keys[i:i + 500]
+                    placeholders = ",".join("?" for _ in key_slice)
+                    rows = self._conn.execute(
+                        f"SELECT {column}, category FROM category_feedback "
+                        f"WHERE intent = ? AND {column} IN ({placeholders}) ORDER BY updated_at ASC",
+                        [intent, *key_slice],
+                    ).fetchall()
+                    found.update(rows)
+
+            results: Dict[str, str] = {}
+            for desc in descriptions:
+                if exact_keys[desc] in by_exact:
+                    results[desc] = by_exact[exact_keys[desc]]
+                    self.exact_hits += 1
+                elif canonical_keys[desc] in by_canonical:
+                    results[desc] = by_canonical[canonical_keys[desc]]
+                    self.canonical_hits += 1
+        return results
+
+    def count(self, intent: str) -> int:
+        """
+        Returns the number of stored corrections for the intent.
+        """
+        with self._lock:
+            (entry_count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM category_feedback WHERE intent = ?", (intent,)
+            ).fetchone()
+        return entry_count
+
+    def entries(self, intent: str, limit: int) -> List[Tuple[str, str]]:
+        """
+        Returns up to limit (description, category) corrections for the intent, newest first.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT description, category FROM category_feedback WHERE intent = ? "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (intent, limit),
+            ).fetchall()
+
+    def stats(self) -> dict:
+        """
+        Returns the number of stored corrections and how often they pre-answered a description.
+        """
+        with self._lock:
+            (entry_count,) = self._conn.execute("SELECT COUNT(*) FROM category_feedback").fetchone()
+            return {
+                "corrections": entry_count,
+                "exact_hits": self.exact_hits,
+                "canonical_hits": self.canonical_hits,
+            }
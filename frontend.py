@@ -8,23 +8,152 @@ st.set_page_config(page_title="Smart AI Mapping", page_icon="🤖", layout="wide
 
 st.title("AI Mapping and Categorization Tool 🤖")
 
+BACKEND_URL = "http://localhost:8000"
+PAGE_SIZE_OPTIONS = [50, 100, 250, 500] # Rows fetched from the backend per table page
+
+ALL_POSSIBLE_CATEGORIES = sorted(list(set([
+    "General Administration Expenses", "Turnover", "Premises Costs", 
+    "Legal and Professional Costs", "Advertising and Promotion Costs", 
+    "Other Business Expenses", "Travel and Subsistence", "Subcontractor Expense", 
+    "Other Direct Costs", "Motor Expenses", "Business Entertainment Costs", 
+    "Employee Costs", "Depreciation", "Bad Debts", "Interest", "Other Income", 
+    "Cost of Goods", "Personal", "Repairs",
+    "Uncategorized", "Missing or Invalid Description", "Error in Categorization"
+])))
+
+
+def build_mapped_dataframe(mapped_columns):
+    """
+    Builds the mapped data table from the backend's {predefined column: [values]} payload,
+    formatting the transaction date as dd/mm/YYYY.
+    """
+    df = pd.DataFrame(mapped_columns)
+    date_column_name = "transactionDate"
+    if date_column_name in df.columns:
+        df[date_column_name] = pd.to_datetime(df[date_column_name], errors='coerce')
+        if pd.api.types.is_datetime64_any_dtype(df[date_column_name]):
+            df[date_column_name] = df[date_column_name].dt.strftime('%d/%m/%Y').fillna('')
+    return df
+
+
+def set_dataset(dataset_id=None, row_count=0, categorized=False):
+    """
+    Points the session at a dataset stored on the backend (or at none), deleting the previous one.
+    Only the ID is kept in the session; table rows are fetched one page at a time.
+    """
+    previous_dataset_id = st.session_state.dataset_id
+    if previous_dataset_id and previous_dataset_id != dataset_id:
+        try:
+            requests.delete(f"{BACKEND_URL}/datasets/{previous_dataset_id}")
+        except requests.exceptions.RequestException:
+            pass # Unreachable backends purge expired datasets themselves
+    st.session_state.dataset_id = dataset_id
+    st.session_state.dataset_row_count = row_count
+    st.session_state.dataset_categorized = categorized
+    st.session_state.dataset_edit_version = 0
+    st.session_state.category_summary = None
+
+
+def merge_category_summary(summary_entries):
+    """
+    Applies category summary entries from the backend to the session's {category: entry} summary;
+    entries with no rows left remove their category.
+    """
+    for entry in summary_entries:
+        if entry["count"]:
+            st.session_state.category_summary[entry["category"]] = entry
+        else:
+            st.session_state.category_summary.pop(entry["category"], None)
+
+
+def fetch_dataset_page(dataset_id, page, page_size, category=None, search=None):
+    """
+    Fetches one page of the stored dataset, optionally filtered by category or description text.
+    Returns (DataFrame indexed by dataset row index, total number of matching rows).
+    """
+    params = {"offset": (page - 1) * page_size, "limit": page_size}
+    if category:
+        params["category"] = category
+    if search:
+        params["search"] = search
+    response = requests.get(f"{BACKEND_URL}/datasets/{dataset_id}/rows", params=params)
+    response.raise_for_status()
+    page_data = response.json()
+    df = build_mapped_dataframe(page_data["columns"])
+    df.index = page_data["row_index"]
+    return df, page_data["total"]
+
+
+def page_controls(key_prefix, total_rows):
+    """
+    Page size and page number widgets for a paginated table; returns (page, page_size).
+    """
+    size_col, page_col, info_col = st.columns([1, 1, 3])
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZE_OPTIONS, index=1, key=f"{key_prefix}_page_size")
+    page_count = max(1, -(-total_rows // page_size))
+    # Filters and edits can shrink the table under a kept page number, so it is clamped rather than bounded
+    page = min(int(page_col.number_input("Page", min_value=1, value=1, step=1, key=f"{key_prefix}_page")), page_count)
+    first_row = min((page - 1) * page_size + 1, total_rows)
+    info_col.caption(f"Rows {first_row}-{min(page * page_size, total_rows)} of {total_rows}")
+    return page, page_size
+
+def workbook_sheet_names(uploaded_file):
+    """
+    Sheet names of an uploaded .xlsx/.xls workbook, read once per upload; [] for CSV files or unreadable workbooks.
+    """
+    if uploaded_file.name.lower().endswith(".csv"):
+        return []
+    cached = st.session_state.get("sheet_names_for_upload")
+    if cached and cached[0] == uploaded_file.file_id:
+        return cached[1]
+    try:
+        sheet_names = pd.ExcelFile(uploaded_file).sheet_names
+    except Exception:
+        sheet_names = [] # The backend reports unreadable files when they are processed
+    uploaded_file.seek(0)
+    st.session_state.sheet_names_for_upload = (uploaded_file.file_id, sheet_names)
+    return sheet_names
+
+
+def sheet_selection(uploaded_file):
+    """
+    Sheet selector for multi-sheet workbooks; returns the backend's "sheets" form value:
+    "" for the active sheet, "*" for all sheets, or comma-separated sheet names.
+    """
+    sheet_names = workbook_sheet_names(uploaded_file)
+    if len(sheet_names) < 2:
+        return ""
+    choice = st.radio("Sheets to process", ["Active sheet", "All sheets", "Selected sheets"], horizontal=True)
+    if choice == "All sheets":
+        return "*"
+    if choice == "Selected sheets":
+        # Selected sheets are combined into one table with a "Sheet" column naming each row's sheet
+        return ",".join(st.multiselect("Sheets", sheet_names, default=sheet_names[:1]))
+    return ""
+
 # Initialize session state variables if they don't exist
 if 'business_description' not in st.session_state:
     st.session_state.business_description = ""
-if 'transformed_data_for_table' not in st.session_state:
-    st.session_state.transformed_data_for_table = []
 if 'original_excel_headers' not in st.session_state:
     st.session_state.original_excel_headers = []
 if 'llm_header_mapping' not in st.session_state:
     st.session_state.llm_header_mapping = {}
-if 'df_display' not in st.session_state:
-    st.session_state.df_display = pd.DataFrame()
-if 'df_categorized_display' not in st.session_state: # New session state for categorized table
-    st.session_state.df_categorized_display = pd.DataFrame()
-if 'df_category_summary' not in st.session_state: # New session state for category summary table
-    st.session_state.df_category_summary = pd.DataFrame()
-if 'data_rows' not in st.session_state: # to store raw data_rows from uploadfile
-    st.session_state.data_rows = []
+# The mapped (and later categorized) ledger lives on the backend; the session only keeps its ID and size,
+# so session memory does not grow with the file
+if 'dataset_id' not in st.session_state:
+    st.session_state.dataset_id = None
+    st.session_state.dataset_row_count = 0
+    st.session_state.dataset_categorized = False
+    st.session_state.dataset_edit_version = 0 # Bumped after each saved edit to start the editor from fresh rows
+    # {category: totals} for the summary table: loaded once per categorization, then patched with each edit's
+    # response, so an edit never regroups the ledger
+    st.session_state.category_summary = None
+if 'header_fingerprint' not in st.session_state: # Identifies the upload's export layout for mapping confirmation
+    st.session_state.header_fingerprint = None
+if 'known_intent' not in st.session_state: # Optional business type that skips intent identification
+    st.session_state.known_intent = "Auto-detect"
+if 'pipeline_job_id' not in st.session_state: # Background job; also kept in the URL so a refresh can resume it
+    st.session_state.pipeline_job_id = st.query_params.get("job_id")
 
 
 # Add a text input for business description, bound to session state
@@ -33,23 +162,50 @@ st.session_state.business_description = st.text_input(
     value=st.session_state.business_description
 )
 
-uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx", "xls"])
+st.session_state.known_intent = st.selectbox(
+    "Business Type (optional, skips automatic detection)",
+    options=["Auto-detect", "salon", "tutor", "architectural"],
+    index=["Auto-detect", "salon", "tutor", "architectural"].index(st.session_state.known_intent)
+)
+
+uploaded_file = st.file_uploader("Choose an Excel or CSV file", type=["xlsx", "xls", "csv"])
 
 if uploaded_file is not None:
+    selected_sheets = sheet_selection(uploaded_file)
+    # One request hands the file to a background job that parses, maps and categorizes it
+    if st.button("Process in Background (Upload, Map and Categorize)"):
+        if not st.session_state.business_description.strip():
+            st.warning("Please enter a business description for categorization.")
+        else:
+            set_dataset(None)
+            files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
+            data = {"business_description": st.session_state.business_description, "response_format": "dataset",
+                    "sheets": selected_sheets}
+            if st.session_state.known_intent != "Auto-detect":
+                data["intent"] = st.session_state.known_intent
+            try:
+                job_response = requests.post(f"{BACKEND_URL}/jobs/", files=files, data=data)
+                if job_response.status_code == 200:
+                    st.session_state.pipeline_job_id = job_response.json()["job_id"]
+                    st.query_params["job_id"] = st.session_state.pipeline_job_id
+                else:
+                    st.error(f"Failed to start background job: {job_response.status_code} - {job_response.text}")
+            except requests.exceptions.RequestException as e:
+                st.error(f"Error connecting to backend: {e}")
+
     if st.button("Upload and Map Headers"):
-        # Reset categorized display and summary when new file is uploaded or remapped
-        st.session_state.df_categorized_display = pd.DataFrame()
-        st.session_state.df_category_summary = pd.DataFrame()
-        st.session_state.df_display = pd.DataFrame() # Also reset mapped data table
-        st.session_state.transformed_data_for_table = []
+        # Reset the tables when a new file is uploaded or remapped
+        set_dataset(None)
         
         files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
-        data = {"business_description": st.session_state.business_description}
+        # The backend keeps the mapped rows and returns a dataset ID; the tables below fetch them page by page
+        data = {"business_description": st.session_state.business_description, "response_format": "dataset",
+                "sheets": selected_sheets}
 
         try:
             start_time_mapping = time.time()
             with st.spinner("Processing file and mapping headers..."):
-                response = requests.post("http://localhost:8000/uploadfile/", files=files, data=data)
+                response = requests.post(f"{BACKEND_URL}/uploadfile/", files=files, data=data)
             end_time_mapping = time.time()
             mapping_duration = end_time_mapping - start_time_mapping
             
@@ -59,63 +215,58 @@ if uploaded_file is not None:
                 
                 response_data = response.json()
                 st.session_state.original_excel_headers = response_data.get("headers", []) 
-                st.session_state.data_rows = response_data.get("non_empty_rows", []) 
                 st.session_state.llm_header_mapping = response_data.get("header_mapping", {})
+                st.session_state.header_fingerprint = response_data.get("header_fingerprint")
+                # The backend applies the header mapping and stores the mapped dataset
+                set_dataset(response_data.get("dataset_id"), response_data.get("row_count", 0))
 
-                if not st.session_state.data_rows:
+                if not response_data.get("row_count"):
                     st.info("No data rows received from backend to display.")
-                    st.session_state.transformed_data_for_table = []
-                    st.session_state.df_display = pd.DataFrame()
+                    set_dataset(None)
                 elif not st.session_state.original_excel_headers:
                     st.info("No original headers received from backend.")
-                    st.session_state.transformed_data_for_table = []
-                    st.session_state.df_display = pd.DataFrame()
+                    set_dataset(None)
                 elif not st.session_state.llm_header_mapping or not any(st.session_state.llm_header_mapping.values()):
                     st.info("No valid header mapping received from LLM, or LLM could not map any headers.")
-                    st.session_state.transformed_data_for_table = []
-                    st.session_state.df_display = pd.DataFrame()
-                else:
-                    original_header_to_index = {header: i for i, header in enumerate(st.session_state.original_excel_headers)}
-                    final_table_columns = list(st.session_state.llm_header_mapping.keys())
-                    
-                    temp_transformed_data = []
-                    for row_values in st.session_state.data_rows:
-                        new_mapped_row = {}
-                        for predefined_col_name in final_table_columns:
-                            original_excel_header_for_this_predefined_col = st.session_state.llm_header_mapping.get(predefined_col_name)
-                            if original_excel_header_for_this_predefined_col and \
-                               original_excel_header_for_this_predefined_col in original_header_to_index:
-                                idx_in_original_row = original_header_to_index[original_excel_header_for_this_predefined_col]
-                                if idx_in_original_row < len(row_values):
-                                    new_mapped_row[predefined_col_name] = row_values[idx_in_original_row]
-                                else:
-                                    new_mapped_row[predefined_col_name] = None 
-                            else:
-                                new_mapped_row[predefined_col_name] = None 
-                        temp_transformed_data.append(new_mapped_row)
-                    
-                    st.session_state.transformed_data_for_table = temp_transformed_data
-
-                    if st.session_state.transformed_data_for_table:
-                        df = pd.DataFrame(st.session_state.transformed_data_for_table)
-                        date_column_name = "transactionDate"
-                        if date_column_name in df.columns:
-                            df[date_column_name] = pd.to_datetime(df[date_column_name], errors='coerce')
-                            if pd.api.types.is_datetime64_any_dtype(df[date_column_name]):
-                                df[date_column_name] = df[date_column_name].dt.strftime('%d/%m/%Y').fillna('')
-                        st.session_state.df_display = df
-                    else:
-                        st.info("Could not transform data for table display.")
-                        st.session_state.df_display = pd.DataFrame()
+                    set_dataset(None)
             else:
                 st.error(f"Failed to process file: {response.status_code} - {response.text}")
-                st.session_state.transformed_data_for_table = []
-                st.session_state.df_display = pd.DataFrame()
         except requests.exceptions.RequestException as e:
             st.error(f"Error connecting to backend: {e}")
         except Exception as e:
             st.error(f"An unexpected error occurred: {e}")
 
+# Poll a running background job until it finishes, then load its results into the tables
+if st.session_state.pipeline_job_id:
+    job_id = st.session_state.pipeline_job_id
+    progress_bar = st.progress(0.0, text="Background job queued...")
+    try:
+        while True:
+            status_response = requests.get(f"{BACKEND_URL}/jobs/{job_id}")
+            if status_response.status_code != 200:
+                st.error(f"Background job unavailable: {status_response.status_code} - {status_response.text}")
+                break
+            job = status_response.json()
+            progress_bar.progress(min(job["progress"], 1.0), text=f"Background job: {job['stage']}...")
+            if job["status"] == "failed":
+                st.error(f"Background job failed: {job['error']}")
+                break
+            if job["status"] == "completed":
+                result = requests.get(f"{BACKEND_URL}/jobs/{job_id}/result").json()
+                st.session_state.original_excel_headers = result.get("headers", [])
+                st.session_state.llm_header_mapping = result.get("header_mapping", {})
+                st.session_state.header_fingerprint = result.get("header_fingerprint")
+                dataset_info = requests.get(f"{BACKEND_URL}/datasets/{result['dataset_id']}").json()
+                set_dataset(result["dataset_id"], result.get("row_count", 0), dataset_info.get("categorized", False))
+                st.success(f"Background job completed: {result.get('row_count', 0)} rows processed.")
+                break
+            time.sleep(1)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error connecting to backend: {e}")
+    progress_bar.empty()
+    st.session_state.pipeline_job_id = None
+    st.query_params.pop("job_id", None)
+
 # Display LLM Header Mapping if it exists
 if 'llm_header_mapping' in st.session_state and st.session_state.llm_header_mapping:
     st.subheader("LLM Header Mapping:")
@@ -124,70 +275,111 @@ if 'llm_header_mapping' in st.session_state and st.session_state.llm_header_mapp
     df_mapping = pd.DataFrame(mapping_list_for_df)
     st.dataframe(df_mapping, width=500)
 
-# Display Column Mapped Data Table if it exists
-if 'df_display' in st.session_state and not st.session_state.df_display.empty:
+    # Confirmed mappings are reused for every later upload with the same export layout
+    if st.session_state.header_fingerprint and st.button("Confirm Header Mapping"):
+        try:
+            confirm_response = requests.post(
+                f"{BACKEND_URL}/header-mappings/confirm",
+                json={
+                    "header_fingerprint": st.session_state.header_fingerprint,
+                    "header_mapping": st.session_state.llm_header_mapping
+                }
+            )
+            if confirm_response.status_code == 200:
+                st.success("Header mapping saved for future uploads with this layout.")
+            else:
+                st.error(f"Failed to save header mapping: {confirm_response.status_code} - {confirm_response.text}")
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error connecting to backend: {e}")
+
+# Display a page of the Column Mapped Data Table until the dataset is categorized
+if st.session_state.dataset_id and not st.session_state.dataset_categorized:
     st.subheader("Column Mapped Data Table:")
-    st.dataframe(st.session_state.df_display)
+    page, page_size = page_controls("mapped", st.session_state.dataset_row_count)
+    page_table = st.empty() # Redrawn with categories as they stream in
+    df_page = None
+    try:
+        df_page, _ = fetch_dataset_page(st.session_state.dataset_id, page, page_size)
+        page_table.dataframe(df_page)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error loading rows from backend: {e}")
 
+    stream_results = st.checkbox("Show rows of this page as they are categorized", value=True)
     # Add "Categorize Transactions" button only if there's mapped data
     if st.button("Categorize Transactions"):
         if not st.session_state.business_description.strip():
             st.warning("Please enter a business description for categorization.")
-        elif not st.session_state.transformed_data_for_table: 
-            st.warning("No mapped transaction data available to categorize.")
         else:
-            payload = {
-                "business_description": st.session_state.business_description,
-                "mapped_transactions": st.session_state.transformed_data_for_table 
-            }
+            # The backend categorizes the stored description column and keeps the categories with the dataset
+            payload = {"business_description": st.session_state.business_description}
+            if st.session_state.known_intent != "Auto-detect":
+                payload["intent"] = st.session_state.known_intent
+            dataset_url = f"{BACKEND_URL}/datasets/{st.session_state.dataset_id}"
             try:
                 start_time_categorization = time.time()
-                with st.spinner("Categorizing transactions..."):
-                    categorize_response = requests.post("http://localhost:8000/categorize-transactions/", json=payload)
+                categorization_error = None
+                if stream_results:
+                    stream_progress = st.progress(0.0, text="Categorizing transactions...")
+                    # Only the categories of the page on screen are streamed back, by dataset row index
+                    page_rows = {"offset": (page - 1) * page_size, "limit": page_size if df_page is not None else 0}
+                    categorize_response = requests.post(f"{dataset_url}/categorize/stream", json=payload,
+                                                        params=page_rows, stream=True)
+                    if categorize_response.status_code == 200:
+                        if df_page is not None:
+                            df_page["category"] = None
+                        for line in categorize_response.iter_lines():
+                            if not line:
+                                continue
+                            update = json.loads(line)
+                            categorization_error = update.get("error")
+                            if update.get("rows") and df_page is not None:
+                                for row in update["rows"]:
+                                    df_page.loc[row["index"], "category"] = row["category"]
+                                page_table.dataframe(df_page)
+                            if update.get("total"):
+                                stream_progress.progress(update["completed"] / update["total"],
+                                                         text=f"Categorized {update['completed']} of {update['total']} rows...")
+                        stream_progress.empty()
+                else:
+                    with st.spinner("Categorizing transactions..."):
+                        categorize_response = requests.post(f"{dataset_url}/categorize", json=payload)
                 end_time_categorization = time.time()
                 categorization_duration = end_time_categorization - start_time_categorization
                 
-                if categorize_response.status_code == 200:
+                if categorize_response.status_code != 200:
+                    st.error(f"Failed to categorize transactions: {categorize_response.status_code} - {categorize_response.text}")
+                elif categorization_error:
+                    st.error(f"Categorization stopped early: {categorization_error}")
+                else:
                     st.info(f"Transaction categorization completed in {categorization_duration:.2f} seconds.")
                     st.success("Transactions categorized successfully!")
-                    categorized_data = categorize_response.json()
-                    if categorized_data:
-                        df_updated = pd.DataFrame(categorized_data)
-                        date_column_name = "transactionDate"
-                        if date_column_name in df_updated.columns:
-                            try:
-                                df_updated[date_column_name] = pd.to_datetime(df_updated[date_column_name], errors='coerce').dt.strftime('%d/%m/%Y').fillna('')
-                            except Exception as date_fmt_e:
-                                st.error(f"Error formatting date column '{date_column_name}': {date_fmt_e}")
-                        st.session_state.df_categorized_display = df_updated
-                    else:
-                        st.session_state.df_categorized_display = pd.DataFrame() 
-                else:
-                    st.error(f"Failed to categorize transactions: {categorize_response.status_code} - {categorize_response.text}")
-                    st.session_state.df_categorized_display = pd.DataFrame()
+                    st.session_state.dataset_categorized = True
+                    st.session_state.category_summary = None
+                    st.rerun()
             except requests.exceptions.RequestException as e:
                 st.error(f"Error connecting to backend for categorization: {e}")
-                st.session_state.df_categorized_display = pd.DataFrame()
             except Exception as e:
                 st.error(f"An unexpected error occurred during categorization: {e}")
-                st.session_state.df_categorized_display = pd.DataFrame()
 
-# Display the categorized data table (editable) if it exists and process edits
-if 'df_categorized_display' in st.session_state and \
-   isinstance(st.session_state.df_categorized_display, pd.DataFrame) and \
-   not st.session_state.df_categorized_display.empty:
-    
+# Display a page of the categorized data table (editable) and save edits to the backend
+if st.session_state.dataset_id and st.session_state.dataset_categorized:
     st.subheader("Categorized Data Table (Editable Categories):")
-    
-    ALL_POSSIBLE_CATEGORIES = sorted(list(set([
-        "General Administration Expenses", "Turnover", "Premises Costs", 
-        "Legal and Professional Costs", "Advertising and Promotion Costs", 
-        "Other Business Expenses", "Travel and Subsistence", "Subcontractor Expense", 
-        "Other Direct Costs", "Motor Expenses", "Business Entertainment Costs", 
-        "Employee Costs", "Depreciation", "Bad Debts", "Interest", "Other Income", 
-        "Cost of Goods", "Personal", "Repairs",
-        "Uncategorized", "Missing or Invalid Description", "Error in Categorization"
-    ])))
+
+    filter_col, search_col = st.columns(2)
+    category_filter = filter_col.selectbox("Show category", ["All categories"] + ALL_POSSIBLE_CATEGORIES)
+    category_filter = None if category_filter == "All categories" else category_filter
+    search_filter = search_col.text_input("Search descriptions").strip()
+
+    try:
+        # The row count shown by the page controls is that of the current filter
+        filtered_total = st.session_state.dataset_row_count
+        if category_filter or search_filter:
+            _, filtered_total = fetch_dataset_page(st.session_state.dataset_id, 1, 1, category_filter, search_filter)
+        page, page_size = page_controls("categorized", filtered_total)
+        df_page, _ = fetch_dataset_page(st.session_state.dataset_id, page, page_size, category_filter, search_filter)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error loading rows from backend: {e}")
+        df_page = pd.DataFrame()
 
     column_configuration = {
         "category": st.column_config.SelectboxColumn(
@@ -198,45 +390,82 @@ if 'df_categorized_display' in st.session_state and \
         )
     }
     # Make other columns non-editable
-    for col_name in st.session_state.df_categorized_display.columns:
+    for col_name in df_page.columns:
         if col_name.lower() != 'category':
             column_configuration[col_name] = st.column_config.TextColumn(col_name, disabled=True)
 
+    # The key changes with the page, the filters and every saved edit, so the editor's pending changes
+    # never carry over onto a different set of rows
+    editor_key = (f"category_editor_{st.session_state.dataset_id}_{page}_{page_size}_{category_filter}_"
+                  f"{search_filter}_{st.session_state.dataset_edit_version}")
     edited_df = st.data_editor(
-        st.session_state.df_categorized_display, # Input for the editor for this run
+        df_page,
         column_config=column_configuration,
         num_rows="fixed",
-        key="category_editor_table_final_v2", # Unique key
+        key=editor_key,
         use_container_width=True
     )
 
-    # Update session state for the *next* rerun with the data from the editor.
-    # And use edited_df for calculations in *this* rerun.
-    st.session_state.df_categorized_display = edited_df
+    # Save the categories changed on this page by row index, and send them as corrections as well, so the
+    # same description is answered from the stored correction next time instead of costing another LLM call
+    if 'category' in edited_df.columns and len(edited_df) == len(df_page):
+        changed_mask = edited_df['category'] != df_page['category']
+        edits = [{"row_index": int(row_index), "category": category}
+                 for row_index, category in edited_df.loc[changed_mask, 'category'].items()]
+        corrections = []
+        if 'transactionDescription' in edited_df.columns:
+            corrections = [
+                {"transactionDescription": desc, "category": category}
+                for desc, category in zip(edited_df.loc[changed_mask, 'transactionDescription'],
+                                          edited_df.loc[changed_mask, 'category'])
+                if isinstance(desc, str) and desc.strip()
+            ]
+        if edits:
+            edits_saved = False
+            try:
+                edit_response = requests.patch(f"{BACKEND_URL}/datasets/{st.session_state.dataset_id}/categories",
+                                               json={"edits": edits})
+                edits_saved = edit_response.status_code == 200
+                if not edits_saved:
+                    st.warning(f"Could not save category changes: {edit_response.status_code} - {edit_response.text}")
+                if corrections:
+                    feedback_payload = {
+                        "business_description": st.session_state.business_description,
+                        "corrections": corrections
+                    }
+                    if st.session_state.known_intent != "Auto-detect":
+                        feedback_payload["intent"] = st.session_state.known_intent
+                    feedback_response = requests.post(f"{BACKEND_URL}/feedback/", json=feedback_payload)
+                    if feedback_response.status_code != 200:
+                        st.warning(f"Could not save category corrections: {feedback_response.status_code} - {feedback_response.text}")
+            except requests.exceptions.RequestException as e:
+                st.warning(f"Could not save category changes: {e}")
+            if edits_saved:
+                # The response carries the new totals of just the categories these rows left or joined
+                if st.session_state.category_summary is not None:
+                    merge_category_summary(edit_response.json().get("summary", []))
+                st.session_state.dataset_edit_version += 1
+                st.rerun()
 
-    # Calculate summary based on the DIRECT output of data_editor (edited_df)
+    # The category summary is maintained by the backend over the whole dataset, including saved edits
     try:
-        if edited_df is not None and isinstance(edited_df, pd.DataFrame):
-            current_df_for_summary = edited_df.copy() 
-            if 'amount' in current_df_for_summary.columns and 'category' in current_df_for_summary.columns:
-                current_df_for_summary['amount'] = pd.to_numeric(current_df_for_summary['amount'], errors='coerce').fillna(0)
-                category_summary_df = current_df_for_summary.groupby('category')['amount'].sum().reset_index()
-                category_summary_df.columns = ['Category', 'Total Amount']
-                st.session_state.df_category_summary = category_summary_df
-            elif 'category' not in current_df_for_summary.columns:
-                st.warning("The 'category' column is missing in edited data, cannot calculate category summary.")
-                st.session_state.df_category_summary = pd.DataFrame() 
-            else: 
-                st.warning("The 'amount' column is missing in edited data, cannot calculate category summary.")
-                st.session_state.df_category_summary = pd.DataFrame()
-        else:
-            st.warning("Data editor did not return valid data for summary.")
-            st.session_state.df_category_summary = pd.DataFrame()
-    except Exception as e:
-        st.error(f"Error calculating category summary: {e}")
-        st.session_state.df_category_summary = pd.DataFrame()
+        if st.session_state.category_summary is None:
+            summary_response = requests.get(f"{BACKEND_URL}/datasets/{st.session_state.dataset_id}/summary")
+            summary_response.raise_for_status()
+            st.session_state.category_summary = {}
+            merge_category_summary(summary_response.json().get("summary", []))
+        summary = [st.session_state.category_summary[category] for category in sorted(st.session_state.category_summary)]
+        if summary:
+            st.subheader("Category Summary:")
+            df_category_summary = pd.DataFrame(summary)[["category", "amount", "disallowableExpenses", "count"]]
+            df_category_summary.columns = ['Category', 'Total Amount', 'Disallowable Expenses', 'Transactions']
+            st.dataframe(df_category_summary, width=700)
 
-# Display the category summary table if it exists
-if 'df_category_summary' in st.session_state and not st.session_state.df_category_summary.empty:
-    st.subheader("Category Summary:")
-    st.dataframe(st.session_state.df_category_summary, width=500)
+            with st.expander("Monthly breakdown"):
+                df_monthly = pd.DataFrame(
+                    {entry["category"]: {month: totals["amount"] for month, totals in entry["months"].items()}
+                     for entry in summary}
+                ).T.fillna(0.0)
+                st.dataframe(df_monthly[sorted(df_monthly.columns)])
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error calculating category summary: {e}")
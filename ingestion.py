@@ -0,0 +1,389 @@
+import csv
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Any, BinaryIO, List, Optional, Tuple, Union
+import openpyxl
+import pandas as pd
+from dotenv import load_dotenv
+from metrics import stage
+from normalization import parse_number_text
+
+try:
+    import xlrd
+except ImportError:
+    print("WARN: xlrd not installed. Legacy .xls uploads will be rejected.")
+    xlrd = None
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "100000")) # Rows per pandas chunk when streaming a CSV
+CSV_SNIFF_BYTES = 64 * 1024 # Head of the file used to detect the delimiter and the column count
+CSV_SHEET_TITLE = "CSV" # A CSV file has no sheets; this is reported as its sheet title
+NUMBER_LIKE_PATTERN = r"\s*[-+]?[\d.,]+\s*" # Digits and separators only, whichever the decimal separator
+
+# Sheets of a multi-sheet workbook are parsed in parallel worker processes (openpyxl parsing is CPU-bound)
+SHEET_PARSE_WORKERS = int(os.getenv("SHEET_PARSE_WORKERS", str(min(8, os.cpu_count() or 1))))
+ALL_SHEETS = "*" # Sheet selection meaning every sheet in the workbook
+SHEET_COLUMN = "Sheet" # Column added to a combined multi-sheet dataset with each row's sheet title
+
+_sheet_pool: Optional[ProcessPoolExecutor] = None
+_sheet_pool_lock = threading.Lock()
+
+
+@stage("parse")
+def parse_excel_rows(file_obj: Union[BinaryIO, str], sheet_name: Optional[str] = None) -> Tuple[str, List[str], List[List[Any]]]:
+    """
+    Reads one sheet of an Excel workbook (the active sheet unless sheet_name is given) in a single streaming pass.
+    The workbook is opened read-only, so cells are never materialized as objects; only the values of
+    non-empty rows are kept. Columns that are empty in every row are dropped, the first non-empty row
+    is used as the header row and every later non-empty row is a data row.
+    Returns (sheet title, headers, data rows).
+    """
+    workbook = openpyxl.load_workbook(file_obj, read_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        # Exported files often carry a wrong or missing dimension record; read every row regardless
+        sheet.reset_dimensions()
+        sheet_title = sheet.title
+
+        non_empty_rows = []
+        non_empty_columns = set()
+        for current_excel_row_idx, row_tuple in enumerate(sheet.iter_rows(values_only=True), start=1):
+            row_non_empty_columns = [i for i, cell_value in enumerate(row_tuple) if cell_value is not None]
+            if row_non_empty_columns:
+                if not non_empty_rows:
+                    print(f"Header row found at Excel row index: {current_excel_row_idx}")
+                non_empty_columns.update(row_non_empty_columns)
+                # Trailing empty cells carry no data; keep the row only up to its last value
+                non_empty_rows.append(row_tuple[:row_non_empty_columns[-1] + 1])
+    finally:
+        workbook.close() # Read-only workbooks keep the underlying archive open until closed
+
+    actual_headers, data_rows = project_non_empty_rows(non_empty_rows, non_empty_columns)
+    return sheet_title, actual_headers, data_rows
+
+
+def detect_file_format(source: Union[BinaryIO, str]) -> str:
+    """
+    Detects "xlsx", "xls" or "csv" from the file's leading bytes rather than its extension, since bank
+    exports are often misnamed. File objects are rewound afterwards.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            head = f.read(8)
+    else:
+        head = source.read(8)
+        source.seek(0)
+    if head.startswith(b"PK\x03\x04"): # .xlsx is a zip archive
+        return "xlsx"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"): # .xls is an OLE2 compound document
+        return "xls"
+    return "csv"
+
+
+@stage("parse")
+def parse_xls_rows(file_obj: Union[BinaryIO, str], sheet_name: Optional[str] = None) -> Tuple[str, List[str], List[List[Any]]]:
+    """
+    Reads one sheet of a legacy .xls workbook (the first sheet unless sheet_name is given) with xlrd,
+    with the same header detection and column dropping as parse_excel_rows.
+    Returns (sheet title, headers, data rows).
+    """
+    if xlrd is None:
+        raise ValueError("Legacy .xls files need the xlrd package, which is not installed.")
+    if isinstance(file_obj, str):
+        book = xlrd.open_workbook(file_obj, on_demand=True)
+    else:
+        book = xlrd.open_workbook(file_contents=file_obj.read(), on_demand=True)
+    try:
+        sheet = book.sheet_by_name(sheet_name) if sheet_name else book.sheet_by_index(0)
+        non_empty_rows = []
+        non_empty_columns = set()
+        for row_idx in range(sheet.nrows):
+            row_tuple = tuple(_xls_cell_value(cell, book.datemode) for cell in sheet.row(row_idx))
+            row_non_empty_columns = [i for i, cell_value in enumerate(row_tuple) if cell_value is not None]
+            if row_non_empty_columns:
+                if not non_empty_rows:
+                    print(f"Header row found at Excel row index: {row_idx + 1}")
+                non_empty_columns.update(row_non_empty_columns)
+                non_empty_rows.append(row_tuple[:row_non_empty_columns[-1] + 1])
+        sheet_title = sheet.name
+    finally:
+        book.release_resources()
+
+    actual_headers, data_rows = project_non_empty_rows(non_empty_rows, non_empty_columns)
+    return sheet_title, actual_headers, data_rows
+
+
+def _xls_cell_value(cell: Any, datemode: int) -> Any:
+    """
+    Converts an xlrd cell to the value openpyxl would give: None for blanks, datetimes for date cells
+    and ints for whole numbers.
+    """
+    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        return xlrd.xldate_as_datetime(cell.value, datemode)
+    if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+        return bool(cell.value)
+    if cell.ctype == xlrd.XL_CELL_NUMBER and float(cell.value).is_integer():
+        return int(cell.value)
+    if cell.ctype == xlrd.XL_CELL_TEXT and not cell.value.strip():
+        return None
+    return cell.value
+
+
+def _sniff_csv(head: bytes) -> Tuple[str, int]:
+    """
+    Returns (delimiter, widest row) from the head of a CSV file. Preamble lines (account name, period) are
+    usually narrower than the table, so the widest row in the head sizes the columns.
+    """
+    text = head.decode("utf-8-sig", errors="replace")
+    lines = text.splitlines()[:-1] or text.splitlines() # The last line may be cut off mid-row
+    try:
+        delimiter = csv.Sniffer().sniff("\n".join(lines[:50]), delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+    width = max((len(row) for row in csv.reader(lines, delimiter=delimiter)), default=1)
+    return delimiter, max(width, 1)
+
+
+def _convert_numeric_columns(chunk: pd.DataFrame, delimiter: str = ",") -> pd.DataFrame:
+    """
+    Converts, per column, text that is entirely numeric to numbers, so CSV amounts arrive typed as they would
+    from a workbook. Whole numbers become ints. Semicolon-delimited files usually write decimal commas
+    ("1.234,56"), so that convention is tried first for them and the decimal point one first otherwise; a
+    column that fits neither (e.g. "12,50" next to "1,234.00") stays text.
+    """
+    decimals = [",", "."] if delimiter == ";" else [".", ","]
+    for column in chunk.columns:
+        values = chunk[column]
+        present = values.notna()
+        if not present.any():
+            continue
+        numeric = parse_number_text(values, decimals[0])
+        unparsed = values[present & numeric.isna()]
+        # The other convention is only worth trying if what is left looks like numbers at all
+        if len(unparsed) and unparsed.str.fullmatch(NUMBER_LIKE_PATTERN).all():
+            numeric = parse_number_text(values, decimals[1])
+        if numeric[present].notna().all():
+            whole = (numeric[present] % 1 == 0).all()
+            chunk[column] = numeric.astype("Int64" if whole else "float64").astype(object)
+    return chunk
+
+
+@stage("parse")
+def parse_csv_rows(file_obj: Union[BinaryIO, str]) -> Tuple[str, List[str], List[List[Any]]]:
+    """
+    Reads a CSV file with pandas' C parser in chunks of CSV_CHUNK_ROWS rows, with the same header detection and
+    column dropping as parse_excel_rows. The delimiter and column count are sniffed from the head of the file
+    (re-sized from the whole file if a later row is wider) and entirely numeric columns are converted to
+    numbers per chunk; all other values stay strings.
+    Returns (CSV_SHEET_TITLE, headers, data rows).
+    """
+    if isinstance(file_obj, str):
+        with open(file_obj, "rb") as f:
+            head = f.read(CSV_SNIFF_BYTES)
+    else:
+        head = file_obj.read(CSV_SNIFF_BYTES)
+        file_obj.seek(0)
+    delimiter, width = _sniff_csv(head)
+
+    try:
+        actual_headers, data_rows = _read_csv_table(file_obj, delimiter, width)
+    except pd.errors.ParserError as e:
+        # A row past the sniffed head is wider than any row in it: size the columns from the whole file and
+        # re-read, so no row is dropped (narrower rows are padded with empty cells)
+        if "Expected" not in str(e):
+            raise
+        width = _widest_csv_row(file_obj, delimiter)
+        print(f"WARN: CSV has rows wider than its first {CSV_SNIFF_BYTES} bytes; re-reading with {width} columns")
+        if not isinstance(file_obj, str):
+            file_obj.seek(0)
+        actual_headers, data_rows = _read_csv_table(file_obj, delimiter, width)
+    return CSV_SHEET_TITLE, actual_headers, data_rows
+
+
+def _read_csv_table(file_obj: Union[BinaryIO, str], delimiter: str, width: int) -> Tuple[List[str], List[List[Any]]]:
+    """
+    Streams a CSV file with `width` columns and returns (headers, data rows). Raises pandas' ParserError
+    if a row has more than `width` fields.
+    """
+    header_row: Optional[List[Any]] = None
+    non_empty_rows: List[Any] = []
+    non_empty_columns = set()
+    with pd.read_csv(
+        file_obj, sep=delimiter, header=None, names=range(width), index_col=False, dtype=str,
+        keep_default_na=False, na_values=[""], skip_blank_lines=True, chunksize=CSV_CHUNK_ROWS,
+        encoding="utf-8-sig", encoding_errors="replace", on_bad_lines="error", engine="c",
+    ) as reader:
+        for chunk in reader:
+            chunk = chunk.dropna(how="all") # Rows of empty cells (",,,") are as empty as blank lines
+            if chunk.empty:
+                continue
+            if header_row is None:
+                header_row = chunk.iloc[0].tolist()
+                chunk = chunk.iloc[1:].copy()
+                non_empty_columns.update(i for i, value in enumerate(header_row) if pd.notna(value))
+            non_empty_columns.update(i for i, present in enumerate(chunk.notna().any().tolist()) if present)
+            chunk = _convert_numeric_columns(chunk, delimiter)
+            non_empty_rows.extend(chunk.astype(object).where(chunk.notna(), None).values.tolist())
+    if header_row is None:
+        return project_non_empty_rows([], set())
+
+    non_empty_rows.insert(0, [value if pd.notna(value) else None for value in header_row])
+    return project_non_empty_rows(non_empty_rows, non_empty_columns)
+
+
+def _widest_csv_row(file_obj: Union[BinaryIO, str], delimiter: str) -> int:
+    """
+    Returns the field count of the widest row in the whole CSV file (a full pass with the csv module).
+    """
+    if isinstance(file_obj, str):
+        with open(file_obj, encoding="utf-8-sig", errors="replace", newline="") as f:
+            return max((len(row) for row in csv.reader(f, delimiter=delimiter)), default=1)
+    file_obj.seek(0)
+    lines = (line.decode("utf-8-sig", errors="replace") for line in file_obj)
+    return max((len(row) for row in csv.reader(lines, delimiter=delimiter)), default=1)
+
+
+def parse_rows(file_obj: Union[BinaryIO, str], sheet_name: Optional[str] = None) -> Tuple[str, List[str], List[List[Any]]]:
+    """
+    Reads one sheet of an .xlsx or .xls workbook, or a CSV file, picking the reader by detect_file_format.
+    sheet_name is ignored for CSV files. Returns (sheet title, headers, data rows).
+    """
+    file_format = detect_file_format(file_obj)
+    print(f"Detected file format: {file_format}")
+    if file_format == "xls":
+        return parse_xls_rows(file_obj, sheet_name)
+    if file_format == "csv":
+        return parse_csv_rows(file_obj)
+    return parse_excel_rows(file_obj, sheet_name)
+
+
+def project_non_empty_rows(non_empty_rows: List[Any], non_empty_columns: set) -> Tuple[List[str], List[List[Any]]]:
+    """
+    Turns the non-empty rows of a sheet into (headers, data rows) restricted to the non-empty columns.
+    """
+    if not non_empty_rows:
+        print("Warning: No non-empty columns found. Headers and data rows will be empty.")
+        return [], []
+
+    non_empty_columns_indexes = sorted(non_empty_columns)
+    # A row has content in the selected columns exactly when it has any content at all, so the first
+    # kept row is the header row, as in a two-pass scan over the selected columns.
+    # Rows are projected in place so the raw tuples are released as we go.
+    for row_idx, row_tuple in enumerate(non_empty_rows):
+        non_empty_rows[row_idx] = [row_tuple[col_idx] if col_idx < len(row_tuple) else None
+                                   for col_idx in non_empty_columns_indexes]
+    actual_headers = [str(h) if h is not None else f"Unknown_Header_{i}" for i, h in enumerate(non_empty_rows[0])]
+    del non_empty_rows[0]
+    return actual_headers, non_empty_rows
+
+
+def list_sheet_names(path: str) -> List[str]:
+    """
+    Returns the workbook's sheet titles in workbook order ([CSV_SHEET_TITLE] for a CSV file).
+    """
+    file_format = detect_file_format(path)
+    if file_format == "csv":
+        return [CSV_SHEET_TITLE]
+    if file_format == "xls":
+        if xlrd is None:
+            raise ValueError("Legacy .xls files need the xlrd package, which is not installed.")
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            return book.sheet_names()
+        finally:
+            book.release_resources()
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _get_sheet_pool() -> ProcessPoolExecutor:
+    global _sheet_pool
+    with _sheet_pool_lock:
+        if _sheet_pool is None:
+            # spawn rather than fork: the server process runs threads that fork would copy mid-flight
+            _sheet_pool = ProcessPoolExecutor(max_workers=SHEET_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _sheet_pool
+
+
+def combine_sheets(parsed_sheets: List[Tuple[str, List[str], List[List[Any]]]]) -> Tuple[List[str], List[List[Any]]]:
+    """
+    Combines (sheet title, headers, data rows) per sheet into one dataset. Columns are the union of the
+    sheets' headers in first-seen order, matched by name, plus SHEET_COLUMN holding each row's sheet title.
+    """
+    combined_headers: List[str] = []
+    for _, headers, _ in parsed_sheets:
+        combined_headers.extend(h for h in headers if h not in combined_headers and h != SHEET_COLUMN)
+    column_index = {header: i for i, header in enumerate(combined_headers)}
+    combined_rows: List[List[Any]] = []
+    for sheet_title, headers, rows in parsed_sheets:
+        targets = [column_index.get(h) for h in headers]
+        for row in rows:
+            combined_row = [None] * len(combined_headers) + [sheet_title]
+            for value, target in zip(row, targets):
+                if target is not None:
+                    combined_row[target] = value
+            combined_rows.append(combined_row)
+        rows.clear() # Release each sheet's rows as soon as they are copied
+    return combined_headers + [SHEET_COLUMN], combined_rows
+
+
+@stage("parse_workbook")
+def parse_workbook_sheets(path: str, sheet_names: List[str]) -> Tuple[List[str], List[str], List[List[Any]]]:
+    """
+    Parses the selected sheets (or every sheet, for [ALL_SHEETS]) of the .xlsx or .xls workbook at path, one worker
+    process per sheet, and combines them with combine_sheets. Sheets without a header row are skipped.
+    Raises ValueError for sheet names that do not exist.
+    Returns (parsed sheet titles, headers, data rows).
+    """
+    available = list_sheet_names(path)
+    selected = available if ALL_SHEETS in sheet_names else sheet_names
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown sheet(s): {', '.join(unknown)}. Available sheets: {', '.join(available)}")
+
+    if len(selected) == 1:
+        parsed_sheets = [parse_rows(path, selected[0])]
+    else:
+        # Each worker opens the file itself, so only the parsed values cross the process boundary
+        pool = _get_sheet_pool()
+        parsed_sheets = list(pool.map(parse_rows, [path] * len(selected), selected))
+    parsed_sheets = [sheet for sheet in parsed_sheets if sheet[1]]
+    print(f"Parsed {len(parsed_sheets)} of {len(selected)} selected sheets: {[title for title, _, _ in parsed_sheets]}")
+    headers, rows = combine_sheets(parsed_sheets)
+    return [title for title, _, _ in parsed_sheets], headers, rows
+
+
+@stage("column_detection")
+def infer_column_types(data_rows: List[List[Any]], column_count: int, sample_rows: int = 20) -> List[str]:
+    """
+    Infers a coarse type ("number", "date", "string" or "empty") per column from the first non-null
+    values of each column, stopping once every column has sample_rows values.
+    """
+    samples: List[List[Any]] = [[] for _ in range(column_count)]
+    for row in data_rows:
+        for i in range(min(column_count, len(row))):
+            if row[i] is not None and len(samples[i]) < sample_rows:
+                samples[i].append(row[i])
+        if all(len(column_samples) >= sample_rows for column_samples in samples):
+            break
+
+    column_types = []
+    for column_samples in samples:
+        if not column_samples:
+            column_types.append("empty")
+        elif all(isinstance(v, (datetime, date)) for v in column_samples):
+            column_types.append("date")
+        elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in column_samples):
+            column_types.append("number")
+        else:
+            column_types.append("string")
+    return column_types
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4")) # Pipelines running at once; others wait queued
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(6 * 3600))) # Finished jobs are kept this long for result pickup
+
+
+class JobStore:
+    """
+    In-process registry of background jobs. Each job runs on a shared thread pool and reports its
+    stage and progress through update(); status and results are read back by job ID.
+    """
+
+    def __init__(self, max_workers: int = MAX_CONCURRENT_JOBS, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> str:
+        """
+        Creates a job and schedules func(job_id, *args, **kwargs). The function's return value becomes the
+        job result; an exception marks the job as failed.
+        """
+        self._purge_expired()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued", # queued -> running -> completed | failed
+                "stage": "queued",
+                "progress": 0.0,
+                "error": None,
+                "result": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id: str, func: Callable[..., Any], args, kwargs) -> None:
+        self.update(job_id, status="running")
+        try:
+            result = func(job_id, *args, **kwargs)
+            self.update(job_id, status="completed", stage="completed", progress=1.0, result=result)
+        except Exception as e:
+            print(f"Error in background job {job_id}: {e}")
+            self.update(job_id, status="failed", error=str(e))
+
+    def update(self, job_id: str, **fields) -> None:
+        """
+        Updates a job's fields (stage, progress, ...). Unknown job IDs are ignored.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                job["updated_at"] = time.time()
+
+    def get(self, job_id: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Returns a snapshot of the job, without its result unless include_result is set, or None if unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+        if not include_result:
+            snapshot.pop("result")
+        return snapshot
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in ("completed", "failed") and job["updated_at"] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
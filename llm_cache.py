@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+# Local SQLite store shared by the API workers. Entries older than the TTL are treated as misses
+# and purged, and the least recently used entries are evicted once the cache grows past its size limit.
+CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH", "llm_cache.db")
+CATEGORY_CACHE_TTL_SECONDS = int(os.getenv("CATEGORY_CACHE_TTL_SECONDS", str(30 * 24 * 3600))) # 30 days
+CATEGORY_CACHE_MAX_ENTRIES = int(os.getenv("CATEGORY_CACHE_MAX_ENTRIES", "100000"))
+INTENT_CACHE_TTL_SECONDS = int(os.getenv("INTENT_CACHE_TTL_SECONDS", str(90 * 24 * 3600))) # 90 days
+
+# Categories that describe a failure rather than an answer; these are never cached.
+NON_CACHEABLE_CATEGORIES = {"Uncategorized", "Error in Categorization"}
+
+
+def normalize_description(description: str) -> str:
+    """
+    Normalizes a transaction description for use as a cache key (case and whitespace insensitive).
+    """
+    return " ".join(description.lower().split())
+
+
+class CategoryCache:
+    """
+    Persistent {(intent, normalized description): category} cache in front of the vertical agents.
+    Keeps hit/miss counters for the lifetime of the process.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH,
+                 ttl_seconds: int = CATEGORY_CACHE_TTL_SECONDS,
+                 max_entries: int = CATEGORY_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # One connection shared across threads; access is serialized through self._lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS category_cache (
+                   intent TEXT NOT NULL,
+                   description_key TEXT NOT NULL,
+                   category TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   last_used_at REAL NOT NULL,
+                   PRIMARY KEY (intent, description_key)
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_category_cache_last_used ON category_cache (last_used_at)")
+        self._conn.commit()
+
+    def get_many(self, intent: str, descriptions: List[str]) -> Dict[str, str]:
+        """
+        Looks up every description for the given intent.
+        Returns a {description: category} map containing only the cache hits.
+        """
+        if not descriptions:
+            return {}
+        now = time.time()
+        keys_by_description = {desc: normalize_description(desc) for desc in descriptions}
+        unique_keys = list(set(keys_by_description.values()))
+        found: Dict[str, str] = {}
+        with self._lock:
+            # Query in slices to stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                key_slice = unique_keys[i:i + 500]
+                placeholders = ",".join("?" for _ in key_slice)
+                rows = self._conn.execute(
+                    f"SELECT description_key, category FROM category_cache "
+                    f"WHERE intent = ? AND created_at >= ? AND description_key IN ({placeholders})",
+                    [intent, now - self.ttl_seconds, *key_slice],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                self._conn.executemany(
+                    "UPDATE category_cache SET last_used_at = ? WHERE intent = ? AND description_key = ?",
+                    [(now, intent, key) for key in found],
+                )
+                self._conn.commit()
+
+            results = {desc: found[key] for desc, key in keys_by_description.items() if key in found}
+            self.hits += len(results)
+            self.misses += len(keys_by_description) - len(results)
+        return results
+
+    def set_many(self, intent: str, category_map: Dict[str, str]) -> None:
+        """
+        Stores the {description: category} results for the given intent and applies eviction.
+        """
+        now = time.time()
+        rows = [(intent, normalize_description(desc), category, now, now)
+                for desc, category in category_map.items()
+                if isinstance(category, str) and category not in NON_CACHEABLE_CATEGORIES]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO category_cache (intent, description_key, category, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        # Drop expired entries first, then the least recently used ones above max_entries
+        self._conn.execute("DELETE FROM category_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        (entry_count,) = self._conn.execute("SELECT COUNT(*) FROM category_cache").fetchone()
+        overflow = entry_count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM category_cache WHERE rowid IN "
+                "(SELECT rowid FROM category_cache ORDER BY last_used_at ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def count(self, intent: str) -> int:
+        """
+        Returns the number of cached (unexpired) entries for the given intent.
+        """
+        with self._lock:
+            (entry_count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM category_cache WHERE intent = ? AND created_at >= ?",
+                (intent, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return entry_count
+
+    def entries(self, intent: str, limit: int) -> List[Tuple[str, str]]:
+        """
+        Returns up to limit (normalized description, category) pairs for the intent, most recently used first.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT description_key, category FROM category_cache WHERE intent = ? AND created_at >= ? "
+                "ORDER BY last_used_at DESC LIMIT ?",
+                (intent, time.time() - self.ttl_seconds, limit),
+            ).fetchall()
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and the current number of cached entries.
+        """
+        with self._lock:
+            (entry_count,) = self._conn.execute("SELECT COUNT(*) FROM category_cache").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entry_count,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+    def clear(self) -> None:
+        """
+        Removes every cached entry and resets the counters.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM category_cache")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+
+def intent_query_hash(business_query: str) -> str:
+    """
+    Hashes a business description after case and whitespace normalization.
+    """
+    return hashlib.sha256(normalize_description(business_query).encode("utf-8")).hexdigest()
+
+
+class IntentCache:
+    """
+    Persistent {hash of normalized business description: intent} cache in front of the intent agent.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH, ttl_seconds: int = INTENT_CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS intent_cache (
+                   query_hash TEXT PRIMARY KEY,
+                   intent TEXT NOT NULL,
+                   created_at REAL NOT NULL
+               )"""
+        )
+        self._conn.commit()
+
+    def get(self, business_query: str) -> Optional[str]:
+        """
+        Returns the cached intent for the business description, or None on a miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT intent FROM intent_cache WHERE query_hash = ? AND created_at >= ?",
+                (intent_query_hash(business_query), time.time() - self.ttl_seconds),
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def set(self, business_query: str, intent: str) -> None:
+        """
+        Stores the intent identified for the business description.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO intent_cache (query_hash, intent, created_at) VALUES (?, ?, ?)",
+                (intent_query_hash(business_query), intent, time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and the current number of cached intents.
+        """
+        with self._lock:
+            (entry_count,) = self._conn.execute("SELECT COUNT(*) FROM intent_cache").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entry_count,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+def header_fingerprint(headers: List[str], column_types: List[str]) -> str:
+    """
+    Fingerprints an export layout by its set of (header, inferred column type) pairs, ignoring column order.
+    """
+    pairs = sorted(f"{header.strip()}\x1f{column_type}" for header, column_type in zip(headers, column_types))
+    return hashlib.sha256("\x1e".join(pairs).encode("utf-8")).hexdigest()
+
+
+class HeaderMappingCache:
+    """
+    Persistent {header fingerprint: header mapping} cache in front of the header-mapping LLM call.
+    Mappings confirmed by a user are never overwritten by LLM answers.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS header_mapping_cache (
+                   fingerprint TEXT PRIMARY KEY,
+                   header_mapping TEXT NOT NULL,
+                   confirmed INTEGER NOT NULL DEFAULT 0,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+        self._conn.commit()
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Returns the stored mapping for the fingerprint, or None on a miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT header_mapping FROM header_mapping_cache WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def set(self, fingerprint: str, header_mapping: Dict[str, Optional[str]], confirmed: bool = False) -> None:
+        """
+        Stores a mapping. Unconfirmed (LLM) mappings do not replace a mapping a user has confirmed.
+        """
+        with self._lock:
+            if confirmed:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO header_mapping_cache (fingerprint, header_mapping, confirmed, updated_at) "
+                    "VALUES (?, ?, 1, ?)",
+                    (fingerprint, json.dumps(header_mapping), time.time()),
+                )
+            else:
+                self._conn.execute(
+                    "INSERT INTO header_mapping_cache (fingerprint, header_mapping, confirmed, updated_at) "
+                    "VALUES (?, ?, 0, ?) "
+                    "ON CONFLICT (fingerprint) DO UPDATE SET header_mapping = excluded.header_mapping, "
+                    "updated_at = excluded.updated_at WHERE confirmed = 0",
+                    (fingerprint, json.dumps(header_mapping), time.time()),
+                )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and the number of stored (and user-confirmed) mappings.
+        """
+        with self._lock:
+            entry_count, confirmed_count = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(confirmed), 0) FROM header_mapping_cache"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entry_count,
+                "confirmed_entries": confirmed_count,
+            }
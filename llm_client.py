@@ -0,0 +1,236 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+import httpx
+import openai
+from openai import OpenAI
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+# LLM_BACKEND picks where chat completions go: "gateway" (the LiteLLM gateway, or LLM_BASE_URL if set),
+# "openai" (api.openai.com) or "mock" (the local mock_llm_server.py, for offline benchmarks and CI).
+# Each backend has its own model name; LLM_MODEL overrides it for every call site.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gateway").lower()
+MOCK_LLM_BASE_URL = os.getenv("MOCK_LLM_BASE_URL", "http://127.0.0.1:8100/v1")
+LLM_BACKENDS = {
+    "gateway": {"base_url": os.getenv("LLM_BASE_URL", "https://litellm.int.thomsonreuters.com"), "model": "gpt-4o"},
+    "openai": {"base_url": "https://api.openai.com/v1", "model": "gpt-4o"},
+    "mock": {"base_url": MOCK_LLM_BASE_URL, "model": "gpt-4o"},
+}
+if LLM_BACKEND not in LLM_BACKENDS:
+    print(f"WARN: Unknown LLM_BACKEND '{LLM_BACKEND}'. Falling back to the gateway.")
+    LLM_BACKEND = "gateway"
+LLM_BASE_URL = LLM_BACKENDS[LLM_BACKEND]["base_url"]
+LLM_MODEL = os.getenv("LLM_MODEL") or LLM_BACKENDS[LLM_BACKEND]["model"]
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60")) # Per-attempt read timeout
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32")) # Pooled keep-alive connections per client
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4")) # Retries after the first attempt for retryable errors
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5")) # Consecutive calls that exhausted their retries on gateway faults
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30")) # Open time before a trial call is let through
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling the gateway while its circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker: after failure_threshold failed calls it opens and rejects calls
+    for reset_seconds, then lets a single trial call through (half-open); success closes it again.
+    Only gateway faults count as failures (see counts_toward_breaker), once per call that gave up.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self.opened_at < self.reset_seconds else "half_open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._trial_in_flight:
+                raise CircuitOpenError("LLM gateway circuit is open; failing fast.")
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """
+        Ends an attempt that neither proves nor disproves gateway health (throttling, or an error still being
+        retried) without changing the failure count, so a half-open circuit can let the next trial through.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"WARN: LLM circuit opened after {self.consecutive_failures} consecutive failures.")
+                self.opened_at = time.monotonic() # A failed trial call keeps the circuit open for another period
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Returns the server-requested delay from a Retry-After (seconds or HTTP date) or retry-after-ms header, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)): # APITimeoutError subclasses APIConnectionError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def counts_toward_breaker(error: Exception) -> bool:
+    """
+    Whether an error indicates an unhealthy gateway: connection errors, timeouts and 5xx responses.
+    Throttling (429, or any response carrying Retry-After) means the gateway is up and asking callers to
+    slow down, so it never opens the circuit for everyone else.
+    """
+    if retry_after_seconds(error) is not None:
+        return False
+    if isinstance(error, openai.APIConnectionError): # Includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+class ResilientLLMClient:
+    """
+    Chat-completion client shared by the header mapping and the LangGraph nodes. It pools keep-alive
+    connections, applies per-call timeouts, retries transient failures with jittered exponential backoff
+    (honoring Retry-After) and fails fast through a circuit breaker while the gateway is down.
+    """
+
+    def __init__(self, api_key: Optional[str], base_url: str = LLM_BASE_URL, raw_client: Any = None,
+                 breaker: Optional[CircuitBreaker] = None, max_retries: int = LLM_MAX_RETRIES):
+        if raw_client is None:
+            http_client = httpx.Client(
+                timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+            )
+            # Retries are handled here (with the circuit breaker), not by the SDK
+            raw_client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        self.raw_client = raw_client
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.retries = 0
+        self.failures = 0
+
+    def create_chat_completion(self, **kwargs) -> Any:
+        """
+        Same arguments and return value as client.chat.completions.create, with retries and circuit breaking.
+        Raises CircuitOpenError while the circuit is open, or the last error once retries are exhausted.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.breaker.before_call()
+            try:
+                response = self.raw_client.chat.completions.create(**kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # Request errors (bad payload, auth) say nothing about gateway health: neither a success nor a failure
+                    self.breaker.release_trial()
+                    raise
+                if attempt == self.max_retries:
+                    self.failures += 1
+                    # One failure per call that gave up, and only for gateway faults
+                    if counts_toward_breaker(e):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.release_trial()
+                    raise
+                self.breaker.release_trial()
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+                delay = min(delay, LLM_BACKOFF_MAX_SECONDS)
+                self.retries += 1
+                print(f"LLM call failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s.")
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return response
+
+    def stats(self) -> dict:
+        """
+        Returns retry/failure counters and the circuit breaker state.
+        """
+        return {
+            "retries": self.retries,
+            "failures": self.failures,
+            "backend": LLM_BACKEND,
+            "model": LLM_MODEL,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+        }
+
+
+# One circuit breaker per gateway, shared by every client that talks to it
+_breakers: Dict[str, CircuitBreaker] = {}
+_clients: Dict[Tuple[str, Optional[str]], ResilientLLMClient] = {}
+_registry_lock = threading.Lock()
+
+
+def get_llm_client(api_key: Optional[str], base_url: str = LLM_BASE_URL) -> ResilientLLMClient:
+    """
+    Returns the process-wide client for (base_url, api_key), creating it (and its connection pool) on first use.
+    """
+    if LLM_BACKEND == "mock":
+        api_key = api_key or "mock" # The mock server ignores the key, but the SDK requires one
+    with _registry_lock:
+        client = _clients.get((base_url, api_key))
+        if client is None:
+            breaker = _breakers.setdefault(base_url, CircuitBreaker())
+            client = _clients[(base_url, api_key)] = ResilientLLMClient(api_key, base_url=base_url, breaker=breaker)
+        return client
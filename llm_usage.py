@@ -0,0 +1,59 @@
+import threading
+from typing import Any, Dict
+from metrics import llm_calls, llm_tokens
+
+
+class LLMUsageTracker:
+    """
+    In-process token and latency accounting per LLM call site (graph node or endpoint helper).
+    Counts are cumulative since process start.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, node: str, response: Any, latency_seconds: float, items: int = 0) -> None:
+        """
+        Records one completed call: token counts are read from the response's usage block (missing usage
+        counts as zero), items is the number of transactions the call categorized.
+        """
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        # Prompt tokens served from the provider's prompt cache (only reported by some providers)
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+        with self._lock:
+            node_usage = self._nodes.setdefault(node, {
+                "calls": 0, "items": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0,
+                "completion_tokens": 0, "latency_seconds": 0.0, "max_latency_seconds": 0.0,
+            })
+            node_usage["calls"] += 1
+            node_usage["items"] += items
+            node_usage["prompt_tokens"] += prompt_tokens
+            node_usage["cached_prompt_tokens"] += cached_tokens
+            node_usage["completion_tokens"] += completion_tokens
+            node_usage["latency_seconds"] += latency_seconds
+            node_usage["max_latency_seconds"] = max(node_usage["max_latency_seconds"], latency_seconds)
+        llm_calls.inc(node=node)
+        llm_tokens.inc(prompt_tokens, node=node, kind="prompt")
+        llm_tokens.inc(cached_tokens, node=node, kind="cached_prompt")
+        llm_tokens.inc(completion_tokens, node=node, kind="completion")
+        print(f"LLM usage [{node}]: {prompt_tokens} prompt ({cached_tokens} cached) + {completion_tokens} completion tokens, "
+              f"{latency_seconds:.2f}s, {items} items.")
+
+    def stats(self) -> dict:
+        """
+        Returns the cumulative counters per node with average latency and tokens per transaction.
+        """
+        with self._lock:
+            nodes = {node: dict(usage) for node, usage in self._nodes.items()}
+        for usage in nodes.values():
+            total_tokens = usage["prompt_tokens"] + usage["completion_tokens"]
+            usage["avg_latency_seconds"] = usage["latency_seconds"] / usage["calls"]
+            usage["tokens_per_transaction"] = total_tokens / usage["items"] if usage["items"] else None
+        return {"nodes": nodes}
+
+
+# Shared by the graph nodes in agentic.py and the header mapping call in app.py
+usage_tracker = LLMUsageTracker()
@@ -0,0 +1,236 @@
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from categories import VERTICAL_CATEGORIES
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+# The TF-IDF model is optional; without scikit-learn only the keyword rules are used.
+try:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+except ImportError:
+    print("WARN: scikit-learn not installed. Local classifier will use keyword rules only.")
+    make_pipeline = None
+
+# Rows classified locally with at least this confidence skip the LLM; the rest are escalated.
+LOCAL_CLASSIFIER_CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_CONFIDENCE_THRESHOLD", "0.85"))
+LOCAL_MODEL_MIN_TRAINING_SAMPLES = int(os.getenv("LOCAL_MODEL_MIN_TRAINING_SAMPLES", "50"))
+LOCAL_MODEL_MAX_TRAINING_SAMPLES = int(os.getenv("LOCAL_MODEL_MAX_TRAINING_SAMPLES", "20000"))
+LOCAL_MODEL_RETRAIN_EVERY = int(os.getenv("LOCAL_MODEL_RETRAIN_EVERY", "200")) # New labeled samples before retraining
+
+RULE_CONFIDENCE = 0.95 # Confidence of a single unambiguous keyword rule match
+# Confidence of rules on a single broad keyword ("hmrc", "train"): below the threshold, so the model or the LLM decides
+BROAD_RULE_CONFIDENCE = 0.6
+# Tax payments that are business costs (VAT, PAYE, employer contributions), not the owner's personal tax
+BUSINESS_TAX_EXCLUSION = r"^(?!.*\b(vat|paye|employers?|corporation tax|cis)\b)"
+
+# (pattern, category[, confidence]) rules shared by every vertical; a rule only applies if its category exists in
+# the vertical. Confidence defaults to RULE_CONFIDENCE.
+COMMON_RULES = [
+    # Payroll software and bureau subscriptions are not wages
+    (r"^(?!.*\b(software|subscriptions?|app|licen[cs]es?|bureau)\b).*\b(salary|salaries|wages|payroll)\b", "Employee Costs"),
+    (r"\binterest (charged|paid|payable)\b|\bloan interest\b", "Interest"),
+    (r"\binterest (received|earned|credited)\b", "Other Income"),
+    # Rent paid, not rent received or returned: "Rental income", "Rent deposit returned" are left to the LLM
+    (r"^(?!.*\b(income|received|receipts?|tenants?|sublet(ting)?|deposit|returned|refund(ed)?)\b).*\b(rent|rental)\b",
+     "Premises Costs"),
+    (r"\b(electricity|gas bill|water bill|water rates|utilities|utility bill|business rates)\b", "Premises Costs"),
+    (r"\b(accountant|accountancy|accounting fees?|bookkeeping|solicitors?|legal fees?)\b", "Legal and Professional Costs"),
+    (r"\b(facebook|instagram|google|linkedin) ads?\b|\badvertis(ing|ement)\b", "Advertising and Promotion Costs"),
+    (r"\bdepreciation\b", "Depreciation"),
+    (BUSINESS_TAX_EXCLUSION + r".*\b(income tax|self assessment)\b", "Personal"),
+    (BUSINESS_TAX_EXCLUSION + r".*\b(hmrc|national insurance)\b", "Personal", BROAD_RULE_CONFIDENCE),
+    (r"\b(flights?|airfare|train tickets?|rail fares?)\b", "Travel and Subsistence"),
+    # "Uber Eats" is food, and a hotel or taxi can be entertainment
+    (r"^(?!.*\beats\b).*\b(train|rail|hotel|taxi|uber)\b", "Travel and Subsistence", BROAD_RULE_CONFIDENCE),
+    (r"\b(fuel|petrol|diesel|car service|car repair|vehicle tax)\b", "Motor Expenses"),
+    (r"\b(bad debt|written off|write off)\b", "Bad Debts"),
+    (r"\b(stationery|printer paper|office supplies|phone bill|mobile bill|broadband)\b", "General Administration Expenses"),
+]
+
+VERTICAL_RULES = {
+    "salon": [
+        (r"\b(haircut|hair colou?ring|colou?r service|blow ?dry)\b", "Turnover"),
+        (r"\b(styling|highlights)\b", "Turnover", BROAD_RULE_CONFIDENCE), # Also styling products bought in
+        (r"\b(shampoo|conditioner|hair dye|bleach|toner|l'?oreal|wella)\b", "Cost of Goods"),
+        (r"\b(scissors|brushes|hair ?dryer|straighteners|towels)\b", "Other Direct Costs"),
+        (r"\b(gift vouchers?|product commission)\b", "Other Income"),
+    ],
+    "tutor": [
+        (r"\b(tuition|tutoring|from student|student payment)\b", "Turnover"),
+        (r"\b(lessons?|tutorial)\b", "Turnover", BROAD_RULE_CONFIDENCE), # Also lessons the tutor pays for
+        (r"\b(textbooks?|workbooks?|past papers)\b", "Cost of Goods"),
+        (r"\b(zoom|whiteboard|teams subscription)\b", "Other Direct Costs"),
+    ],
+    "architectural": [
+        (r"\b(design fee|consultation fee|project fee|planning application fee received|stage payment)\b", "Turnover"),
+        (r"\b(subcontract(or|ed)?|structural engineer|surveyor)\b", "Subcontractor Expense"),
+        (r"\b(autocad|revit|archicad|sketchup)\b", "General Administration Expenses"),
+        (r"\bcad\b", "General Administration Expenses", BROAD_RULE_CONFIDENCE), # Also Canadian dollars
+        (r"\b(client (dinner|lunch)|entertaining)\b", "Business Entertainment Costs"),
+    ],
+}
+
+
+def _compile_rules(intent: str) -> List[Tuple["re.Pattern", str, float]]:
+    allowed = set(VERTICAL_CATEGORIES.get(intent, []))
+    rules = VERTICAL_RULES.get(intent, []) + COMMON_RULES
+    return [(re.compile(rule[0], re.IGNORECASE), rule[1], rule[2] if len(rule) > 2 else RULE_CONFIDENCE)
+            for rule in rules if rule[1] in allowed]
+
+
+class LocalClassifier:
+    """
+    First-tier, in-process transaction classifier per vertical: keyword/regex rules, then a TF-IDF +
+    logistic regression model trained on previously categorized descriptions. Each answer carries a
+    confidence; callers escalate low-confidence rows to the LLM. Models are (re)trained in a background
+    thread and swapped in when ready; until then the previous model, or the rules alone, answer.
+    training_sources are objects with count(intent) and entries(intent, limit) -> [(description, category)].
+    """
+
+    def __init__(self, training_sources: List, confidence_threshold: float = LOCAL_CLASSIFIER_CONFIDENCE_THRESHOLD):
+        self.training_sources = training_sources
+        self.confidence_threshold = confidence_threshold
+        self._rules = {intent: _compile_rules(intent) for intent in VERTICAL_CATEGORIES}
+        self._models: Dict[str, object] = {}
+        self._trained_on: Dict[str, int] = {} # Labeled sample count at last training, per intent
+        self._training: Dict[str, Future] = {} # Trainings in flight, per intent
+        self._training_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-model")
+        self._lock = threading.Lock()
+        self.rule_hits = 0
+        self.model_hits = 0
+        self.escalations = 0
+
+    def _rule_category(self, intent: str, description: str) -> Tuple[Optional[str], float]:
+        matched: Dict[str, float] = {}
+        for pattern, category, confidence in self._rules.get(intent, []):
+            if pattern.search(description):
+                matched[category] = max(confidence, matched.get(category, 0.0))
+        if len(matched) == 1:
+            return matched.popitem()
+        # Conflicting rules mean the description needs a closer look
+        return None, 0.0
+
+    def _model_for(self, intent: str):
+        if make_pipeline is None:
+            return None
+        sample_count = sum(source.count(intent) for source in self.training_sources)
+        with self._lock:
+            last_trained_on = self._trained_on.get(intent)
+            needs_training = sample_count >= LOCAL_MODEL_MIN_TRAINING_SAMPLES and intent not in self._training and (
+                last_trained_on is None or sample_count - last_trained_on >= LOCAL_MODEL_RETRAIN_EVERY
+            )
+            if needs_training:
+                # Training takes seconds on large histories, so it never runs in the request path
+                self._trained_on[intent] = sample_count
+                self._training[intent] = self._training_executor.submit(self._train, intent, sample_count)
+            return self._models.get(intent)
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> None:
+        """
+        Blocks until the model trainings in flight have finished (or timeout seconds have passed).
+        """
+        with self._lock:
+            in_flight = list(self._training.values())
+        wait(in_flight, timeout=timeout)
+
+    def _train(self, intent: str, sample_count: int) -> None:
+        try:
+            model = self._fit(intent)
+            if model is not None:
+                with self._lock:
+                    self._models[intent] = model
+        except Exception as e:
+            print(f"WARN: Local classifier: training the {intent} model on {sample_count} samples failed: {e}")
+        finally:
+            with self._lock:
+                self._training.pop(intent, None)
+
+    def _fit(self, intent: str):
+        allowed = set(VERTICAL_CATEGORIES.get(intent, []))
+        samples = {}
+        for source in self.training_sources: # Later sources (e.g. user corrections) override earlier ones
+            for description, category in source.entries(intent, LOCAL_MODEL_MAX_TRAINING_SAMPLES):
+                if category in allowed:
+                    samples[description.lower()] = category
+        if len(samples) < LOCAL_MODEL_MIN_TRAINING_SAMPLES or len(set(samples.values())) < 2:
+            return None
+        model = make_pipeline(
+            TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True),
+            LogisticRegression(max_iter=1000),
+        )
+        model.fit(list(samples.keys()), list(samples.values()))
+        print(f"Local classifier: trained {intent} model on {len(samples)} descriptions.")
+        return model
+
+    def classify(self, intent: str, descriptions: List[str]) -> Dict[str, Tuple[str, float, str]]:
+        """
+        Returns {description: (category, confidence, tier)} for every description the local tier can answer,
+        rules first ("rule") and the trained model ("model") for the rest and for broad rule matches, whichever
+        is surer. Confidence is in [0, 1].
+        """
+        results: Dict[str, Tuple[str, float, str]] = {}
+        remaining = []
+        for desc in descriptions:
+            category, confidence = self._rule_category(intent, desc)
+            if category:
+                results[desc] = (category, confidence, "rule")
+            if confidence < self.confidence_threshold:
+                remaining.append(desc) # Broad rule matches are kept only if the model is no surer
+
+        model = self._model_for(intent) if remaining else None
+        if model is not None:
+            # One vectorized predict_proba call for the whole batch
+            probabilities = model.predict_proba([desc.lower() for desc in remaining])
+            classes = model.classes_
+            for desc, row in zip(remaining, probabilities):
+                best = row.argmax()
+                if float(row[best]) > results.get(desc, (None, 0.0))[1]:
+                    results[desc] = (str(classes[best]), float(row[best]), "model")
+        return results
+
+    def split_confident(self, intent: str, descriptions: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Splits descriptions into ({description: category} answered locally with enough confidence,
+        [descriptions to escalate to the LLM]).
+        """
+        if intent not in VERTICAL_CATEGORIES or not descriptions:
+            return {}, list(descriptions)
+        classified = self.classify(intent, descriptions)
+        confident: Dict[str, str] = {}
+        escalate = []
+        rule_hits = model_hits = 0
+        for desc in descriptions:
+            category, confidence, tier = classified.get(desc, (None, 0.0, None))
+            if category and confidence >= self.confidence_threshold:
+                confident[desc] = category
+                if tier == "rule":
+                    rule_hits += 1
+                else:
+                    model_hits += 1
+            else:
+                escalate.append(desc)
+        with self._lock:
+            self.rule_hits += rule_hits
+            self.model_hits += model_hits
+            self.escalations += len(escalate)
+        return confident, escalate
+
+    def stats(self) -> dict:
+        """
+        Returns counters of rows answered by rules, by the model and escalated to the LLM.
+        """
+        with self._lock:
+            return {
+                "rule_hits": self.rule_hits,
+                "model_hits": self.model_hits,
+                "escalations": self.escalations,
+                "trained_models": sorted(self._models),
+                "training_models": sorted(self._training),
+                "confidence_threshold": self.confidence_threshold,
+            }
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+# Trace spans are optional: with TRACING_ENABLED=true and opentelemetry-api installed, every stage() also opens a
+# span (exported wherever the deployment's OpenTelemetry SDK, e.g. opentelemetry-instrument, sends them).
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+tracer = None
+if TRACING_ENABLED:
+    try:
+        from opentelemetry import trace
+        tracer = trace.get_tracer("beta_coders")
+    except ImportError:
+        print("WARN: opentelemetry-api not installed. Trace spans are disabled.")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], le: str = "") -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if le:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter with fixed label names, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with fixed label names, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], dict] = {} # key -> {"counts": per-bucket counts, "sum", "count"}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, str(bound))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, '+Inf')} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {series['count']}")
+        return lines
+
+
+stage_seconds = Histogram("stage_duration_seconds", "Wall-clock duration of a pipeline stage.", ("stage",))
+stage_errors = Counter("stage_errors_total", "Pipeline stage executions that raised or fell back after an error.", ("stage",))
+llm_calls = Counter("llm_calls_total", "Completed LLM calls per call site.", ("node",))
+llm_tokens = Counter("llm_tokens_total", "LLM tokens per call site and kind (prompt, cached_prompt, completion).", ("node", "kind"))
+rows_answered = Counter("categorization_rows_total", "Unique descriptions categorized, by the tier that answered them.", ("source",))
+header_mapping_lookups = Counter("header_mapping_cache_lookups_total", "Header mapping cache lookups by result.", ("result",))
+
+ALL_METRICS = [stage_seconds, stage_errors, llm_calls, llm_tokens, rows_answered, header_mapping_lookups]
+
+
+@contextmanager
+def stage(name: str, **span_attributes) -> Iterator[None]:
+    """
+    Times a pipeline stage into stage_duration_seconds{stage=name}, counts it in stage_errors_total if it raises,
+    and wraps it in a trace span when tracing is enabled.
+    """
+    with ExitStack() as stack:
+        if tracer:
+            stack.enter_context(tracer.start_as_current_span(name, attributes=span_attributes))
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            stage_errors.inc(stage=name)
+            raise
+        finally:
+            stage_seconds.observe(time.perf_counter() - started, stage=name)
+
+
+def render_metrics() -> str:
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,144 @@
+import ast
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+# Offline, OpenAI-compatible stand-in for the LLM gateway. Point the app at it with LLM_BACKEND=mock and run:
+#   uvicorn mock_llm_server:app --port 8100
+# Answers are deterministic per input (a description always gets the same category number); only the
+# injected latency and errors are random, and those are reproducible with MOCK_LLM_SEED.
+MOCK_LLM_LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", "300")) # Base latency per call
+MOCK_LLM_LATENCY_PER_ITEM_MS = float(os.getenv("MOCK_LLM_LATENCY_PER_ITEM_MS", "20")) # Added per categorized description, like generation time
+MOCK_LLM_JITTER_MS = float(os.getenv("MOCK_LLM_JITTER_MS", "100")) # Uniform +/- jitter on the latency
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0")) # Fraction of calls answered with 429/503
+MOCK_LLM_RETRY_AFTER_SECONDS = os.getenv("MOCK_LLM_RETRY_AFTER_SECONDS", "1")
+MOCK_LLM_SEED = os.getenv("MOCK_LLM_SEED")
+
+INTENT_KEYWORDS = [
+    ("Salon", ("salon", "hair", "beauty", "barber", "nail")),
+    ("Tutor", ("tutor", "teach", "lesson", "tuition", "education")),
+    ("Architectural", ("architect", "design", "construction", "building")),
+]
+HEADER_KEYWORDS = {
+    "disallowableExpenses": ("disallow", "deductible"),
+    "transactionDate": ("date", "posted", "when"),
+    "transactionDescription": ("desc", "narrative", "detail", "memo", "particular", "payee", "reference"),
+    "amount": ("amount", "value", "total", "gross", "net", "debit", "credit"),
+}
+
+app = FastAPI()
+_random = random.Random(MOCK_LLM_SEED)
+request_count = 0
+
+
+def stable_choice(text: str, options: int) -> int:
+    """
+    Deterministic 1-based choice in [1, options] for the given text.
+    """
+    return zlib.crc32(text.strip().lower().encode("utf-8")) % options + 1
+
+
+def answer_intent(query: str) -> str:
+    query = query.lower()
+    for intent, keywords in INTENT_KEYWORDS:
+        if any(keyword in query for keyword in keywords):
+            return intent
+    return "Uncategorized"
+
+
+def answer_category_ids(user_content: str, response_format: Dict[str, Any]) -> str:
+    # Category count comes from the enum in the structured-output schema
+    item_schema = response_format["json_schema"]["schema"]["properties"]["categories"]["items"]
+    category_count = len(item_schema.get("enum", [])) or 1
+    descriptions = [line.split(". ", 1)[-1] for line in user_content.splitlines() if line.strip()]
+    return json.dumps({"categories": [stable_choice(desc, category_count) for desc in descriptions]})
+
+
+def answer_header_mapping(user_content: str) -> str:
+    match = re.search(r"User Headers:\s*\n(.*)\n", user_content)
+    try:
+        headers = [str(h) for h in ast.literal_eval(match.group(1))] if match else []
+    except (ValueError, SyntaxError):
+        headers = []
+    mapping: Dict[str, Optional[str]] = {}
+    used = set()
+    for column, keywords in HEADER_KEYWORDS.items(): # disallowableExpenses first so "amount" does not claim it
+        mapping[column] = next((h for h in headers if h not in used and any(k in h.lower() for k in keywords)), None)
+        used.add(mapping[column])
+    return json.dumps(mapping)
+
+
+def build_answer(body: Dict[str, Any]) -> tuple:
+    """
+    Returns (content, item count) for the request, recognizing the categorization, intent and header mapping calls.
+    """
+    messages = body.get("messages", [])
+    system_content = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    user_content = messages[-1]["content"] if messages else ""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema" and response_format["json_schema"].get("name") == "category_ids":
+        content = answer_category_ids(user_content, response_format)
+        return content, len(json.loads(content)["categories"])
+    if "data mapping" in system_content:
+        return answer_header_mapping(user_content), 0
+    if "Only return a single word" in system_content:
+        return answer_intent(user_content), 0
+    return json.dumps({}) if response_format else "", 0
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    global request_count
+    request_count += 1
+    body = await request.json()
+    content, items = build_answer(body)
+
+    latency_ms = MOCK_LLM_LATENCY_MS + MOCK_LLM_LATENCY_PER_ITEM_MS * items + _random.uniform(-MOCK_LLM_JITTER_MS, MOCK_LLM_JITTER_MS)
+    await asyncio.sleep(max(0.0, latency_ms) / 1000)
+
+    if _random.random() < MOCK_LLM_ERROR_RATE:
+        status_code = _random.choice([429, 503])
+        return JSONResponse(
+            status_code=status_code,
+            content={"error": {"message": "Injected mock error", "type": "mock_error", "code": status_code}},
+            headers={"retry-after": MOCK_LLM_RETRY_AFTER_SECONDS} if status_code == 429 else None,
+        )
+
+    prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+    prompt_tokens = prompt_chars // 4 + 1
+    completion_tokens = len(content) // 4 + 1
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "gpt-4o", "object": "model", "owned_by": "mock"}]}
+
+
+@app.get("/stats")
+async def mock_stats():
+    return {"requests": request_count}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("MOCK_LLM_PORT", "8100")))
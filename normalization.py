@@ -0,0 +1,85 @@
+import re
+from typing import Dict, List, Tuple
+import pandas as pd
+
+# Patterns are applied in order to a lowercased description.
+DATE_PATTERN = re.compile(r"\b\d{1,4}[/\-.]\d{1,2}(?:[/\-.]\d{2,4})?\b") # 12/03, 2024-03-12, 12.03.24
+# Only real month names, ending at a word boundary or a following year ("12mar2024"), so words that merely
+# start like a month after a number ("10 markers", "2 decorators") are kept
+MONTH_DATE_PATTERN = re.compile(
+    r"\b\d{1,2}(?:st|nd|rd|th)?\s*(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)(?![a-z])(?:\s*\d{2,4}\b)?"
+) # 12 mar, 12th March 2024, 12mar2024
+# The keyword (group 1) is kept, only the reference token after it is stripped: "invoice 123" -> "invoice"
+REFERENCE_PATTERN = re.compile(
+    r"\b(ref|reference|inv|invoice|txn|trans|transaction|id|no|num|number|cheque|chq)\b[\s.:#-]*[a-z0-9/-]*\d[a-z0-9/-]*"
+) # REF 8831, Invoice No. INV-2231
+ALPHANUMERIC_TOKEN_PATTERN = re.compile(r"\b(?=[a-z]*\d)[a-z0-9]*\d[a-z0-9]*\b") # ab12cd, 8831, x9
+NON_WORD_PATTERN = re.compile(r"[^a-z&]+")
+
+# Number text with thousands grouping, per decimal separator: 1,234.56 or 1.234,56
+GROUPED_NUMBER_PATTERNS = {
+    ".": r"-?\d{1,3}(?:,\d{3})+(?:\.\d+)?",
+    ",": r"-?\d{1,3}(?:\.\d{3})+(?:,\d+)?",
+}
+
+
+def canonical_description_key(description: str) -> str:
+    """
+    Collapses a transaction description into a canonical key by lowercasing it and stripping dates,
+    reference tokens (keeping their keyword), amounts and other digits, punctuation and extra whitespace.
+    "Card payment TESCO 12/03 REF 8831" -> "card payment tesco ref"
+    """
+    key = description.lower()
+    key = DATE_PATTERN.sub(" ", key)
+    key = MONTH_DATE_PATTERN.sub(" ", key)
+    key = REFERENCE_PATTERN.sub(r" \1 ", key)
+    key = ALPHANUMERIC_TOKEN_PATTERN.sub(" ", key)
+    key = NON_WORD_PATTERN.sub(" ", key)
+    key = " ".join(key.split())
+    # A description made only of digits/references keeps its own (whitespace-normalized) identity
+    return key or " ".join(description.lower().split())
+
+
+def group_by_canonical_key(descriptions: List[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Groups descriptions by canonical key.
+    Returns ({canonical key: representative description}, {description: canonical key}), where the
+    representative is the first original description seen with that key.
+    """
+    representatives: Dict[str, str] = {}
+    key_by_description: Dict[str, str] = {}
+    for desc in descriptions:
+        if desc not in key_by_description: # Exact repeats are normalized only once
+            key_by_description[desc] = canonical_description_key(desc)
+        representatives.setdefault(key_by_description[desc], desc)
+    return representatives, key_by_description
+
+
+def parse_number_text(values: pd.Series, decimal: str = ".") -> pd.Series:
+    """
+    Parses a Series of number text with the given decimal separator ("." or ","). The other separator is only
+    accepted as thousands grouping ("1,234.56" / "1.234,56"), so "12,50" is never read as 1250 with "." or
+    "1.234,56" as 1.23456. Non-strings and text that isn't a number in this convention become NaN.
+    """
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == "string":
+        text = values.str.strip()
+    else:
+        is_text = values.map(lambda value: isinstance(value, str)).astype(bool)
+        if not is_text.any():
+            return pd.Series(float("nan"), index=values.index)
+        text = values.where(is_text).astype(object).str.strip()
+
+    if decimal == ",":
+        dotted = text.str.contains(".", regex=False).fillna(False).astype(bool)
+        grouped = text.str.fullmatch(GROUPED_NUMBER_PATTERNS[","]).fillna(False).astype(bool)
+        text = text.where(grouped | ~dotted).str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+        return pd.to_numeric(text, errors="coerce")
+    # Plain numbers parse directly; only the text left over can be comma-grouped
+    numeric = pd.to_numeric(text, errors="coerce").astype(float)
+    unparsed = text[numeric.isna() & text.notna()]
+    grouped = unparsed[unparsed.str.fullmatch(GROUPED_NUMBER_PATTERNS["."]).fillna(False).astype(bool)]
+    if len(grouped):
+        numeric[grouped.index] = pd.to_numeric(grouped.str.replace(",", "", regex=False))
+    return numeric
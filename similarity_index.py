@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import zlib
+from typing import Dict, List, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from normalization import canonical_description_key
+
+load_dotenv()  # Load environment variables from .env file if it exists
+
+# One pair of files per vertical: <intent>.f32 (row-major float32 vectors, memory-mapped and appended to
+# in place) and <intent>.labels.jsonl (one {"row", "description", "category"} line per insert or update).
+SIMILARITY_INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR", "similarity_index")
+SIMILARITY_VECTOR_DIM = int(os.getenv("SIMILARITY_VECTOR_DIM", "512")) # Hashed character 3-gram buckets
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.92")) # Minimum cosine similarity to inherit a category
+QUERY_BLOCK_SIZE = 256 # Query rows scored per matrix multiplication, bounding the score matrix size
+
+
+def vectorize_descriptions(descriptions: List[str], dim: int = SIMILARITY_VECTOR_DIM) -> np.ndarray:
+    """
+    Embeds descriptions as L2-normalized, signed, hashed character 3-gram count vectors of size dim.
+    Descriptions are reduced to their canonical key first, so dates, references and amounts do not count.
+    """
+    vectors = np.zeros((len(descriptions), dim), dtype=np.float32)
+    for i, desc in enumerate(descriptions):
+        text = f" {canonical_description_key(desc)} "
+        hashes = np.fromiter((zlib.crc32(text[j:j + 3].encode("utf-8")) for j in range(len(text) - 2)),
+                             dtype=np.uint32, count=max(0, len(text) - 2))
+        # The top hash bit picks the sign, which keeps bucket collisions from only ever adding up
+        signs = np.where(hashes >> 31, -1.0, 1.0)
+        vectors[i] = np.bincount(hashes % dim, weights=signs, minlength=dim)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1.0, norms)
+    return vectors
+
+
+class SimilarityIndex:
+    """
+    Per-vertical nearest-neighbour index over previously categorized descriptions. Vectors live in a
+    memory-mapped file that inserts append to; queries score a whole batch with one cosine matrix product.
+    """
+
+    def __init__(self, index_dir: str = SIMILARITY_INDEX_DIR, dim: int = SIMILARITY_VECTOR_DIM,
+                 threshold: float = SIMILARITY_THRESHOLD):
+        self.index_dir = index_dir
+        self.dim = dim
+        self.threshold = threshold
+        self.lookups = 0
+        self.hits = 0
+        self._verticals: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    def _paths(self, intent: str) -> Tuple[str, str]:
+        return (os.path.join(self.index_dir, f"{intent}.f32"),
+                os.path.join(self.index_dir, f"{intent}.labels.jsonl"))
+
+    def _vertical(self, intent: str) -> dict:
+        # Loaded lazily on first use; callers hold self._lock
+        vertical = self._verticals.get(intent)
+        if vertical is not None:
+            return vertical
+        vectors_path, labels_path = self._paths(intent)
+        descriptions: List[str] = []
+        categories: List[str] = []
+        if os.path.exists(labels_path):
+            with open(labels_path, encoding="utf-8") as f:
+                for line in f:
+                    label = json.loads(line)
+                    if label["row"] == len(descriptions):
+                        descriptions.append(label["description"])
+                        categories.append(label["category"])
+                    elif label["row"] < len(descriptions): # Later lines update an existing row's category
+                        categories[label["row"]] = label["category"]
+        stored_rows = os.path.getsize(vectors_path) // (4 * self.dim) if os.path.exists(vectors_path) else 0
+        row_count = min(stored_rows, len(descriptions)) # Ignore a partially written trailing insert
+        vertical = {
+            "descriptions": descriptions[:row_count],
+            "categories": categories[:row_count],
+            "row_by_key": {canonical_description_key(d): i for i, d in enumerate(descriptions[:row_count])},
+            "matrix": self._open_matrix(vectors_path, row_count),
+        }
+        self._verticals[intent] = vertical
+        return vertical
+
+    def _open_matrix(self, vectors_path: str, row_count: int) -> np.ndarray:
+        if row_count == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(row_count, self.dim))
+
+    def add(self, intent: str, category_map: Dict[str, str]) -> int:
+        """
+        Inserts {description: category} pairs for the intent, persisting them immediately. A description
+        whose canonical key is already indexed only has its category updated. Returns the number of new rows.
+        """
+        if not category_map:
+            return 0
+        vectors_path, labels_path = self._paths(intent)
+        with self._lock:
+            vertical = self._vertical(intent)
+            new_descriptions = []
+            label_lines = []
+            for desc, category in category_map.items():
+                key = canonical_description_key(desc)
+                row = vertical["row_by_key"].get(key)
+                if row is not None:
+                    if vertical["categories"][row] != category:
+                        vertical["categories"][row] = category
+                        label_lines.append({"row": row, "description": vertical["descriptions"][row], "category": category})
+                    continue
+                row = len(vertical["descriptions"])
+                vertical["row_by_key"][key] = row
+                vertical["descriptions"].append(desc)
+                vertical["categories"].append(category)
+                new_descriptions.append(desc)
+                label_lines.append({"row": row, "description": desc, "category": category})
+
+            if new_descriptions:
+                with open(vectors_path, "ab") as f:
+                    f.write(vectorize_descriptions(new_descriptions, self.dim).tobytes())
+            if label_lines:
+                with open(labels_path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(label) + "\n" for label in label_lines)
+            if new_descriptions:
+                vertical["matrix"] = self._open_matrix(vectors_path, len(vertical["descriptions"]))
+        return len(new_descriptions)
+
+    def query(self, intent: str, descriptions: List[str], top_k: int = 1) -> List[List[Tuple[str, str, float]]]:
+        """
+        Returns, per query description, its top_k neighbours as (description, category, cosine score),
+        best first. All queries are vectorized and scored together.
+        """
+        with self._lock:
+            vertical = self._vertical(intent)
+            matrix = vertical["matrix"]
+            known_descriptions = vertical["descriptions"]
+            known_categories = list(vertical["categories"])
+        if not descriptions or matrix.shape[0] == 0:
+            return [[] for _ in descriptions]
+
+        k = min(top_k, matrix.shape[0])
+        query_vectors = vectorize_descriptions(descriptions, self.dim)
+        neighbours = []
+        for start in range(0, len(descriptions), QUERY_BLOCK_SIZE):
+            scores = query_vectors[start:start + QUERY_BLOCK_SIZE] @ matrix.T
+            # argpartition finds the top k per row without sorting every score
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for row_scores, row_top in zip(scores, top):
+                ordered = row_top[np.argsort(-row_scores[row_top])]
+                neighbours.append([(known_descriptions[j], known_categories[j], float(row_scores[j])) for j in ordered])
+        return neighbours
+
+    def match(self, intent: str, descriptions: List[str]) -> Dict[str, str]:
+        """
+        Returns {description: category} for descriptions whose nearest neighbour scores at least the threshold.
+        """
+        matches = {}
+        for desc, neighbours in zip(descriptions, self.query(intent, descriptions, top_k=1)):
+            if neighbours and neighbours[0][2] >= self.threshold:
+                matches[desc] = neighbours[0][1]
+        with self._lock:
+            self.lookups += len(descriptions)
+            self.hits += len(matches)
+        return matches
+
+    def stats(self) -> dict:
+        """
+        Returns lookup/hit counters and the number of indexed descriptions per loaded vertical.
+        """
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "threshold": self.threshold,
+                "entries": {intent: len(v["descriptions"]) for intent, v in self._verticals.items()},
+            }
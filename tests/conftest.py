@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# The application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules that open their caches at import time (agentic) get throwaway ones, never the working copy's
+_state_dir = tempfile.mkdtemp(prefix="tests-state-")
+os.environ.setdefault("LLM_CACHE_DB_PATH", os.path.join(_state_dir, "llm_cache.db"))
+os.environ.setdefault("SIMILARITY_INDEX_DIR", os.path.join(_state_dir, "similarity_index"))
+os.environ.setdefault("DATASET_STORE_DIR", os.path.join(_state_dir, "datasets"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("OPENAI_AGENT_API_KEY", "test")
@@ -0,0 +1,50 @@
+import json
+import types
+
+import pytest
+
+import agentic
+from categories import VERTICAL_CATEGORIES
+
+SALON_CATEGORIES = VERTICAL_CATEGORIES["salon"]
+DESCRIPTIONS = ["client haircut", "hair dye", "rent", "salary"]
+
+
+def reply(category_ids):
+    return json.dumps({"categories": category_ids})
+
+
+def test_full_reply_is_mapped_by_position():
+    category_ids = [SALON_CATEGORIES.index(c) + 1 for c in ["Turnover", "Cost of Goods", "Premises Costs", "Employee Costs"]]
+    assert agentic.parse_category_ids(reply(category_ids), SALON_CATEGORIES, DESCRIPTIONS) == {
+        "client haircut": "Turnover", "hair dye": "Cost of Goods", "rent": "Premises Costs", "salary": "Employee Costs",
+    }
+
+
+@pytest.mark.parametrize("category_ids", [[1, 3, 4], [1, 3, 4, 4, 2], []])
+def test_reply_of_the_wrong_length_is_discarded(category_ids):
+    # A short reply must not shift the remaining rows onto their neighbours' categories
+    assert agentic.parse_category_ids(reply(category_ids), SALON_CATEGORIES, DESCRIPTIONS) == {}
+
+
+def test_out_of_range_numbers_leave_only_their_row_out():
+    results = agentic.parse_category_ids(reply([1, 0, 99, 4]), SALON_CATEGORIES, DESCRIPTIONS)
+    assert results == {"client haircut": SALON_CATEGORIES[0], "salary": SALON_CATEGORIES[3]}
+
+
+def test_short_reply_is_retried_in_smaller_chunks(monkeypatch):
+    requested_chunks = []
+
+    def create_chat_completion(messages, **kwargs):
+        lines = messages[-1]["content"].splitlines()
+        requested_chunks.append(len(lines))
+        # The first, full-size request gets a short reply; retries are answered in full
+        category_ids = [3] * (len(lines) - 1 if len(requested_chunks) == 1 else len(lines))
+        message = types.SimpleNamespace(content=reply(category_ids))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+    monkeypatch.setattr(agentic.client, "create_chat_completion", create_chat_completion)
+    state = {"transaction_descriptions": DESCRIPTIONS, "chunk_size": 4, "max_concurrency": 1}
+    results = agentic.run_vertical_agent("Salon Agent", "instruction", SALON_CATEGORIES, state)["categorization_results"]
+    assert requested_chunks == [4, 2, 2]
+    assert results == {desc: SALON_CATEGORIES[2] for desc in DESCRIPTIONS}
@@ -0,0 +1,21 @@
+import datetime
+
+from app import apply_header_mapping
+from ingestion import SHEET_COLUMN
+
+HEADER_MAPPING = {"transactionDate": "Date", "transactionDescription": "Details", "amount": "Value",
+                  "disallowableExpenses": None}
+
+
+def test_apply_header_mapping_keeps_the_sheet_column():
+    headers = ["Date", "Details", "Value", SHEET_COLUMN]
+    rows = [[datetime.datetime(2024, 1, 5), "Rent", 900, "Jan"], [datetime.datetime(2024, 2, 5), "Rent", 900, "Feb"]]
+    mapped_columns = apply_header_mapping(headers, rows, HEADER_MAPPING)
+    assert mapped_columns[SHEET_COLUMN] == ["Jan", "Feb"]
+    assert mapped_columns["transactionDate"] == ["2024-01-05T00:00:00", "2024-02-05T00:00:00"]
+    assert mapped_columns["disallowableExpenses"] == [None, None]
+
+
+def test_apply_header_mapping_single_sheet_has_only_predefined_columns():
+    mapped_columns = apply_header_mapping(["Date", "Details", "Value"], [["2024-01-05", "Rent", 900]], HEADER_MAPPING)
+    assert sorted(mapped_columns) == sorted(HEADER_MAPPING)
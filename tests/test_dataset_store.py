@@ -0,0 +1,34 @@
+import datetime
+
+import pyarrow as pa
+import pytest
+
+from dataset_store import numeric_column, to_arrow_array
+
+
+@pytest.mark.parametrize("values, expected_type, expected_values", [
+    ([1.5, 2, None], pa.float64(), [1.5, 2.0, None]),
+    ([4521, 4522, None], pa.int64(), [4521, 4522, None]),
+    # Mixed columns are stored as text, every cell kept
+    ([4521] * 18 + ["Rent for salon premises", "Cheque 4522"], pa.string(),
+     ["4521"] * 18 + ["Rent for salon premises", "Cheque 4522"]),
+    ([12.5, "pending", None], pa.string(), ["12.5", "pending", None]),
+    ([10 ** 20, 1], pa.string(), ["100000000000000000000", "1"]),
+    ([datetime.date(2024, 1, 1), "2024-02-01"], pa.string(), ["2024-01-01", "2024-02-01"]),
+    ([True, "x"], pa.string(), ["True", "x"]),
+])
+def test_to_arrow_array_is_lossless(values, expected_type, expected_values):
+    array = to_arrow_array(values)
+    assert array.type == expected_type
+    assert array.to_pylist() == expected_values
+
+
+@pytest.mark.parametrize("values, expected", [
+    ([1.5, 2, None], [1.5, 2.0, 0.0]),
+    ([12.5, "pending", None, "1,234.50", "12,50"], [12.5, 0.0, 0.0, 1234.5, 0.0]),
+    (["Rent", "Fees"], [0.0, 0.0]),
+])
+def test_numeric_column_coerces_at_read_time(values, expected):
+    table = pa.table({"amount": to_arrow_array(values)})
+    assert numeric_column(table, "amount").tolist() == expected
+    assert numeric_column(table, "disallowableExpenses").tolist() == [0.0] * len(values)
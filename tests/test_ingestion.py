@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+import ingestion
+from ingestion import parse_csv_rows
+
+RAGGED_CSV = (
+    "Account,Business current account\n"
+    "Date,Description,Amount\n"
+    + "".join(f"2024-03-{i % 28 + 1:02d},Card payment TESCO,{i}.50\n" for i in range(200))
+    + "2024-04-01,Refund, with note,12.00,EXTRA\n" # Wider than every row in the sniffed head
+    + "2024-04-02,Short row\n"
+)
+
+
+@pytest.fixture
+def small_sniff(monkeypatch):
+    monkeypatch.setattr(ingestion, "CSV_SNIFF_BYTES", 256)
+    monkeypatch.setattr(ingestion, "CSV_CHUNK_ROWS", 50)
+
+
+@pytest.mark.parametrize("as_path", [False, True])
+def test_rows_wider_than_the_sniffed_head_are_kept(small_sniff, tmp_path, as_path):
+    if as_path:
+        path = tmp_path / "ledger.csv"
+        path.write_text(RAGGED_CSV)
+        file_obj = str(path)
+    else:
+        file_obj = io.BytesIO(RAGGED_CSV.encode())
+    title, headers, rows = parse_csv_rows(file_obj)
+    assert title == "CSV"
+    assert len(rows) == 1 + 200 + 2 # Second preamble line, the table rows and both ragged rows
+    assert len(headers) == 5
+    assert rows[-2] == ["2024-04-01", "Refund", " with note", 12, "EXTRA"]
+    assert rows[-1] == ["2024-04-02", "Short row", None, None, None]
+
+
+def test_uniform_csv_keeps_numeric_columns(small_sniff):
+    csv_text = "Date,Description,Amount\n" + "".join(f"2024-03-01,Rent,{i}\n" for i in range(120))
+    _, headers, rows = parse_csv_rows(io.BytesIO(csv_text.encode()))
+    assert headers == ["Date", "Description", "Amount"]
+    assert len(rows) == 120
+    assert rows[5] == ["2024-03-01", "Rent", 5]
+
+
+@pytest.mark.parametrize("csv_text, expected_amounts", [
+    # Semicolon exports write decimal commas and dotted thousands
+    ("Date;Description;Amount\n2024-03-01;Rent;12,50\n2024-03-02;Stock;1.234,56\n2024-03-03;Fee;7\n",
+     [12.5, 1234.56, 7.0]),
+    # Comma exports quote grouped amounts
+    ('Date,Description,Amount\n2024-03-01,Rent,"1,234.56"\n2024-03-02,Stock,12.50\n2024-03-03,Fee,7\n',
+     [1234.56, 12.5, 7.0]),
+    ('Date,Description,Amount\n2024-03-01,Rent,"1,000"\n2024-03-02,Stock,250\n', [1000, 250]),
+    # A decimal comma quoted into a decimal-point file is ambiguous next to grouped amounts: kept as text
+    ('Date,Description,Amount\n2024-03-01,Rent,"12,50"\n2024-03-02,Stock,"1,234.56"\n', ["12,50", "1,234.56"]),
+])
+def test_csv_amount_separators(csv_text, expected_amounts):
+    _, headers, rows = parse_csv_rows(io.BytesIO(csv_text.encode()))
+    assert headers == ["Date", "Description", "Amount"]
+    assert [row[2] for row in rows] == expected_amounts
@@ -0,0 +1,197 @@
+import threading
+import types
+
+import httpx
+import openai
+import pytest
+
+import llm_client
+from llm_client import CircuitBreaker, CircuitOpenError, ResilientLLMClient, counts_toward_breaker
+
+REQUEST = httpx.Request("POST", "http://gateway.test/v1/chat/completions")
+
+
+def status_error(status_code, headers=None):
+    response = httpx.Response(status_code, headers=headers or {}, request=REQUEST)
+    error_class = openai.InternalServerError if status_code >= 500 else {429: openai.RateLimitError}.get(status_code, openai.APIStatusError)
+    return error_class(f"HTTP {status_code}", response=response, body=None)
+
+
+def connection_error():
+    return openai.APIConnectionError(request=REQUEST)
+
+
+class FakeRawClient:
+    """
+    Stands in for the OpenAI SDK client: each create() raises or returns the next scripted outcome,
+    then keeps returning a successful response.
+    """
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(llm_client.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def make_client(outcomes, max_retries=2, breaker=None):
+    raw = FakeRawClient(outcomes)
+    return raw, ResilientLLMClient(None, raw_client=raw, breaker=breaker or CircuitBreaker(3, 30), max_retries=max_retries)
+
+
+def test_counts_toward_breaker():
+    assert counts_toward_breaker(connection_error())
+    assert counts_toward_breaker(status_error(503))
+    assert not counts_toward_breaker(status_error(429))
+    assert not counts_toward_breaker(status_error(503, {"retry-after": "2"}))
+    assert not counts_toward_breaker(status_error(408))
+    assert not counts_toward_breaker(ValueError("bad payload"))
+
+
+def test_retries_then_succeeds_and_honors_retry_after(no_sleep):
+    raw, client = make_client([status_error(429, {"retry-after": "1.5"}), status_error(503)])
+    assert client.create_chat_completion(model="m", messages=[]) == "ok"
+    assert raw.calls == 3
+    assert no_sleep[0] == 1.5
+    assert client.retries == 2
+    assert client.breaker.state == "closed"
+    assert client.breaker.consecutive_failures == 0
+
+
+def test_non_retryable_error_is_raised_immediately():
+    raw, client = make_client([status_error(400)])
+    with pytest.raises(openai.APIStatusError):
+        client.create_chat_completion(model="m", messages=[])
+    assert raw.calls == 1
+
+
+def test_request_errors_leave_the_breaker_untouched():
+    breaker = CircuitBreaker(2, 30)
+    raw, client = make_client([status_error(503), status_error(400)], max_retries=0, breaker=breaker)
+    for error_class in (openai.InternalServerError, openai.APIStatusError):
+        with pytest.raises(error_class):
+            client.create_chat_completion(model="m", messages=[])
+    # A 400 is no evidence of gateway health: the earlier failure still counts
+    assert breaker.consecutive_failures == 1
+
+
+def test_request_error_in_half_open_trial_keeps_the_circuit_half_open():
+    breaker = CircuitBreaker(1, 30)
+    raw, client = make_client([status_error(502), status_error(401)], max_retries=0, breaker=breaker)
+    with pytest.raises(openai.APIStatusError):
+        client.create_chat_completion(model="m", messages=[])
+    breaker.opened_at -= 31
+    with pytest.raises(openai.APIStatusError):
+        client.create_chat_completion(model="m", messages=[])
+    # The trial slot is released, but only a real success closes the circuit
+    assert breaker.state == "half_open"
+    assert breaker.consecutive_failures == 1
+    assert client.create_chat_completion(model="m", messages=[]) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_one_failure_per_exhausted_call():
+    breaker = CircuitBreaker(3, 30)
+    raw, client = make_client([status_error(503)] * 3, max_retries=2, breaker=breaker)
+    with pytest.raises(openai.InternalServerError):
+        client.create_chat_completion(model="m", messages=[])
+    assert raw.calls == 3
+    assert breaker.consecutive_failures == 1
+    assert breaker.state == "closed"
+
+
+def test_throttling_never_opens_the_circuit():
+    breaker = CircuitBreaker(2, 30)
+    raw, client = make_client([status_error(429)] * 6, max_retries=1, breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(openai.RateLimitError):
+            client.create_chat_completion(model="m", messages=[])
+    assert breaker.consecutive_failures == 0
+    assert breaker.state == "closed"
+    assert client.create_chat_completion(model="m", messages=[]) == "ok"
+
+
+def test_concurrent_single_429s_all_succeed():
+    # Eight concurrent calls each throttled once must all get through on retry
+    breaker = CircuitBreaker(5, 30)
+    throttled_threads = set()
+
+    def create(**kwargs):
+        if threading.get_ident() not in throttled_threads:
+            throttled_threads.add(threading.get_ident())
+            raise status_error(429, {"retry-after": "0"})
+        return "ok"
+
+    raw = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    client = ResilientLLMClient(None, raw_client=raw, breaker=breaker, max_retries=2)
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(client.create_chat_completion(model="m", messages=[]))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert results == ["ok"] * 8
+    assert breaker.state == "closed"
+    assert breaker.consecutive_failures == 0
+
+
+def test_gateway_faults_open_the_circuit_and_fail_fast():
+    breaker = CircuitBreaker(2, 30)
+    raw, client = make_client([connection_error()] * 4, max_retries=1, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(openai.APIConnectionError):
+            client.create_chat_completion(model="m", messages=[])
+    assert breaker.state == "open"
+    calls_before = raw.calls
+    with pytest.raises(CircuitOpenError):
+        client.create_chat_completion(model="m", messages=[])
+    assert raw.calls == calls_before
+
+
+def test_half_open_trial_success_closes_the_circuit():
+    breaker = CircuitBreaker(1, 30)
+    raw, client = make_client([status_error(502)], max_retries=0, breaker=breaker)
+    with pytest.raises(openai.APIStatusError):
+        client.create_chat_completion(model="m", messages=[])
+    assert breaker.state == "open"
+    breaker.opened_at -= 31 # Reset period elapsed
+    assert breaker.state == "half_open"
+    assert client.create_chat_completion(model="m", messages=[]) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_throttled_half_open_trial_releases_the_trial_slot():
+    breaker = CircuitBreaker(1, 30)
+    raw, client = make_client([status_error(502), status_error(429)], max_retries=0, breaker=breaker)
+    with pytest.raises(openai.APIStatusError):
+        client.create_chat_completion(model="m", messages=[])
+    breaker.opened_at -= 31
+    with pytest.raises(openai.RateLimitError):
+        client.create_chat_completion(model="m", messages=[])
+    # The throttled trial neither reopened the circuit nor kept the trial slot taken
+    assert breaker.state == "half_open"
+    assert client.create_chat_completion(model="m", messages=[]) == "ok"
+    assert breaker.state == "closed"
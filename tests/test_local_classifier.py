@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+import local_classifier
+from local_classifier import LocalClassifier
+
+
+class FakeTrainingSource:
+    """
+    Labeled history with the count()/entries() interface of the category cache and feedback store.
+    """
+
+    def __init__(self, entries):
+        self._entries = list(entries)
+
+    def count(self, intent):
+        return len(self._entries)
+
+    def entries(self, intent, limit):
+        return self._entries[:limit]
+
+
+def labeled_history(size):
+    return [(f"supplier {i} colour stock", "Cost of Goods") if i % 2 else (f"client {i} appointment", "Turnover")
+            for i in range(size)]
+
+
+@pytest.mark.parametrize("description, expected_category", [
+    ("Shop rent March", "Premises Costs"),
+    ("Rental of chair space", "Premises Costs"),
+    ("Rental income flat 2", None),
+    ("Rent received from tenant", None),
+    ("Income from rental", None),
+    ("Sublet rent", None),
+])
+def test_rent_rule_leaves_rent_income_to_the_llm(description, expected_category):
+    classifier = LocalClassifier([])
+    assert classifier._rule_category("salon", description)[0] == expected_category
+
+
+@pytest.mark.parametrize("intent, description", [
+    ("salon", "HMRC VAT payment"),
+    ("salon", "HMRC PAYE employer contributions"),
+    ("salon", "Employers national insurance"),
+    ("salon", "Payroll software subscription"),
+    ("salon", "Uber Eats staff lunch"),
+    ("salon", "Rent deposit returned"),
+    ("salon", "Rental income flat 2"),
+    ("salon", "Train to trade show"), # Broad keyword: left to the model or the LLM
+    ("salon", "Styling products from wholesaler"),
+    ("tutor", "Piano lessons"),
+    ("architectural", "CAD 200 transfer"),
+])
+def test_misleading_keywords_are_escalated(intent, description):
+    confident, escalate = LocalClassifier([]).split_confident(intent, [description])
+    assert confident == {}
+    assert escalate == [description]
+
+
+@pytest.mark.parametrize("intent, description, expected_category", [
+    ("salon", "HMRC self assessment", "Personal"),
+    ("salon", "Salary payment to assistant", "Employee Costs"),
+    ("salon", "Flights to Paris", "Travel and Subsistence"),
+    ("salon", "Rent for salon premises", "Premises Costs"),
+    ("tutor", "Lessons paid from student", "Turnover"),
+])
+def test_specific_keywords_are_answered_locally(intent, description, expected_category):
+    confident, escalate = LocalClassifier([]).split_confident(intent, [description])
+    assert confident == {description: expected_category}
+    assert escalate == []
+
+
+def test_model_trains_in_background_without_blocking_classify(monkeypatch):
+    if local_classifier.make_pipeline is None:
+        pytest.skip("scikit-learn not installed")
+    classifier = LocalClassifier([FakeTrainingSource(labeled_history(120))])
+    fit_started, release_fit = threading.Event(), threading.Event()
+    real_fit = classifier._fit
+
+    def slow_fit(intent):
+        fit_started.set()
+        release_fit.wait(5)
+        return real_fit(intent)
+
+    monkeypatch.setattr(classifier, "_fit", slow_fit)
+    # Training is only started: the first batch is answered by the rules alone
+    assert classifier.classify("salon", ["client 7 appointment"]) == {}
+    assert fit_started.wait(5)
+    assert classifier.stats()["training_models"] == ["salon"]
+    assert classifier.classify("salon", ["client 9 appointment"]) == {} # No second training is queued
+    release_fit.set()
+    classifier.wait_for_training(5)
+    assert classifier.stats()["trained_models"] == ["salon"]
+    assert classifier.stats()["training_models"] == []
+    category, _, tier = classifier.classify("salon", ["client 11 appointment"])["client 11 appointment"]
+    assert (category, tier) == ("Turnover", "model")
+
+
+def test_failed_training_keeps_serving_the_previous_model(monkeypatch):
+    if local_classifier.make_pipeline is None:
+        pytest.skip("scikit-learn not installed")
+    source = FakeTrainingSource(labeled_history(120))
+    classifier = LocalClassifier([source])
+    classifier.classify("salon", ["client 1 appointment"])
+    classifier.wait_for_training(5)
+    previous_model = classifier._models["salon"]
+
+    def failing_fit(intent):
+        raise ValueError("corrupt history")
+
+    monkeypatch.setattr(classifier, "_fit", failing_fit)
+    source._entries += labeled_history(local_classifier.LOCAL_MODEL_RETRAIN_EVERY)
+    classifier.classify("salon", ["client 1 appointment"])
+    classifier.wait_for_training(5)
+    assert classifier._models["salon"] is previous_model
+    assert classifier.stats()["training_models"] == []
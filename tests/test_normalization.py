@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from normalization import canonical_description_key, group_by_canonical_key, parse_number_text
+
+
+@pytest.mark.parametrize("description, expected_key", [
+    # Dates, amounts and references are stripped
+    ("Card payment TESCO 12/03 REF 8831", "card payment tesco ref"),
+    ("Card payment TESCO 2024-03-12", "card payment tesco"),
+    ("Direct debit VODAFONE 12 Mar", "direct debit vodafone"),
+    ("Direct debit VODAFONE 12 March 2024", "direct debit vodafone"),
+    ("Direct debit VODAFONE 12mar2024", "direct debit vodafone"),
+    ("Direct debit VODAFONE 1st September", "direct debit vodafone"),
+    ("Transfer ab12cd x9", "transfer"),
+    # Reference keywords are kept, only the reference token goes
+    ("Invoice 123 to client", "invoice to client"),
+    ("Invoice No. INV-2231 Smith", "invoice no smith"),
+    ("Cheque 004512", "cheque"),
+    # Words that start like a month after a number are kept
+    ("Purchase of 10 markers", "purchase of markers"),
+    ("Paid 2 decorators for salon", "paid decorators for salon"),
+    ("Refund 12 Marks and Spencer", "refund marks and spencer"),
+    ("Invoice 45 marketing services", "invoice marketing services"),
+    ("Bought 3 janitorial supplies", "bought janitorial supplies"),
+    ("Hired 4 octopus costumes", "hired octopus costumes"),
+    # Case, punctuation and spacing
+    ("  SALON   Rent -- June ", "salon rent june"),
+    # Descriptions made only of digits keep their own identity
+    ("123456", "123456"),
+])
+def test_canonical_description_key(description, expected_key):
+    assert canonical_description_key(description) == expected_key
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Purchase of 10 markers", "Purchase of 10 magazines"),
+    ("Paid 2 decorators for salon", "Paid 2 for salon"),
+    ("Invoice 45 marketing services", "Invoice 45 services"),
+    ("Refund 12 Marks and Spencer", "Refund 12 and Spencer"),
+])
+def test_unrelated_descriptions_keep_distinct_keys(first, second):
+    assert canonical_description_key(first) != canonical_description_key(second)
+
+
+def test_group_by_canonical_key_uses_first_description_as_representative():
+    representatives, key_by_description = group_by_canonical_key([
+        "Card payment TESCO 12/03 REF 8831", "card payment tesco 14/03 ref 9120", "Purchase of 10 markers",
+    ])
+    assert representatives == {
+        "card payment tesco ref": "Card payment TESCO 12/03 REF 8831",
+        "purchase of markers": "Purchase of 10 markers",
+    }
+    assert key_by_description["card payment tesco 14/03 ref 9120"] == "card payment tesco ref"
+
+
+@pytest.mark.parametrize("text, decimal, expected", [
+    ("1,234.56", ".", 1234.56),
+    ("12.5", ".", 12.5),
+    ("-1,000", ".", -1000.0),
+    ("12,50", ".", None), # Never 1250
+    ("1.234,56", ".", None), # Never 1.23456
+    ("1,23,456", ".", None),
+    ("12,50", ",", 12.5),
+    ("1.234,56", ",", 1234.56),
+    ("1,234.56", ",", None),
+    (" 7 ", ",", 7.0),
+    ("abc", ".", None),
+])
+def test_parse_number_text(text, decimal, expected):
+    value = parse_number_text(pd.Series([text], dtype=object), decimal)[0]
+    assert (pd.isna(value) if expected is None else value == expected)